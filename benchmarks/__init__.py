@@ -0,0 +1 @@
+"""Offline benchmarks and load-generation tools for DealsHunterBot"""
@@ -0,0 +1,347 @@
+"""Offline benchmarks for the deal browsing and alert paths
+
+Runs DealFetcher, NotificationManager and a simulated button_callback against
+an in-memory Firestore fake and a fake Telegram backend, reporting throughput
+and p50/p99 latency per catalog size and user count:
+
+    python -m benchmarks.bench_paths --sizes 100,10000,1000000 --users 100,10000
+
+Sections whose dependencies are not installed are skipped.
+"""
+import argparse
+import asyncio
+import gc
+import os
+import random
+import time
+from types import SimpleNamespace
+from typing import Callable, Dict, List
+
+from benchmarks.stats import format_row, summarize
+
+# Keep handler logging from dominating the measurements
+os.environ.setdefault('LOG_LEVEL', 'ERROR')
+
+CALLBACK_ROUTES = ['store_amazon', 'page_amazon_2', 'page_ebay_3', 'foryou_1', 'check_sales', 'main_menu', 'premium', 'notifications']
+
+def make_catalog(prefix: str, store_name: str, count: int) -> List[Dict]:
+    """Generate raw deals shaped like the stores' test_deals"""
+    return [{
+        'id': f'{prefix}_{i}',
+        'title': f'{store_name} Product {i}',
+        'price': 9.99 + (i % 500) * 0.75,
+        'original_price': (9.99 + (i % 500) * 0.75) / (1 - (30.0 + i % 40) / 100),
+        'url': f'https://{store_name.lower()}.com/sample/product_{i}',
+        'discount_percentage': 30.0 + (i % 40),
+        'stock_status': 'In Stock' if i % 5 != 0 else 'Limited Stock',
+        'rating': 3.5 + (i % 2),
+        'reviews_count': 1000 + i,
+        'category': f'Category {i % 5}',
+        'brand': f'Brand {i % 3}',
+        'shipping': 'Free Shipping' if i % 2 == 0 else 'Standard Shipping',
+        'last_updated': '2024-03-06'
+    } for i in range(count)]
+
+def load_catalog(deal_fetcher, total: int) -> None:
+    """Spread a synthetic catalog of total deals across the fetcher's stores"""
+    store_ids = deal_fetcher.get_available_stores()
+    per_store = max(1, total // len(store_ids))
+    for store_id in store_ids:
+        store = deal_fetcher.get_store(store_id)
+        store.test_deals = make_catalog(store_id.upper(), store.get_store_name(), per_store)
+    gc.collect()
+
+def measure(func: Callable[[], object], iterations: int) -> Dict[str, float]:
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        op_started = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - op_started)
+    return summarize(latencies, time.perf_counter() - started)
+
+async def measure_async(func, iterations: int) -> Dict[str, float]:
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        op_started = time.perf_counter()
+        await func()
+        latencies.append(time.perf_counter() - op_started)
+    return summarize(latencies, time.perf_counter() - started)
+
+def bench_deal_fetcher(sizes: List[int], iterations: int) -> None:
+    from deal_fetcher import DealFetcher
+
+    print("== DealFetcher ==")
+    deal_fetcher = DealFetcher()
+    rng = random.Random(42)
+    for size in sizes:
+        load_catalog(deal_fetcher, size)
+        store_ids = deal_fetcher.get_available_stores()
+        per_store = len(deal_fetcher.get_store(store_ids[0]).test_deals)
+        max_page = max(1, per_store // deal_fetcher.deals_per_page)
+        page_deals, _ = deal_fetcher.get_store_deals(store_ids[0], 1, True)
+
+        print(format_row(f"get_store_deals basic [{size}]", measure(
+            lambda: deal_fetcher.get_store_deals(rng.choice(store_ids), rng.randint(1, 3), False), iterations)))
+        print(format_row(f"get_store_deals premium [{size}]", measure(
+            lambda: deal_fetcher.get_store_deals(rng.choice(store_ids), rng.randint(1, max_page), True), iterations)))
+        print(format_row(f"get_store_deals filtered [{size}]", measure(
+            lambda: deal_fetcher.get_store_deals(rng.choice(store_ids), 1, True, {'min_discount': 50}),
+            max(1, iterations // 100))))
+        print(format_row(f"get_all_deals [{size}]", measure(
+            lambda: deal_fetcher.get_all_deals(rng.randint(1, 3)), iterations)))
+        print(format_row(f"format_deals_message [{size}]", measure(
+            lambda: deal_fetcher.format_deals_message(page_deals, rng.choice(['en', 'uz', 'ru'])), iterations)))
+
+def make_listings(count: int, duplicate_rate: float, rng: random.Random) -> List[Dict]:
+    """Formatted deals where duplicate_rate of products are also listed by another store"""
+    stores = ['Amazon', 'eBay', 'AliExpress', 'Shein']
+    brands = ['Acme', 'Globex', 'Initech', 'Umbrella', 'Stark', 'Wayne', 'Hooli', 'Vandelay']
+    nouns = ['Wireless Earbuds', 'Smart Watch', 'Blender', 'Running Shoes', 'Backpack', 'Desk Lamp',
+             'Bluetooth Speaker', 'Air Fryer', 'Yoga Mat', 'Phone Case', 'Power Bank', 'Webcam']
+    colors = ['Black', 'White', 'Blue', 'Red', 'Grey']
+    listings = []
+    product = 0
+    while len(listings) < count:
+        product += 1
+        title = f"{rng.choice(brands)} {rng.choice(nouns)} {rng.choice(colors)} Model {product}"
+        copies = 2 if rng.random() < duplicate_rate else 1
+        for store in rng.sample(stores, copies):
+            noisy = title if store == 'Amazon' else f"NEW {title} - Free Shipping"
+            price = round(rng.uniform(10, 300), 2)
+            listings.append({'id': f'{store}_{len(listings)}', 'title': noisy, 'store': store,
+                             'price': price, 'url': f'https://example.com/{len(listings)}',
+                             'discount_percentage': rng.uniform(10, 70)})
+    return listings[:count]
+
+def bench_dedup(sizes: List[int], duplicate_rate: float = 0.3) -> None:
+    from deal_dedup import DealDeduplicator
+
+    print("== Cross-store deduplication ==")
+    rng = random.Random(42)
+    for size in sizes:
+        listings = make_listings(size, duplicate_rate, rng)
+        deduplicator = DealDeduplicator()
+        started = time.perf_counter()
+        merged = deduplicator.deduplicate(listings)
+        cold = time.perf_counter() - started
+        started = time.perf_counter()
+        deduplicator.deduplicate(listings)
+        warm = time.perf_counter() - started
+        print(f"{f'deduplicate [{size}]':<40} {len(merged):>8} kept  cold {cold * 1000:9.1f} ms "
+              f"({cold / size * 1e6:5.1f} us/deal)  cached signatures {warm * 1000:9.1f} ms")
+
+def bench_search(sizes: List[int], iterations: int) -> None:
+    from deal_search import DealSearchIndex
+
+    print("== Deal search ==")
+    rng = random.Random(42)
+    queries = ['black', 'acme blender', 'wireless earbuds blue', 'globex smart watch model 7']
+    for size in sizes:
+        listings = make_listings(size, 0.0, rng)
+        index = DealSearchIndex()
+        started = time.perf_counter()
+        index.index_store('all', listings)
+        build = time.perf_counter() - started
+        # Refreshes replace changed deals with new dicts, as ApiStore does
+        for i in rng.sample(range(size), max(1, size // 100)):
+            listings[i] = dict(listings[i], title=listings[i]['title'] + ' Refurbished')
+        started = time.perf_counter()
+        index.index_store('all', listings)
+        refresh = time.perf_counter() - started
+        print(f"{f'index_store [{size}]':<40} build {build * 1000:9.1f} ms, 1% changed refresh {refresh * 1000:9.1f} ms")
+        for query in queries:
+            print(format_row(f"search '{query}' [{size}]", measure(
+                lambda: index.search(query, limit=5, max_results=100), max(1, iterations // 10))))
+        # Inline queries arrive a keystroke at a time
+        for query in ('b', 'bl', 'bla', 'acme bl', 'wireless earbuds b'):
+            print(format_row(f"complete '{query}' [{size}]", measure(
+                lambda: index.complete(query, limit=20), max(1, iterations // 10))))
+
+def bench_ranking(sizes: List[int], iterations: int) -> None:
+    import numpy as np
+    from deal_ranking import DealRanker, interest_key
+
+    print("== Personalized ranking ==")
+    rng = random.Random(42)
+    categories = ['Audio', 'Wearables', 'Kitchen', 'Shoes', 'Bags', 'Home', 'Fitness', 'Accessories']
+    interests = {interest_key('store', 'ebay'): 12, interest_key('category', 'Kitchen'): 4,
+                 interest_key('category', 'Audio'): 2}
+    for size in sizes:
+        listings = make_listings(size, 0.0, rng)
+        for deal in listings:
+            deal.update(rating=round(rng.uniform(2.5, 5), 1), reviews_count=rng.randint(0, 5000),
+                        category=rng.choice(categories))
+        ranker = DealRanker()
+        started = time.perf_counter()
+        for store in ('Amazon', 'eBay', 'AliExpress', 'Shein'):
+            ranker.set_store_deals(store.lower(), [deal for deal in listings if deal['store'] == store])
+        ranker.top(5)
+        build = time.perf_counter() - started
+        print(f"{f'build features [{size}]':<40} {build * 1000:9.1f} ms")
+        rounds = max(1, iterations // 100)
+        print(format_row(f"top 10 for a user [{size}]", measure(
+            lambda: ranker.top(10, interests=interests), rounds)))
+        # The same scores with a full sort instead of a partial one
+        catalog = ranker._get_catalog()
+        print(format_row(f"full sort for a user [{size}]", measure(
+            lambda: np.argsort(-ranker._scores(catalog, interests), kind='stable')[:10], rounds)))
+
+def make_watch_rules(count: int, rng: random.Random) -> List[Dict]:
+    """Watch rules like users write: mostly a brand and a product, often with a price or discount limit"""
+    brands = ['acme', 'globex', 'initech', 'umbrella', 'stark', 'wayne', 'hooli', 'vandelay']
+    products = ['earbuds', 'watch', 'blender', 'shoes', 'backpack', 'lamp', 'speaker', 'fryer', 'mat', 'case',
+                'bank', 'webcam']
+    rules = []
+    for i in range(count):
+        rule = {'id': f'rule_{i}', 'user_id': str(i // 3)}
+        kind = rng.random()
+        if kind < 0.7:
+            rule['keywords'] = [rng.choice(brands), rng.choice(products)]
+        elif kind < 0.9:
+            rule['keywords'] = [rng.choice(products)]
+        elif kind < 0.97:
+            rule['store'] = rng.choice(['Amazon', 'eBay', 'AliExpress', 'Shein'])
+        if rng.random() < 0.6:
+            rule['max_price'] = float(rng.randint(20, 300))
+        if rng.random() < 0.4:
+            rule['min_discount'] = float(rng.choice([20, 30, 50]))
+        rules.append(rule)
+    return rules
+
+def bench_watch_rules(rule_counts: List[int], deal_count: int = 1000) -> None:
+    from deal_search import tokenize
+    from watch_rules import CompiledRule, WatchRuleMatcher
+
+    print("== Watch rule matching ==")
+    rng = random.Random(42)
+    deals = make_listings(deal_count, 0.0, rng)
+    for rule_count in rule_counts:
+        rules = make_watch_rules(rule_count, rng)
+        started = time.perf_counter()
+        matcher = WatchRuleMatcher(rules)
+        compile_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        matches = sum(len(matcher.match(deal, deal['store'])) for deal in deals)
+        compiled_time = time.perf_counter() - started
+
+        # Checking every rule against every deal, as a per-user loop would
+        compiled_rules = [CompiledRule(rule) for rule in rules]
+        sample = deals[:max(1, deal_count // 10)]
+        started = time.perf_counter()
+        for deal in sample:
+            terms = set(tokenize(deal['title']))
+            sum(1 for rule in compiled_rules if rule.matches(deal, deal['store'], terms))
+        naive_time = (time.perf_counter() - started) * deal_count / len(sample)
+
+        print(f"{f'match {deal_count} deals [{rule_count} rules]':<40} compiled {compiled_time * 1000:9.1f} ms "
+              f"(compile {compile_time * 1000:7.1f} ms), every rule {naive_time * 1000:10.1f} ms, {matches} matches")
+
+def seed_users(fake, user_count: int) -> None:
+    """Create users with a mix of tiers and store subscriptions"""
+    stores = ['amazon', 'aliexpress', 'ebay', 'shein']
+    users = fake.collection('users')
+    notifications = fake.collection('notifications')
+    for user_id in range(1, user_count + 1):
+        is_premium = user_id % 5 == 0
+        users.document(str(user_id)).set({'language': 'en', 'is_premium': is_premium})
+        for store in stores[:4 if is_premium else 1]:
+            notifications.add({
+                'user_id': str(user_id),
+                'store': store,
+                'created_at': '2024-03-06T00:00:00',
+                'last_sent': None,
+                'next_due_at': '2024-03-06T00:00:00'
+            })
+    fake.operations.clear()
+
+def bench_notifications(user_counts: List[int], iterations: int) -> None:
+    from benchmarks.fake_firestore import FakeFirestore, install_fake_firestore
+    from notification_manager import NotificationManager
+
+    print("== NotificationManager ==")
+    rng = random.Random(42)
+    for user_count in user_counts:
+        fake = install_fake_firestore(FakeFirestore())
+        seed_users(fake, user_count)
+        manager = NotificationManager()
+        print(format_row(f"can_add_notification [{user_count} users]", measure(
+            lambda: manager.can_add_notification(str(rng.randint(1, user_count)), 'ebay', rng.random() < 0.2),
+            iterations)))
+        print(format_row(f"get_user_notifications [{user_count} users]", measure(
+            lambda: manager.get_user_notifications(str(rng.randint(1, user_count))), iterations)))
+        print(f"   Firestore calls: {dict(fake.operations)}")
+
+def bench_button_callback(sizes: List[int], user_count: int, iterations: int) -> None:
+    from benchmarks.fake_firestore import FakeFirestore, install_fake_firestore
+    fake = install_fake_firestore(FakeFirestore())
+
+    import bot as bot_module
+    from benchmarks.fake_telegram import FakeTelegramRequest, make_bot, make_callback_update
+    from throttle import RateLimiter
+
+    print("== button_callback ==")
+    # Presses come far faster than real users press; measure the handler, not the rate limit
+    bot_module.RATE_LIMITER = RateLimiter(rate=1e9, burst=1e9)
+    seed_users(fake, user_count)
+    rng = random.Random(42)
+    user_data: Dict[int, Dict] = {}
+
+    async def run():
+        request = FakeTelegramRequest()
+        bot = await make_bot(request)
+        for size in sizes:
+            load_catalog(bot_module.get_deal_fetcher(), size)
+
+            async def press(route=None):
+                user_id = rng.randint(1, user_count)
+                update = make_callback_update(bot, user_id, route or rng.choice(CALLBACK_ROUTES))
+                # The handler only uses the context's bot and per-user data
+                context = SimpleNamespace(bot=bot, user_data=user_data.setdefault(user_id, {}))
+                await bot_module.button_callback(update, context)
+
+            print(format_row(f"button_callback mixed [{size}]", await measure_async(press, iterations)))
+            print(format_row(f"button_callback store_ [{size}]", await measure_async(
+                lambda: press('store_amazon'), iterations)))
+        print(f"   Telegram calls: {request.calls}")
+        await bot.shutdown()
+
+    asyncio.run(run())
+
+def parse_ints(value: str) -> List[int]:
+    return [int(v) for v in value.split(',') if v]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=parse_ints, default=parse_ints('100,1000,10000,100000,1000000'),
+                        help='Total catalog sizes (deals across all stores)')
+    parser.add_argument('--users', type=parse_ints, default=parse_ints('100,1000,10000'),
+                        help='User counts for the Firestore-backed paths')
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--search-sizes', type=parse_ints, default=parse_ints('10000,100000,1000000'),
+                        help='Catalog sizes for the search index and ranking')
+    parser.add_argument('--rule-counts', type=parse_ints, default=parse_ints('1000,10000,100000'),
+                        help='Watch rule counts for alert matching')
+    parser.add_argument('--dedup-sizes', type=parse_ints, default=parse_ints('1000,10000,100000'),
+                        help='Listing counts for cross-store deduplication')
+    args = parser.parse_args()
+
+    bench_deal_fetcher(args.sizes, args.iterations)
+    bench_dedup(args.dedup_sizes)
+    bench_search(args.search_sizes, args.iterations)
+    bench_watch_rules(args.rule_counts)
+    bench_ranking(args.search_sizes, args.iterations)
+
+    for name, section in [
+        ('NotificationManager', lambda: bench_notifications(args.users, args.iterations)),
+        ('button_callback', lambda: bench_button_callback(args.sizes, max(args.users), args.iterations)),
+    ]:
+        try:
+            section()
+        except ImportError as e:
+            print(f"== {name} skipped: {e} ==")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""Benchmark HTML listing extraction on the saved pages in benchmarks/fixtures
+
+Compares the event-driven ListingParser with building a BeautifulSoup tree,
+then scrapes fixture pages through ScraperStore with simulated network
+latency to show what the politeness limits cost:
+
+    python -m benchmarks.bench_scraper --iterations 200 --pages 20 --latency 0.05
+"""
+import argparse
+import asyncio
+import glob
+import os
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from benchmarks.stats import format_row, summarize
+
+# Keep scraper logging from dominating the measurements
+os.environ.setdefault('LOG_LEVEL', 'ERROR')
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+ITEM_RULE = {'tag': 'div', 'class': 'product-card'}
+FIELD_RULES = {
+    'id': {'attr': 'data-id'},
+    'category': {'attr': 'data-category'},
+    'title': {'tag': 'h2', 'class': 'product-title'},
+    'url': {'class': 'product-link', 'attr': 'href'},
+    'brand': {'class': 'brand'},
+    'price': {'class': 'price'},
+    'original_price': {'class': 'list-price'},
+    'discount_percentage': {'class': 'discount'},
+    'rating': {'class': 'stars'},
+    'reviews_count': {'class': 'reviews'},
+    'stock_status': {'class': 'stock'},
+}
+
+def load_fixtures() -> List[str]:
+    paths = sorted(glob.glob(os.path.join(FIXTURES_DIR, 'listing_page_*.html')))
+    if not paths:
+        raise FileNotFoundError(f"No listing fixtures in {FIXTURES_DIR}")
+    pages = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            pages.append(f.read())
+    return pages
+
+def soup_listing(html: str) -> List[Dict[str, str]]:
+    """The same extraction done by building a full BeautifulSoup tree"""
+    from bs4 import BeautifulSoup
+
+    items = []
+    for card in BeautifulSoup(html, 'html.parser').select('div.product-card'):
+        title = card.select_one('h2.product-title')
+        link = card.select_one('.product-link')
+        items.append({
+            'id': card.get('data-id'),
+            'title': title.get_text(' ', strip=True) if title else None,
+            'url': link.get('href') if link else None,
+            'price': card.select_one('.price').get_text(strip=True),
+        })
+    return items
+
+def measure(func: Callable[[], object], iterations: int) -> Dict[str, float]:
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        op_started = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - op_started)
+    return summarize(latencies, time.perf_counter() - started)
+
+def peak_memory(func: Callable[[], object]) -> float:
+    """Peak traced allocation of one call, in KiB"""
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024
+
+def bench_parsers(pages: List[str], iterations: int) -> None:
+    from stores.scraper import parse_listing
+
+    print("== Listing extraction ==")
+    page = pages[0]
+    items = len(parse_listing(page, ITEM_RULE, FIELD_RULES))
+    print(f"   fixture: {len(page) / 1024:.0f} KiB, {items} items")
+
+    parsers = [('ListingParser', lambda: parse_listing(page, ITEM_RULE, FIELD_RULES))]
+    try:
+        import bs4  # noqa: F401
+        parsers.append(('BeautifulSoup tree', lambda: soup_listing(page)))
+    except ImportError:
+        print("   BeautifulSoup not installed, skipping comparison")
+
+    for name, func in parsers:
+        result = measure(func, iterations)
+        print(format_row(f"{name}", result))
+        print(f"   {result['throughput'] * items:.0f} items/s, peak memory {peak_memory(func):.0f} KiB")
+
+async def bench_scrape(pages: List[str], page_count: int, latency: float) -> None:
+    import httpx
+    from stores.http_client import HttpClientPool, StoreApiClient
+    from stores.scraper import ScraperStore
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency)
+        page = int(request.url.params.get('page', '1'))
+        if page > page_count:
+            return httpx.Response(200, text='<html><body><section class="results"></section></body></html>')
+        return httpx.Response(200, text=pages[(page - 1) % len(pages)])
+
+    class FixtureStore(ScraperStore):
+        store_id = 'fixture'
+        display_name = 'Fixture'
+        item_rule = ITEM_RULE
+        field_rules = FIELD_RULES
+
+    print("== ScraperStore.refresh ==")
+    for concurrency, crawl_delay in [(1, 0.0), (4, 0.0), (4, latency / 2), (8, 0.0)]:
+        pool = HttpClientPool(transport=httpx.MockTransport(handler))
+        store = FixtureStore(StoreApiClient('fixture', 'https://shop.example.com', pool=pool,
+                                            max_concurrency=concurrency))
+        store.max_concurrency = concurrency
+        store.crawl_delay = crawl_delay
+        started = time.perf_counter()
+        deals = await store.refresh(max_pages=page_count + 1)
+        elapsed = time.perf_counter() - started
+        print(f"{f'concurrency {concurrency}, delay {crawl_delay:.3f}s':<40} {deals} deals from {page_count} pages "
+              f"in {elapsed * 1000:8.1f} ms")
+        await pool.aclose()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--pages', type=int, default=20, help='Listing pages per scrape')
+    parser.add_argument('--latency', type=float, default=0.05, help='Simulated seconds per page fetch')
+    args = parser.parse_args()
+
+    from logging_config import configure_logging
+    configure_logging()
+    pages = load_fixtures()
+    bench_parsers(pages, args.iterations)
+    asyncio.run(bench_scrape(pages, args.pages, args.latency))
+
+if __name__ == '__main__':
+    main()
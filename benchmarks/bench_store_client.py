@@ -0,0 +1,106 @@
+"""Benchmark the store API client against the local stub server
+
+Measures page fetch latency through StoreApiClient while the stub is healthy,
+flaky and down, showing what retries and the circuit breaker cost and save,
+then times catalog refreshes with conditional requests:
+
+    python -m benchmarks.bench_store_client --requests 2000 --concurrency 32 --latency 0.01
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from typing import Dict, List
+
+from benchmarks.stats import format_row, summarize
+
+# Keep retry warnings from dominating the measurements
+os.environ.setdefault('LOG_LEVEL', 'ERROR')
+
+async def run_phase(client, requests: int, concurrency: int, pages: int) -> Dict:
+    from stores.http_client import CircuitOpenError, UpstreamError
+
+    rng = random.Random(42)
+    latencies: List[float] = []
+    outcomes: Dict[str, int] = {}
+    remaining = iter(range(requests))
+
+    async def worker():
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                await client.get_deals(page=rng.randint(1, pages), limit=20)
+                outcome = 'ok'
+            except CircuitOpenError:
+                outcome = 'circuit_open'
+            except UpstreamError:
+                outcome = 'failed'
+            latencies.append(time.perf_counter() - started)
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return dict(summarize(latencies, time.perf_counter() - started), outcomes=outcomes)
+
+async def bench_refresh(server, pool, deals: int) -> None:
+    import tempfile
+    from stores.api_store import ApiStore
+    from stores.feed_cache import FeedCache
+    from stores.http_client import StoreApiClient
+
+    class StubApiStore(ApiStore):
+        store_id = 'stub'
+        display_name = 'Stub'
+
+    server.failure_rate = 0.0
+    with tempfile.TemporaryDirectory() as directory:
+        store = StubApiStore(StoreApiClient('stub', server.url, pool=pool),
+                             FeedCache(os.path.join(directory, 'feeds.db')))
+        for name, changed in [('cold', 0), ('unchanged', 0), ('1% changed', max(1, deals // 100))]:
+            for deal in random.Random(changed).sample(server.deals, changed):
+                deal['price'] = round(deal['price'] * 0.9, 2)
+                deal['last_updated'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+            server.requests = server.not_modified = server.bytes_sent = 0
+            started = time.perf_counter()
+            count = await store.refresh(page_size=100, max_pages=deals // 100 + 1)
+            print(f"refresh {name:<12} {count} deals in {(time.perf_counter() - started) * 1000:8.1f} ms, "
+                  f"{server.requests} requests, {server.not_modified} not modified, {server.bytes_sent} bytes")
+
+async def run(args) -> None:
+    from logging_config import configure_logging
+    from benchmarks.bench_paths import make_catalog
+    from benchmarks.stub_store import StubStoreServer
+    from stores.http_client import CircuitBreaker, HttpClientPool, StoreApiClient
+
+    configure_logging()
+    server = StubStoreServer(make_catalog('STUB', 'Stub', args.deals), latency=args.latency).start()
+    pool = HttpClientPool(max_connections=args.concurrency)
+    pages = max(1, args.deals // 20)
+
+    try:
+        for name, failure_rate in [('healthy', 0.0), ('flaky 20%', 0.2), ('down', 1.0)]:
+            server.failure_rate = failure_rate
+            server.requests = 0
+            client = StoreApiClient('stub', server.url, max_concurrency=args.concurrency, retries=args.retries,
+                                    backoff_base=0.01, backoff_max=0.1, pool=pool,
+                                    breaker=CircuitBreaker(failure_threshold=5, reset_timeout=1.0))
+            result = await run_phase(client, args.requests, args.concurrency, pages)
+            print(format_row(f"get_deals {name}", result))
+            print(f"   outcomes: {result['outcomes']}, upstream requests: {server.requests}")
+        await bench_refresh(server, pool, args.deals)
+    finally:
+        await pool.aclose()
+        server.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000, help='Page fetches per phase')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--deals', type=int, default=10000, help='Stub catalog size')
+    parser.add_argument('--latency', type=float, default=0.0, help='Stub seconds per request')
+    parser.add_argument('--retries', type=int, default=3)
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == '__main__':
+    main()
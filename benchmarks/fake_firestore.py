@@ -0,0 +1,271 @@
+"""In-memory stand-in for the subset of the Firestore client the bot uses"""
+import copy
+import itertools
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+_auto_ids = itertools.count(1)
+
+class FakeNotFound(Exception):
+    """Raised by update() on a missing document, like google.api_core NotFound"""
+
+def _resolve(current: Any, value: Any) -> Any:
+    """Apply Firestore sentinels and transforms to a stored value"""
+    kind = type(value).__name__
+    if kind == 'Sentinel':
+        # SERVER_TIMESTAMP (DELETE_FIELD is handled by the caller)
+        return datetime.utcnow()
+    if kind == 'Increment':
+        return (current or 0) + getattr(value, 'value', getattr(value, '_value', 0))
+    return value
+
+def _is_delete(value: Any) -> bool:
+    return type(value).__name__ == 'Sentinel' and 'DELETE' in repr(value).upper()
+
+def _matches(data: Dict, field: str, op: str, value: Any) -> bool:
+    if field not in data:
+        return False
+    current = data[field]
+    try:
+        if op == '==':
+            return current == value
+        if op == '!=':
+            return current != value
+        if op == '<':
+            return current < value
+        if op == '<=':
+            return current <= value
+        if op == '>':
+            return current > value
+        if op == '>=':
+            return current >= value
+        if op == 'in':
+            return current in value
+        if op == 'not-in':
+            return current not in value
+        if op == 'array_contains':
+            return value in current
+        if op == 'array_contains_any':
+            return any(v in current for v in value)
+    except TypeError:
+        return False
+    raise ValueError(f"Unsupported operator: {op}")
+
+class FakeSnapshot:
+    def __init__(self, reference: 'FakeDocumentReference', data: Optional[Dict]):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self) -> Optional[Dict]:
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field: str) -> Any:
+        return (self._data or {}).get(field)
+
+class FakeDocumentReference:
+    def __init__(self, client: 'FakeFirestore', collection: str, doc_id: str):
+        self._client = client
+        self.collection_name = collection
+        self.id = doc_id
+
+    @property
+    def path(self) -> str:
+        return f"{self.collection_name}/{self.id}"
+
+    def get(self, *args, **kwargs) -> FakeSnapshot:
+        self._client._op('read', self.collection_name)
+        with self._client._lock:
+            data = self._client._store.get(self.collection_name, {}).get(self.id)
+            return FakeSnapshot(self, copy.deepcopy(data) if data is not None else None)
+
+    def set(self, data: Dict, merge: bool = False) -> None:
+        self._client._op('write', self.collection_name)
+        with self._client._lock:
+            docs = self._client._store.setdefault(self.collection_name, {})
+            old = docs.get(self.id)
+            docs[self.id] = self._client._apply(dict(old or {}) if merge else {}, data)
+            self._client._reindex(self.collection_name, self.id, old, docs[self.id])
+
+    def update(self, data: Dict) -> None:
+        self._client._op('write', self.collection_name)
+        with self._client._lock:
+            docs = self._client._store.setdefault(self.collection_name, {})
+            if self.id not in docs:
+                raise FakeNotFound(f"No document to update: {self.path}")
+            old = docs[self.id]
+            docs[self.id] = self._client._apply(dict(old), data)
+            self._client._reindex(self.collection_name, self.id, old, docs[self.id])
+
+    def delete(self) -> None:
+        self._client._op('delete', self.collection_name)
+        with self._client._lock:
+            old = self._client._store.get(self.collection_name, {}).pop(self.id, None)
+            self._client._reindex(self.collection_name, self.id, old, None)
+
+class FakeQuery:
+    def __init__(self, client: 'FakeFirestore', collection: str, filters=(), limit_count=None, order=None):
+        self._client = client
+        self._collection = collection
+        self._filters = tuple(filters)
+        self._limit = limit_count
+        self._order = order
+
+    def where(self, field_path: str = None, op_string: str = None, value: Any = None, filter=None) -> 'FakeQuery':
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return FakeQuery(self._client, self._collection,
+                         self._filters + ((field_path, op_string, value),), self._limit, self._order)
+
+    def limit(self, count: int) -> 'FakeQuery':
+        return FakeQuery(self._client, self._collection, self._filters, count, self._order)
+
+    def order_by(self, field_path: str, direction: str = 'ASCENDING') -> 'FakeQuery':
+        return FakeQuery(self._client, self._collection, self._filters, self._limit,
+                         (field_path, direction == 'DESCENDING'))
+
+    def get(self, *args, **kwargs) -> List[FakeSnapshot]:
+        return list(self.stream())
+
+    def stream(self, *args, **kwargs):
+        self._client._op('query', self._collection)
+        with self._client._lock:
+            docs = self._client._store.get(self._collection, {})
+            candidates = docs.keys()
+            # Equality filters use an index, as real Firestore queries do
+            for field, op, value in self._filters:
+                if op == '==':
+                    try:
+                        candidates = self._client._index(self._collection, field).get(value, ())
+                    except TypeError:
+                        continue
+                    break
+            matches = [
+                (doc_id, docs[doc_id]) for doc_id in candidates
+                if all(_matches(docs[doc_id], *f) for f in self._filters)
+            ]
+            if self._order:
+                field, reverse = self._order
+                matches.sort(key=lambda item: item[1].get(field), reverse=reverse)
+            if self._limit is not None:
+                matches = matches[:self._limit]
+            snapshots = [
+                FakeSnapshot(FakeDocumentReference(self._client, self._collection, doc_id), copy.deepcopy(data))
+                for doc_id, data in matches
+            ]
+        yield from snapshots
+
+class FakeCollectionReference(FakeQuery):
+    def __init__(self, client: 'FakeFirestore', name: str):
+        super().__init__(client, name)
+        self.id = name
+
+    def document(self, doc_id: Optional[str] = None) -> FakeDocumentReference:
+        return FakeDocumentReference(self._client, self._collection, doc_id or f"auto{next(_auto_ids)}")
+
+    def add(self, data: Dict):
+        ref = self.document()
+        ref.set(data)
+        return datetime.utcnow(), ref
+
+class FakeBatch:
+    def __init__(self, client: 'FakeFirestore'):
+        self._client = client
+        self._writes = []
+
+    def set(self, ref: FakeDocumentReference, data: Dict, merge: bool = False) -> None:
+        self._writes.append(lambda: ref.set(data, merge=merge))
+
+    def update(self, ref: FakeDocumentReference, data: Dict) -> None:
+        self._writes.append(lambda: ref.update(data))
+
+    def delete(self, ref: FakeDocumentReference) -> None:
+        self._writes.append(ref.delete)
+
+    def commit(self) -> None:
+        for write in self._writes:
+            write()
+        self._writes = []
+
+class FakeFirestore:
+    """Thread-safe in-memory Firestore client
+
+    Args:
+        latency: Optional seconds to sleep per call, to mimic network round-trips
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.operations = {}
+        self._store = {}
+        self._indexes = {}
+        self._lock = threading.RLock()
+
+    def _op(self, operation: str, collection: str) -> None:
+        key = (collection, operation)
+        self.operations[key] = self.operations.get(key, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _index(self, collection: str, field: str) -> Dict[Any, set]:
+        """Equality index of field values to document IDs, built on first use"""
+        key = (collection, field)
+        index = self._indexes.get(key)
+        if index is None:
+            index = {}
+            for doc_id, data in self._store.get(collection, {}).items():
+                if field in data:
+                    index.setdefault(data[field], set()).add(doc_id)
+            self._indexes[key] = index
+        return index
+
+    def _reindex(self, collection: str, doc_id: str, old: Optional[Dict], new: Optional[Dict]) -> None:
+        """Keep existing equality indexes in step with a document write"""
+        for (indexed_collection, field), index in self._indexes.items():
+            if indexed_collection != collection:
+                continue
+            try:
+                if old and field in old:
+                    index.get(old[field], set()).discard(doc_id)
+                if new and field in new:
+                    index.setdefault(new[field], set()).add(doc_id)
+            except TypeError:
+                # Unhashable values are never looked up through the index
+                pass
+
+    def _apply(self, current: Dict, data: Dict) -> Dict:
+        for key, value in data.items():
+            if _is_delete(value):
+                current.pop(key, None)
+            else:
+                current[key] = _resolve(current.get(key), value)
+        return current
+
+    def collection(self, name: str) -> FakeCollectionReference:
+        return FakeCollectionReference(self, name)
+
+    def batch(self) -> FakeBatch:
+        return FakeBatch(self)
+
+    def get_all(self, references, *args, **kwargs):
+        """Read several documents in one round trip, like Client.get_all"""
+        references = list(references)
+        if references:
+            self._op('read', references[0].collection_name)
+        with self._lock:
+            snapshots = []
+            for ref in references:
+                data = self._store.get(ref.collection_name, {}).get(ref.id)
+                snapshots.append(FakeSnapshot(ref, copy.deepcopy(data) if data is not None else None))
+        yield from snapshots
+
+def install_fake_firestore(fake: Optional[FakeFirestore] = None) -> FakeFirestore:
+    """Make firebase_client.get_db() return an in-memory fake"""
+    import firebase_client
+
+    fake = fake or FakeFirestore()
+    firebase_client.set_db(fake)
+    return fake
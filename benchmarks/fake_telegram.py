@@ -0,0 +1,139 @@
+"""Offline Telegram Bot API backend and synthetic update builders"""
+import asyncio
+import hashlib
+import itertools
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+
+from telegram import Bot, Update
+from telegram.request import BaseRequest, RequestData
+
+BOT_USER = {'id': 1000000001, 'is_bot': True, 'first_name': 'DealsHunter', 'username': 'dailydealsfinderbot'}
+
+class FakeTelegramRequest(BaseRequest):
+    """BaseRequest that answers Bot API calls locally instead of over HTTP
+
+    Args:
+        latency: Optional seconds to await per call, to mimic the Bot API round-trip
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = {}
+        # Photos sent by URL, i.e. the ones Telegram would have to download
+        self.photo_downloads = 0
+        self._message_ids = itertools.count(1)
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return None
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def _message(self, params: Dict, photo: Optional[str] = None) -> Dict:
+        message = {
+            'message_id': int(params.get('message_id') or next(self._message_ids)),
+            'date': int(time.time()),
+            'chat': {'id': int(params.get('chat_id', 0)), 'type': 'private'},
+            'from': BOT_USER,
+            'text': params.get('text', '')
+        }
+        if photo:
+            message['photo'] = self._photo_sizes(photo)
+        return message
+
+    def _photo_sizes(self, photo: str) -> List[Dict]:
+        # A URL is "downloaded" on every send; a file_id is reused as is
+        if photo.startswith(('http://', 'https://')):
+            self.photo_downloads += 1
+            photo = 'AgAC' + hashlib.sha1(photo.encode()).hexdigest()
+        return [
+            {'file_id': f'{photo}-thumb', 'file_unique_id': f'{photo[4:12]}t', 'width': 90, 'height': 90},
+            {'file_id': photo, 'file_unique_id': photo[4:12], 'width': 800, 'height': 800}
+        ]
+
+    async def do_request(self, url: str, method: str, request_data: Optional[RequestData] = None,
+                         read_timeout=None, write_timeout=None, connect_timeout=None,
+                         pool_timeout=None) -> Tuple[int, bytes]:
+        api_method = url.rsplit('/', 1)[-1]
+        self.calls[api_method] = self.calls.get(api_method, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        params = request_data.parameters if request_data else {}
+        if api_method == 'getMe':
+            result = BOT_USER
+        elif api_method in ('sendMessage', 'editMessageText'):
+            result = self._message(params)
+        elif api_method == 'sendPhoto':
+            result = self._message(params, params.get('photo'))
+        elif api_method == 'sendMediaGroup':
+            media = params.get('media') or []
+            if isinstance(media, str):
+                media = json.loads(media)
+            result = [self._message(params, item.get('media')) for item in media]
+        else:
+            result = True
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+async def make_bot(request: Optional[FakeTelegramRequest] = None) -> Bot:
+    """Create an initialized Bot backed by the fake request"""
+    bot = Bot('123456:OFFLINE-BENCHMARK', request=request or FakeTelegramRequest())
+    await bot.initialize()
+    return bot
+
+_update_ids = itertools.count(1)
+
+def _user(user_id: int) -> Dict:
+    return {'id': user_id, 'is_bot': False, 'first_name': f'User{user_id}', 'language_code': 'en'}
+
+def make_command_update(bot: Bot, user_id: int, text: str = '/start') -> Update:
+    """Build a private-chat command message update"""
+    command = text.split()[0]
+    return Update.de_json({
+        'update_id': next(_update_ids),
+        'message': {
+            'message_id': next(_update_ids),
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': _user(user_id),
+            'text': text,
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(command)}]
+        }
+    }, bot)
+
+def make_callback_update(bot: Bot, user_id: int, data: str, message_id: int = 1) -> Update:
+    """Build an inline-keyboard button press update"""
+    return Update.de_json({
+        'update_id': next(_update_ids),
+        'callback_query': {
+            'id': str(next(_update_ids)),
+            'from': _user(user_id),
+            'chat_instance': str(user_id),
+            'data': data,
+            'message': {
+                'message_id': message_id,
+                'date': int(time.time()),
+                'chat': {'id': user_id, 'type': 'private'},
+                'from': BOT_USER,
+                'text': 'menu'
+            }
+        }
+    }, bot)
+
+def make_inline_query_update(bot: Bot, user_id: int, query: str) -> Update:
+    """Build an "@bot <query>" inline query update"""
+    return Update.de_json({
+        'update_id': next(_update_ids),
+        'inline_query': {
+            'id': str(next(_update_ids)),
+            'from': _user(user_id),
+            'query': query,
+            'offset': ''
+        }
+    }, bot)
@@ -0,0 +1,159 @@
+"""Replay synthetic Telegram update streams into the bot's Application
+
+Virtual users walk through realistic sessions (start, store browsing, paging,
+notification toggles, language switches) while updates are injected at a fixed
+rate. Telegram and Firestore are faked, with optional simulated latency, and
+the run reports queue depth, handler latency and dropped updates:
+
+    python -m benchmarks.load_simulator --rate 200 --duration 30 --users 5000 \\
+        --concurrency 32 --firestore-latency 0.02 --telegram-latency 0.05
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from typing import Dict, List
+
+from benchmarks.stats import percentile, summarize
+
+# Keep handler logging from dominating the measurements
+os.environ.setdefault('LOG_LEVEL', 'ERROR')
+
+STORES = ['amazon', 'aliexpress', 'ebay', 'shein']
+LANGUAGES = ['en', 'uz', 'ru']
+
+def session_script(rng: random.Random) -> List[str]:
+    """One virtual user's session; '/start' is a command, the rest are button presses"""
+    store = rng.choice(STORES)
+    steps = ['/start', 'check_sales', f'store_{store}']
+    steps += [f'page_{store}_{page}' for page in range(2, rng.randint(2, 6))]
+    if rng.random() < 0.3:
+        steps += ['notifications', f'toggle_notify_{rng.choice(STORES)}']
+    if rng.random() < 0.1:
+        steps += ['change_language', f'lang_{rng.choice(LANGUAGES)}']
+    steps += ['main_menu']
+    return steps
+
+class SessionPool:
+    """Picks a random user and returns the next step of their session"""
+
+    def __init__(self, users: int, seed: int = 42):
+        self.rng = random.Random(seed)
+        self.users = users
+        self.sessions: Dict[int, List[str]] = {}
+
+    def next_action(self):
+        user_id = self.rng.randint(1, self.users)
+        steps = self.sessions.get(user_id)
+        if not steps:
+            steps = self.sessions[user_id] = session_script(self.rng)
+        return user_id, steps.pop(0)
+
+async def simulate(args) -> None:
+    from benchmarks.fake_firestore import FakeFirestore, install_fake_firestore
+    fake = install_fake_firestore(FakeFirestore(latency=args.firestore_latency))
+
+    from telegram import Update
+    from telegram.ext import Application, TypeHandler
+    import bot as bot_module
+    from benchmarks.fake_telegram import FakeTelegramRequest, make_callback_update, make_command_update
+
+    request = FakeTelegramRequest(latency=args.telegram_latency)
+    application = (
+        Application.builder()
+        .token('123456:OFFLINE-LOADTEST')
+        .request(request)
+        .get_updates_request(FakeTelegramRequest())
+        .updater(None)
+        .concurrent_updates(args.concurrency)
+        .build()
+    )
+    bot_module.register_handlers(application)
+
+    enqueued_at: Dict[int, float] = {}
+    latencies: List[float] = []
+    errors = 0
+
+    async def on_done(update: Update, context) -> None:
+        started = enqueued_at.pop(update.update_id, None)
+        if started is not None:
+            latencies.append(time.perf_counter() - started)
+
+    async def on_error(update, context) -> None:
+        nonlocal errors
+        errors += 1
+
+    # Group 1 runs after the bot's own handlers (group 0) for the same update
+    application.add_handler(TypeHandler(Update, on_done), group=1)
+    application.add_error_handler(on_error)
+
+    await application.initialize()
+    await application.start()
+
+    sessions = SessionPool(args.users)
+    queue_depths = []
+    sent = dropped = 0
+    interval = 1.0 / args.rate
+    started = time.perf_counter()
+    next_send = started
+
+    while time.perf_counter() - started < args.duration:
+        now = time.perf_counter()
+        # Catch up in bursts if the event loop fell behind the schedule
+        while next_send <= now:
+            user_id, action = sessions.next_action()
+            if action.startswith('/'):
+                update = make_command_update(application.bot, user_id, action)
+            else:
+                update = make_callback_update(application.bot, user_id, action)
+
+            # PTB moves queued updates into tasks right away, so count everything
+            # accepted but not yet fully handled as the backlog
+            depth = len(enqueued_at)
+            queue_depths.append(depth)
+            if depth >= args.max_queue:
+                dropped += 1
+            else:
+                enqueued_at[update.update_id] = time.perf_counter()
+                application.update_queue.put_nowait(update)
+                sent += 1
+            next_send += interval
+        await asyncio.sleep(max(0.0, next_send - time.perf_counter()))
+
+    send_elapsed = time.perf_counter() - started
+    drain_deadline = time.perf_counter() + args.drain_timeout
+    while enqueued_at and time.perf_counter() < drain_deadline:
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - started
+
+    await application.stop()
+    await application.shutdown()
+
+    summary = summarize(latencies, elapsed)
+    print(f"Offered rate:      {args.rate:.1f} updates/s for {send_elapsed:.1f}s "
+          f"({args.users} users, concurrency {args.concurrency})")
+    print(f"Updates:           {sent} accepted, {dropped} dropped (backlog >= {args.max_queue}), "
+          f"{len(enqueued_at)} unfinished after drain, {errors} handler errors")
+    print(f"Throughput:        {summary['throughput']:.1f} updates/s")
+    print(f"Handler latency:   p50 {summary['p50_ms']:.1f} ms  p99 {summary['p99_ms']:.1f} ms  "
+          f"max {summary['max_ms']:.1f} ms (enqueue to last handler)")
+    print(f"Backlog depth:     p50 {percentile(queue_depths, 50):.0f}  p99 {percentile(queue_depths, 99):.0f}  "
+          f"max {max(queue_depths, default=0)}")
+    print(f"Telegram calls:    {request.calls}")
+    print(f"Firestore calls:   {dict(fake.operations)}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rate', type=float, default=100.0, help='Updates per second')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds to inject updates')
+    parser.add_argument('--users', type=int, default=1000, help='Distinct virtual users')
+    parser.add_argument('--concurrency', type=int, default=16, help='Application concurrent_updates')
+    parser.add_argument('--max-queue', type=int, default=1000, help='Backlog above which updates are dropped')
+    parser.add_argument('--firestore-latency', type=float, default=0.0, help='Seconds per Firestore call')
+    parser.add_argument('--telegram-latency', type=float, default=0.0, help='Seconds per Bot API call')
+    parser.add_argument('--drain-timeout', type=float, default=10.0, help='Seconds to wait for the queue to drain')
+    asyncio.run(simulate(parser.parse_args()))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,28 @@
+import math
+from typing import Dict, List
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of samples (pct in 0-100)"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+def summarize(latencies: List[float], elapsed: float) -> Dict[str, float]:
+    """Summarize per-operation latencies (seconds) over a run of elapsed seconds"""
+    count = len(latencies)
+    return {
+        'count': count,
+        'throughput': count / elapsed if elapsed > 0 else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'max_ms': max(latencies) * 1000 if latencies else 0.0
+    }
+
+def format_row(name: str, summary: Dict[str, float]) -> str:
+    """Format a summary as one aligned report line"""
+    return (
+        f"{name:<40} {summary['count']:>9} ops {summary['throughput']:>12.1f} ops/s "
+        f"p50 {summary['p50_ms']:>9.3f} ms  p99 {summary['p99_ms']:>9.3f} ms"
+    )
@@ -0,0 +1,131 @@
+"""Local stand-in for a marketplace deals API
+
+Serves GET /deals?page=&limit= from a synthetic catalog with ETags (answering
+If-None-Match with 304), optional latency and injected failures, so store
+clients can be exercised offline:
+
+    python -m benchmarks.stub_store --port 8081 --deals 5000 --failure-rate 0.1
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from benchmarks.bench_paths import make_catalog
+
+class StubStoreServer:
+    """Threaded HTTP server whose behaviour can be changed while it runs
+
+    Args:
+        deals: Raw deals to serve
+        latency: Seconds to sleep per request
+        failure_rate: Fraction of requests answered with failure_status
+        failure_status: Status returned for injected failures
+    """
+
+    def __init__(self, deals: List[Dict], host: str = '127.0.0.1', port: int = 0,
+                 latency: float = 0.0, failure_rate: float = 0.0, failure_status: int = 503):
+        self.deals = deals
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.requests = 0
+        self.failures = 0
+        self.not_modified = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self._rng = random.Random(42)
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out in separate writes; don't let Nagle delay the body
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status: int, body: Dict, conditional: bool = False) -> None:
+                payload = json.dumps(body).encode()
+                etag = f'"{hashlib.sha1(payload).hexdigest()}"'
+                if conditional and self.headers.get('If-None-Match') == etag:
+                    status, payload = 304, b''
+                with stub._lock:
+                    stub.bytes_sent += len(payload)
+                    stub.not_modified += status == 304
+                self.send_response(status)
+                if conditional:
+                    self.send_header('ETag', etag)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.requests += 1
+                    failed = stub._rng.random() < stub.failure_rate
+                    if failed:
+                        stub.failures += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                if failed:
+                    self._send(stub.failure_status, {'error': 'injected failure'})
+                    return
+
+                parts = urlsplit(self.path)
+                if parts.path.rstrip('/') != '/deals':
+                    self._send(404, {'error': 'not found'})
+                    return
+                query = parse_qs(parts.query)
+                page = int(query.get('page', ['1'])[0])
+                limit = int(query.get('limit', ['5'])[0])
+                start = (page - 1) * limit
+                self._send(200, {'deals': stub.deals[start:start + limit], 'total': len(stub.deals)}, conditional=True)
+
+        return Handler
+
+    def start(self) -> 'StubStoreServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, name='stub-store', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--deals', type=int, default=1000, help='Catalog size')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds per request')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Fraction of requests that fail')
+    parser.add_argument('--failure-status', type=int, default=503)
+    args = parser.parse_args()
+
+    server = StubStoreServer(make_catalog('STUB', 'Stub', args.deals), port=args.port, latency=args.latency,
+                             failure_rate=args.failure_rate, failure_status=args.failure_status).start()
+    print(f"Serving {args.deals} deals at {server.url}/deals")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Sustained-throughput load test for the Stripe webhook endpoint
+
+Sends correctly signed Stripe events to a running webhook server and reports
+throughput and latency percentiles:
+
+    STRIPE_WEBHOOK_SECRET=whsec_... python -m benchmarks.webhook_load \\
+        --url http://127.0.0.1:5000/webhook --concurrency 32 --duration 30
+
+The default event type is not handled by the bot, so the run measures
+signature verification and acknowledgement without touching Firestore. Use
+--event-type checkout.session.completed only against a test project.
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import Counter
+
+from benchmarks.stats import format_row, summarize
+
+def build_event(event_type: str) -> str:
+    """Build a minimal Stripe event payload with a unique event ID"""
+    return json.dumps({
+        'id': f"evt_load_{uuid.uuid4().hex}",
+        'object': 'event',
+        'type': event_type,
+        'created': int(time.time()),
+        'data': {
+            'object': {
+                'id': f"cs_load_{uuid.uuid4().hex}",
+                'object': 'checkout.session',
+                'customer': 'cus_loadtest',
+                'subscription': 'sub_loadtest',
+                'metadata': {'user_id': 'loadtest'}
+            }
+        }
+    })
+
+def sign(payload: str, secret: str) -> str:
+    """Compute a Stripe-Signature header for payload"""
+    timestamp = int(time.time())
+    signed = f"{timestamp}.{payload}".encode()
+    signature = hmac.new(secret.encode(), signed, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+def run(url: str, secret: str, event_type: str, concurrency: int, duration: float):
+    latencies = []
+    statuses = Counter()
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker():
+        local_latencies = []
+        local_statuses = Counter()
+        while time.monotonic() < deadline:
+            payload = build_event(event_type)
+            request = urllib.request.Request(url, data=payload.encode(), method='POST', headers={
+                'Content-Type': 'application/json',
+                'Stripe-Signature': sign(payload, secret)
+            })
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=30) as response:
+                    response.read()
+                    local_statuses[response.status] += 1
+            except urllib.error.HTTPError as e:
+                local_statuses[e.code] += 1
+            except Exception as e:
+                local_statuses[type(e).__name__] += 1
+                continue
+            local_latencies.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local_latencies)
+            statuses.update(local_statuses)
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    print(format_row(f"POST {event_type} x{concurrency}", summarize(latencies, elapsed)))
+    print(f"Responses: {dict(statuses)}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000/webhook')
+    parser.add_argument('--secret', default=os.getenv('STRIPE_WEBHOOK_SECRET'))
+    parser.add_argument('--event-type', default='customer.updated')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0)
+    args = parser.parse_args()
+
+    if not args.secret:
+        parser.error("--secret or STRIPE_WEBHOOK_SECRET is required")
+
+    run(args.url, args.secret, args.event_type, args.concurrency, args.duration)
+
+if __name__ == '__main__':
+    main()
@@ -1,63 +1,231 @@
+import time
+_import_started = time.perf_counter()
+
+import asyncio
+import functools
+import hashlib
+import json
 import logging
 import os
 import sys
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from user_manager import UserManager
-from deal_fetcher import DealFetcher
+import threading
+from typing import TYPE_CHECKING, Optional
+from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes, InlineQueryHandler
+from telegram import (Update, InlineKeyboardButton, InlineKeyboardMarkup, InlineQueryResultArticle,
+                      InputTextMessageContent)
+from telegram.error import BadRequest
 import signal
-import firebase_admin
-from firebase_admin import credentials, firestore
 from translations.lang import TRANSLATIONS
-from stripe_config import create_checkout_session, cancel_stripe_subscription
-from notification_manager import NotificationManager
 from dotenv import load_dotenv
+from metrics import (BOT_STAGE_LATENCY, HANDLER_LATENCY, REGISTRY, SKIPPED_EDITS, STARTUP_DURATION, THROTTLED_UPDATES,
+                     start_snapshot_writer)
+from logging_config import configure_logging
+from lifecycle import run_shutdown_hooks
+from throttle import Coalescer, RateLimiter
+from ttl_cache import TTLCache
+
+if TYPE_CHECKING:
+    from user_manager import UserManager
+    from deal_fetcher import DealFetcher
+    from notification_manager import NotificationManager
+    from deal_media import TelegramFileCache
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Configure logging with more detailed format
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.DEBUG  # Set to DEBUG for more verbose output
-)
+# Configure logging (see logging_config.py for LOG_* settings)
+configure_logging()
 
 logger = logging.getLogger(__name__)
-user_manager = UserManager()
-deal_fetcher = DealFetcher()
-notification_manager = NotificationManager()
+
+def lazy_singleton(factory):
+    """Create the object on first call and return the same instance afterwards"""
+    lock = threading.Lock()
+    instance = []
+
+    @functools.wraps(factory)
+    def get():
+        if not instance:
+            with lock:
+                if not instance:
+                    instance.append(factory())
+        return instance[0]
+    return get
+
+# Firestore and the store catalogs are only set up when first needed (or by
+# warm_up_services in the background), so importing this module stays cheap
+@lazy_singleton
+def get_user_manager() -> "UserManager":
+    from user_manager import UserManager
+    return UserManager()
+
+@lazy_singleton
+def get_deal_fetcher() -> "DealFetcher":
+    from deal_fetcher import DealFetcher
+    return DealFetcher()
+
+@lazy_singleton
+def get_telegram_files() -> "TelegramFileCache":
+    from deal_media import TelegramFileCache
+    return TelegramFileCache()
+
+@lazy_singleton
+def get_notification_manager() -> "NotificationManager":
+    from notification_manager import NotificationManager
+    return NotificationManager()
+
+def warm_up_services() -> None:
+    """Create the Firestore-backed services and store catalogs ahead of the first update"""
+    try:
+        started = time.perf_counter()
+        get_user_manager()
+        get_notification_manager()
+        get_deal_fetcher().load_all_stores()
+        logger.info("Services warmed up in %.3fs", time.perf_counter() - started)
+    except Exception as e:
+        logger.error(f"Error warming up services: {str(e)}")
 
 # Keep track of running application
 telegram_app = None
 
-def signal_handler(signum, frame):
-    """Handle shutdown signals"""
-    logger.info("Received shutdown signal")
-    cleanup()
-    os._exit(0)
+# Seconds a shutdown may spend draining handlers, then flushing buffered work;
+# together they must stay below the supervisor's kill timeout
+DRAIN_TIMEOUT = float(os.getenv("BOT_DRAIN_TIMEOUT", "20"))
+FLUSH_TIMEOUT = float(os.getenv("BOT_FLUSH_TIMEOUT", "5"))
 
 def cleanup():
-    """Cleanup function to stop all services"""
-    logger.info("Cleaning up resources...")
+    """Flush buffered work after the application has stopped"""
     global telegram_app
-    if telegram_app:
-        logger.info("Stopping Telegram bot...")
-        telegram_app.stop()
-        telegram_app = None
+    telegram_app = None
+    logger.info("Flushing buffered work...")
+    run_shutdown_hooks(FLUSH_TIMEOUT)
+
+# Callback data prefixes and exact values reported as metric routes
+CALLBACK_ROUTE_PREFIXES = ("toggle_notify_", "store_", "page_", "search_", "foryou_", "notify_", "lang_")
+CALLBACK_ROUTES = {
+    "main_menu", "check_sales", "notifications", "noop", "change_language",
+    "premium", "upgrade_premium", "cancel_subscription", "photos"
+}
+
+def get_callback_route(data: str) -> str:
+    """Map callback data to a bounded route name for metrics"""
+    for prefix in CALLBACK_ROUTE_PREFIXES:
+        if data.startswith(prefix):
+            return prefix.rstrip("_")
+    return data if data in CALLBACK_ROUTES else "other"
+
+# Tasks running a handler, so a shutdown that can't drain them can cancel them
+RUNNING_HANDLERS = set()
+
+def track_latency(handler_name: str):
+    """Record the handler's latency, split by callback route"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+            query = update.callback_query
+            route = get_callback_route(query.data or "") if query else handler_name
+            task = asyncio.current_task()
+            RUNNING_HANDLERS.add(task)
+            try:
+                with HANDLER_LATENCY.time(handler=handler_name, route=route):
+                    return await func(update, context)
+            finally:
+                RUNNING_HANDLERS.discard(task)
+        return wrapper
+    return decorator
+
+# Per-user token buckets shared by commands and button presses
+RATE_LIMITER = RateLimiter()
+
+async def answer_coalesced(update: Update) -> None:
+    """Stop the loading spinner of a press that a later press on the same message replaced"""
+    THROTTLED_UPDATES.inc(handler="callback", reason="coalesced")
+    await update.callback_query.answer()
+
+# Presses on a message run one at a time; ones made meanwhile collapse into the latest
+CALLBACK_COALESCER = Coalescer(on_skip=answer_coalesced)
+
+def throttle(handler_name: str):
+    """Drop updates from users over their rate limit and coalesce rapid presses on one message"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+            user = update.effective_user
+            query = update.callback_query
+            if user is not None and not RATE_LIMITER.allow(user.id):
+                THROTTLED_UPDATES.inc(handler=handler_name, reason="rate")
+                logger.debug("Throttled %s update from user %s", handler_name, user.id)
+                if query is not None:
+                    # Telegram's language code avoids a Firestore read for the user's setting
+                    lang = user.language_code if user.language_code in TRANSLATIONS else "en"
+                    await query.answer(TRANSLATIONS[lang]["too_many_requests"])
+                return
+            if query is not None:
+                message_key = query.message.message_id if query.message else query.inline_message_id
+                return await CALLBACK_COALESCER.run((query.from_user.id, message_key), func, update, context)
+            return await func(update, context)
+        return wrapper
+    return decorator
+
+# (chat ID, message ID) or inline message ID -> fingerprint of the content the bot last put there
+MESSAGE_FINGERPRINTS = TTLCache(maxsize=100_000, ttl=60 * 60)
+REGISTRY.register_cache("message_fingerprint", MESSAGE_FINGERPRINTS)
+
+def message_fingerprint(text: str, **kwargs) -> bytes:
+    """Hash of a message's text, keyboard and display options"""
+    markup = kwargs.get("reply_markup")
+    options = {key: value for key, value in kwargs.items() if key != "reply_markup"}
+    content = json.dumps([text, markup.to_dict() if markup is not None else None, options],
+                         sort_keys=True, default=str)
+    return hashlib.blake2b(content.encode(), digest_size=16).digest()
+
+async def edit_message(query, text: str, **kwargs) -> None:
+    """Edit the message behind a callback query, unless it already shows this content"""
+    if query.message is not None:
+        message_key = (query.message.chat.id, query.message.message_id)
+    else:
+        message_key = query.inline_message_id
+    fingerprint = message_fingerprint(text, **kwargs)
+    if MESSAGE_FINGERPRINTS.get(message_key) == fingerprint:
+        SKIPPED_EDITS.inc(reason="fingerprint")
+        return
+
+    with BOT_STAGE_LATENCY.time(stage="telegram_edit"):
+        try:
+            await query.edit_message_text(text, **kwargs)
+        except BadRequest as e:
+            if "message is not modified" not in str(e).lower():
+                MESSAGE_FINGERPRINTS.pop(message_key)
+                raise
+            # Edited before the fingerprint was cached, e.g. by an earlier process
+            SKIPPED_EDITS.inc(reason="not_modified")
+        except Exception:
+            # The message may now show anything; don't skip the next edit
+            MESSAGE_FINGERPRINTS.pop(message_key)
+            raise
+    MESSAGE_FINGERPRINTS.set(message_key, fingerprint)
 
 def get_store_keyboard(lang: str) -> InlineKeyboardMarkup:
     """Get keyboard with store buttons"""
-    store_buttons = []
-    for store_id in deal_fetcher.get_available_stores():
-        store_name = deal_fetcher.get_store_name(store_id)
+    store_buttons = [[InlineKeyboardButton(TRANSLATIONS[lang]["for_you_button"], callback_data="foryou_1")]]
+    for store_id in get_deal_fetcher().get_available_stores():
+        store_name = get_deal_fetcher().get_store_name(store_id)
         store_buttons.append([InlineKeyboardButton(f"🏪 {store_name}", callback_data=f"store_{store_id}")])
 
     store_buttons.append([InlineKeyboardButton(TRANSLATIONS[lang]["back_button"], callback_data="main_menu")])
     return InlineKeyboardMarkup(store_buttons)
 
-def get_store_deals_keyboard(store_id: str, page: int, total_pages: int, lang: str, is_notification: bool = False) -> InlineKeyboardMarkup:
+def get_photos_row(deals, lang: str) -> list:
+    """A button sending the photos of the deals shown, if any of them has one"""
+    from deal_media import has_images
+    if not has_images(deals):
+        return []
+    return [[InlineKeyboardButton(TRANSLATIONS[lang]["photos_button"], callback_data="photos")]]
+
+def get_store_deals_keyboard(store_id: str, page: int, total_pages: int, lang: str, is_notification: bool = False,
+                             deals=()) -> InlineKeyboardMarkup:
     """Get keyboard for store deals with pagination"""
-    keyboard = []
+    keyboard = get_photos_row(deals, lang)
 
     # Only show navigation buttons if not in notification mode
     if not is_notification:
@@ -98,6 +266,75 @@ def get_store_deals_keyboard(store_id: str, page: int, total_pages: int, lang: s
 
     return InlineKeyboardMarkup(keyboard)
 
+def get_feed_keyboard(prefix: str, page: int, total_pages: int, lang: str, deals=()) -> InlineKeyboardMarkup:
+    """Get keyboard for search results or the personalized feed, paging with <prefix>_<page>"""
+    keyboard = get_photos_row(deals, lang)
+    if total_pages > 1:
+        keyboard.append([
+            InlineKeyboardButton(
+                TRANSLATIONS[lang]["page_indicator"].format(current=page, total=total_pages),
+                callback_data="noop"
+            )
+        ])
+        navigation = []
+        if page > 1:
+            navigation.append(InlineKeyboardButton(TRANSLATIONS[lang]["load_previous"], callback_data=f"{prefix}_{page-1}"))
+        if page < total_pages:
+            navigation.append(InlineKeyboardButton(TRANSLATIONS[lang]["load_more"], callback_data=f"{prefix}_{page+1}"))
+        keyboard.append(navigation)
+
+    keyboard.append([InlineKeyboardButton(TRANSLATIONS[lang]["back_button"], callback_data="main_menu")])
+    return InlineKeyboardMarkup(keyboard)
+
+def is_daily_limit_reached(user_id: int, page: int, is_premium: bool) -> bool:
+    """Check if a basic user has paged past their limit or viewed all of today's deals"""
+    return not is_premium and (page > 3 or get_deal_fetcher().daily_views_left(user_id) == 0)
+
+def render_search_results(user_id: int, query_text: str, page: int, is_premium: bool, lang: str):
+    """Get the message text, keyboard and deals shown for a page of search results"""
+    with BOT_STAGE_LATENCY.time(stage="search"):
+        deals, total_pages = get_deal_fetcher().search_deals(query_text, page, is_premium, user_id)
+    header = TRANSLATIONS[lang]["search_results_header"].format(query_text)
+    if deals:
+        with BOT_STAGE_LATENCY.time(stage="render"):
+            message = header + "\n\n" + get_deal_fetcher().format_deals_message(deals, lang, user_id)
+    elif is_daily_limit_reached(user_id, page, is_premium):
+        message = header + "\n\n" + TRANSLATIONS[lang]["premium_info"]
+    else:
+        message = TRANSLATIONS[lang]["search_no_results"].format(query_text)
+    return message, get_feed_keyboard("search", page, total_pages, lang, deals), deals
+
+def render_personalized_deals(user_id: int, page: int, is_premium: bool, lang: str):
+    """Get the message text, keyboard and deals shown for a page of the user's personalized feed"""
+    interests = get_user_manager().get_user_interests(user_id)
+    with BOT_STAGE_LATENCY.time(stage="deal_fetch"):
+        deals, total_pages = get_deal_fetcher().get_personalized_deals(interests, page, is_premium, user_id)
+    header = TRANSLATIONS[lang]["for_you_header"]
+    if deals:
+        with BOT_STAGE_LATENCY.time(stage="render"):
+            message = header + "\n\n" + get_deal_fetcher().format_deals_message(deals, lang, user_id)
+    elif is_daily_limit_reached(user_id, page, is_premium):
+        message = header + "\n\n" + TRANSLATIONS[lang]["premium_info"]
+    else:
+        message = header + "\n\n" + TRANSLATIONS[lang]["no_deals_found"]
+    return message, get_feed_keyboard("foryou", page, total_pages, lang, deals), deals
+
+def record_interest(user_id: int, store_id: Optional[str] = None, weight: float = 1.0, deals=(), categories=()) -> None:
+    """Learn which stores and categories a user cares about from what they open and subscribe to
+
+    The store gets the full weight; each category shown or asked for gets a fifth of it.
+    """
+    from deal_ranking import interest_key
+    weights = {}
+    if store_id:
+        weights[interest_key("store", store_id)] = weight
+    shown = [(deal.get("metadata") or {}).get("category") for deal in deals]
+    for category in list(categories) + shown:
+        if category:
+            key = interest_key("category", category)
+            weights[key] = weights.get(key, 0) + weight / 5
+    get_user_manager().record_interests(user_id, weights)
+
 def get_main_menu_keyboard(lang: str = "en") -> InlineKeyboardMarkup:
     buttons = {
         'en': ["🏷 Check Sales", "🔔 Set Notification", "🌐 Change Language", "⭐️ Premium"],
@@ -153,7 +390,7 @@ def get_notifications_menu_keyboard(user_id: str, lang: str) -> InlineKeyboardMa
     keyboard = []
 
     # Get current notifications
-    notifications = notification_manager.get_user_notifications(str(user_id))
+    notifications = get_notification_manager().get_user_notifications(str(user_id))
     store_notifications = {}
     for notif in notifications:
         store = notif['store']
@@ -162,8 +399,8 @@ def get_notifications_menu_keyboard(user_id: str, lang: str) -> InlineKeyboardMa
         store_notifications[store] += 1
 
     # Add button for each available store
-    for store_id in deal_fetcher.get_available_stores():
-        store_name = deal_fetcher.get_store_name(store_id)
+    for store_id in get_deal_fetcher().get_available_stores():
+        store_name = get_deal_fetcher().get_store_name(store_id)
         status = "✅" if store_id in store_notifications else "⚪️"
         count = f" ({store_notifications[store_id]})" if store_id in store_notifications else ""
         keyboard.append([
@@ -177,101 +414,262 @@ def get_notifications_menu_keyboard(user_id: str, lang: str) -> InlineKeyboardMa
     return InlineKeyboardMarkup(keyboard)
 
 
+@track_latency("start")
+@throttle("start")
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     try:
         user_id = update.effective_user.id
-        logger.info(f"Start command received from user {user_id}")
+        logger.info("Start command received from user %s", user_id)
 
-        user_manager.create_user_if_not_exists(user_id)
-        logger.debug(f"User {user_id} initialized/verified in database")
+        get_user_manager().create_user_if_not_exists(user_id)
+        logger.debug("User %s initialized/verified in database", user_id)
+        if context.args and context.args[0] == "success":
+            # Back from a completed Stripe checkout (see success_url)
+            from stripe_config import invalidate_checkout_session
+            invalidate_checkout_session(str(user_id))
 
-        lang = user_manager.get_user_language(user_id)
-        logger.debug(f"Retrieved language '{lang}' for user {user_id}")
+        lang = get_user_manager().get_user_language(user_id)
+        logger.debug("Retrieved language '%s' for user %s", lang, user_id)
 
         await update.message.reply_text(
             TRANSLATIONS[lang]["welcome"],
             reply_markup=get_main_menu_keyboard(lang)
         )
-        logger.info(f"Sent welcome message to user {user_id} in language {lang}")
+        logger.info("Sent welcome message to user %s in language %s", user_id, lang)
     except Exception as e:
         logger.error(f"Error in start command: {str(e)}")
         await update.message.reply_text(
             "Sorry, there was an error processing your command. Please try again later."
         )
 
+@track_latency("search")
+async def search(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Search deals from every store: /search <words>"""
+    try:
+        user_id = update.effective_user.id
+        lang = get_user_manager().get_user_language(user_id)
+        query_text = " ".join(context.args or []).strip()[:100]
+        if not query_text:
+            await update.message.reply_text(TRANSLATIONS[lang]["search_usage"])
+            return
+
+        logger.info("Search for '%s' from user %s", query_text, user_id)
+        # Result pages are requested by callback, which can't carry the query itself
+        context.user_data["search_query"] = query_text
+        is_premium = get_user_manager().is_user_premium(user_id)
+        message, keyboard, context.user_data["shown_deals"] = render_search_results(
+            user_id, query_text, 1, is_premium, lang)
+        await update.message.reply_text(message, reply_markup=keyboard, disable_web_page_preview=True)
+    except Exception as e:
+        logger.error(f"Error in search command: {str(e)}")
+        await update.message.reply_text(
+            "Sorry, there was an error processing your command. Please try again later."
+        )
+
+@track_latency("inline_query")
+async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Answer "@bot <words>" typed in any chat with matching deals to share"""
+    from deal_fetcher import INLINE_CACHE_TIME
+    query = update.inline_query
+    try:
+        user = query.from_user
+        # Telegram's language code avoids a Firestore read on every keystroke
+        lang = user.language_code if user.language_code in TRANSLATIONS else "en"
+        deals = get_deal_fetcher().get_inline_deals(query.query)
+        results = [
+            InlineQueryResultArticle(
+                id=hashlib.blake2b(f"{deal['store']}:{deal['id']}".encode(), digest_size=16).hexdigest(),
+                title=deal["title"],
+                description=f"${deal['price']:.2f} (-{deal['discount_percentage']:.0f}%) · {deal['store']}",
+                input_message_content=InputTextMessageContent(
+                    get_deal_fetcher().format_deal_text(deal, lang, user.id), disable_web_page_preview=True),
+                thumbnail_url=deal.get("image_url"))
+            for deal in deals
+        ]
+        # Texts are in the sender's language and link through their click token, so
+        # Telegram caches them per user; the deal lookup itself is cached per query
+        await query.answer(results, cache_time=INLINE_CACHE_TIME, is_personal=True)
+    except Exception as e:
+        logger.error(f"Error answering inline query: {str(e)}")
+
+@track_latency("watch")
+async def watch(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Add a keyword/price watch rule, or list the user's rules: /watch [words] [options]"""
+    from watch_rules import describe_watch_rule, parse_watch_rule
+    try:
+        user_id = update.effective_user.id
+        lang = get_user_manager().get_user_language(user_id)
+        if not context.args:
+            rules = get_notification_manager().get_user_watch_rules(str(user_id))
+            message = TRANSLATIONS[lang]["watch_usage"]
+            if rules:
+                lines = [f"{i}. {describe_watch_rule(rule)}" for i, rule in enumerate(rules, 1)]
+                message = TRANSLATIONS[lang]["watch_list_header"] + "\n" + "\n".join(lines) + "\n\n" + message
+            await update.message.reply_text(message)
+            return
+
+        try:
+            rule = parse_watch_rule(context.args)
+        except ValueError:
+            await update.message.reply_text(TRANSLATIONS[lang]["watch_usage"])
+            return
+
+        is_premium = get_user_manager().is_user_premium(user_id)
+        saved = get_notification_manager().add_watch_rule(str(user_id), rule, is_premium)
+        if saved:
+            record_interest(user_id, saved.get("store"), weight=5.0,
+                            categories=[saved["category"]] if saved.get("category") else [])
+            await update.message.reply_text(TRANSLATIONS[lang]["watch_added"].format(describe_watch_rule(saved)))
+        else:
+            await update.message.reply_text(
+                TRANSLATIONS[lang]["watch_limit"], reply_markup=get_premium_keyboard(is_premium, lang))
+    except Exception as e:
+        logger.error(f"Error in watch command: {str(e)}")
+        await update.message.reply_text(
+            "Sorry, there was an error processing your command. Please try again later."
+        )
+
+@track_latency("unwatch")
+async def unwatch(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Remove a watch rule by its number in the /watch list: /unwatch <number>"""
+    from watch_rules import describe_watch_rule
+    try:
+        user_id = update.effective_user.id
+        lang = get_user_manager().get_user_language(user_id)
+        rules = get_notification_manager().get_user_watch_rules(str(user_id))
+        try:
+            rule = rules[int(context.args[0]) - 1] if context.args and int(context.args[0]) > 0 else None
+        except (ValueError, IndexError):
+            rule = None
+        if rule and get_notification_manager().remove_watch_rule(str(user_id), rule['id']):
+            await update.message.reply_text(TRANSLATIONS[lang]["watch_removed"].format(describe_watch_rule(rule)))
+        else:
+            await update.message.reply_text(TRANSLATIONS[lang]["watch_not_found"])
+    except Exception as e:
+        logger.error(f"Error in unwatch command: {str(e)}")
+        await update.message.reply_text(
+            "Sorry, there was an error processing your command. Please try again later."
+        )
+
+@track_latency("callback")
+@throttle("callback")
 async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     query = update.callback_query
     await query.answer()
 
     try:
         user_id = query.from_user.id
-        lang = user_manager.get_user_language(user_id)
-        logger.info(f"Button callback received: {query.data} from user {user_id} with language {lang}")
+        lang = get_user_manager().get_user_language(user_id)
+        logger.info("Button callback received: %s from user %s with language %s", query.data, user_id, lang)
 
         if query.data == "main_menu":
-            await query.edit_message_text(
+            await edit_message(
+                query,
                 TRANSLATIONS[lang]["welcome"],
                 reply_markup=get_main_menu_keyboard(lang))
 
         elif query.data == "check_sales":
-            await query.edit_message_text(
+            await edit_message(
+                query,
                 TRANSLATIONS[lang]["store_section_title"],
                 reply_markup=get_store_keyboard(lang))
 
         elif query.data.startswith("store_"):
             store_id = query.data.split("_")[1]
             page = 1
-            is_premium = user_manager.is_user_premium(user_id)
+            is_premium = get_user_manager().is_user_premium(user_id)
 
             # Get deals with premium status
-            deals, total_pages = deal_fetcher.get_store_deals(store_id, page, is_premium)
-            store_name = deal_fetcher.get_store_name(store_id)
+            with BOT_STAGE_LATENCY.time(stage="deal_fetch"):
+                deals, total_pages = get_deal_fetcher().get_store_deals(store_id, page, is_premium, user_id=user_id)
+            store_name = get_deal_fetcher().get_store_name(store_id)
+            record_interest(user_id, store_id, deals=deals)
+            context.user_data["shown_deals"] = deals
 
             header = TRANSLATIONS[lang]["store_deals_header"].format(store_name)
-            message = header + "\n\n" + deal_fetcher.format_deals_message(deals, lang)
+            if not deals and is_daily_limit_reached(user_id, page, is_premium):
+                message = header + "\n\n" + TRANSLATIONS[lang]["premium_info"]
+            else:
+                with BOT_STAGE_LATENCY.time(stage="render"):
+                    message = header + "\n\n" + get_deal_fetcher().format_deals_message(deals, lang, user_id)
 
             # Don't show pagination in notification mode
             is_notification = query.data.startswith("notify_")
-            await query.edit_message_text(
+            await edit_message(
+                query,
                 message,
-                reply_markup=get_store_deals_keyboard(store_id, page, total_pages, lang, is_notification),
+                reply_markup=get_store_deals_keyboard(store_id, page, total_pages, lang, is_notification, deals),
                 disable_web_page_preview=True
             )
 
         elif query.data.startswith("page_"):
             _, store_id, page = query.data.split("_")
             page = int(page)
-            is_premium = user_manager.is_user_premium(user_id)
+            is_premium = get_user_manager().is_user_premium(user_id)
 
             # Get deals with premium status
-            deals, total_pages = deal_fetcher.get_store_deals(store_id, page, is_premium)
-            store_name = deal_fetcher.get_store_name(store_id)
+            with BOT_STAGE_LATENCY.time(stage="deal_fetch"):
+                deals, total_pages = get_deal_fetcher().get_store_deals(store_id, page, is_premium, user_id=user_id)
+            store_name = get_deal_fetcher().get_store_name(store_id)
+            record_interest(user_id, store_id, deals=deals)
+            context.user_data["shown_deals"] = deals
 
             header = TRANSLATIONS[lang]["store_deals_header"].format(store_name)
 
             # If we have deals for this page, display them
             if deals:
-                message = header + "\n\n" + deal_fetcher.format_deals_message(deals, lang)
+                with BOT_STAGE_LATENCY.time(stage="render"):
+                    message = header + "\n\n" + get_deal_fetcher().format_deals_message(deals, lang, user_id)
             else:
                 # For basic users who reach their limit
-                if not is_premium and page > 3:
+                if is_daily_limit_reached(user_id, page, is_premium):
                     message = header + "\n\n" + TRANSLATIONS[lang]["premium_info"]
                 else:
                     message = header + "\n\n" + TRANSLATIONS[lang]["no_deals_found"]
 
             # Keep pagination for regular deal viewing
-            await query.edit_message_text(
+            await edit_message(
+                query,
                 message,
-                reply_markup=get_store_deals_keyboard(store_id, page, total_pages, lang, False),
+                reply_markup=get_store_deals_keyboard(store_id, page, total_pages, lang, False, deals),
                 disable_web_page_preview=True
             )
 
+        elif query.data.startswith("search_"):
+            page = int(query.data.split("_")[1])
+            query_text = context.user_data.get("search_query")
+            if not query_text:
+                await edit_message(
+                    query,
+                    TRANSLATIONS[lang]["search_usage"],
+                    reply_markup=get_back_to_main_menu_keyboard(lang))
+                return
+
+            is_premium = get_user_manager().is_user_premium(user_id)
+            message, keyboard, context.user_data["shown_deals"] = render_search_results(
+                user_id, query_text, page, is_premium, lang)
+            await edit_message(query, message, reply_markup=keyboard, disable_web_page_preview=True)
+
+        elif query.data.startswith("foryou_"):
+            page = int(query.data.split("_")[1])
+            is_premium = get_user_manager().is_user_premium(user_id)
+            message, keyboard, context.user_data["shown_deals"] = render_personalized_deals(
+                user_id, page, is_premium, lang)
+            await edit_message(query, message, reply_markup=keyboard, disable_web_page_preview=True)
+
+        elif query.data == "photos":
+            from deal_media import send_deal_photos
+            # Albums can't be edited into the menu message, so they are sent below it
+            deals = context.user_data.get("shown_deals") or []
+            with BOT_STAGE_LATENCY.time(stage="photos"):
+                await send_deal_photos(context.bot, query.message.chat.id, deals, get_telegram_files())
+
         elif query.data.startswith("notify_"):
             store_id = query.data.split("_")[1]
-            is_premium = user_manager.is_user_premium(user_id)
+            is_premium = get_user_manager().is_user_premium(user_id)
 
             # Check if user can add notification
-            can_add = notification_manager.can_add_notification(str(user_id), store_id, is_premium)
+            can_add = get_notification_manager().can_add_notification(str(user_id), store_id, is_premium)
             if not can_add:
                 # Show appropriate limit message
                 limit_message = TRANSLATIONS[lang]["notification_limit"]
@@ -280,38 +678,43 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                 else:
                     limit_message = "Basic users can only set notifications for one store (up to 3 times per day). Upgrade to Premium for more!"
 
-                await query.edit_message_text(
+                await edit_message(
+                    query,
                     limit_message,
                     reply_markup=get_premium_keyboard(False, lang)
                 )
                 return
 
             # Add notification
-            success = notification_manager.add_notification(str(user_id), store_id, is_premium)
+            success = get_notification_manager().add_notification(str(user_id), store_id, is_premium)
             if success:
+                record_interest(user_id, store_id, weight=5.0)
                 # Show success message with current notification status
-                notifications = notification_manager.get_user_notifications(str(user_id))
+                notifications = get_notification_manager().get_user_notifications(str(user_id))
                 store_count = len(set(n['store'] for n in notifications))
 
                 status_message = (
-                    f"✅ Notification set for {deal_fetcher.get_store_name(store_id)}!\n\n"
+                    f"✅ Notification set for {get_deal_fetcher().get_store_name(store_id)}!\n\n"
                     f"You have notifications set for {store_count} store(s).\n"
-                    f"Today's notifications: {len([n for n in notifications if n.get('last_sent')])}"
+                    f"Today's notifications: {get_notification_manager().alerts_sent_today(str(user_id))}"
                 )
 
-                await query.edit_message_text(
+                await edit_message(
+                    query,
                     status_message,
                     reply_markup=get_store_deals_keyboard(store_id, 1, 3, lang, True)
                 )
             else:
-                await query.edit_message_text(
+                await edit_message(
+                    query,
                     "Failed to set notification. Please try again later.",
                     reply_markup=get_store_deals_keyboard(store_id, 1, 3, lang, True)
                 )
 
         elif query.data == "notifications":
-            logger.info(f"User {user_id} opened notifications menu")
-            await query.edit_message_text(
+            logger.info("User %s opened notifications menu", user_id)
+            await edit_message(
+                query,
                 TRANSLATIONS[lang]["notifications_msg"],
                 reply_markup=get_notifications_menu_keyboard(user_id, lang))
 
@@ -321,16 +724,17 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 
         elif query.data.startswith("toggle_notify_"):
             store_id = query.data.split("_")[2]
-            is_premium = user_manager.is_user_premium(user_id)
-            logger.info(f"User {user_id} (Premium: {is_premium}) attempting to toggle notification for store {store_id}")
+            is_premium = get_user_manager().is_user_premium(user_id)
+            logger.info("User %s (Premium: %s) attempting to toggle notification for store %s", user_id, is_premium, store_id)
 
             try:
                 # Toggle notification in Firestore
-                success = notification_manager.toggle_notification(str(user_id), store_id, is_premium)
+                success = get_notification_manager().toggle_notification(str(user_id), store_id, is_premium)
                 if success:
-                    logger.info(f"Successfully toggled notification for user {user_id} and store {store_id}")
+                    logger.info("Successfully toggled notification for user %s and store %s", user_id, store_id)
                     # Get updated notifications to show correct status
-                    await query.edit_message_text(
+                    await edit_message(
+                        query,
                         TRANSLATIONS[lang]["notification_success"],
                         reply_markup=get_notifications_menu_keyboard(user_id, lang)
                     )
@@ -343,19 +747,22 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                     else:
                         limit_message = TRANSLATIONS[lang]["notification_limit_basic"]
 
-                    await query.edit_message_text(
+                    await edit_message(
+                        query,
                         limit_message,
                         reply_markup=get_premium_keyboard(False, lang)
                     )
             except Exception as e:
                 logger.error(f"Error handling notification toggle for user {user_id}: {str(e)}")
-                await query.edit_message_text(
+                await edit_message(
+                    query,
                     "An error occurred. Please try again or use /start to restart.",
                     reply_markup=get_main_menu_keyboard(lang)
                 )
 
         elif query.data == "change_language":
-            await query.edit_message_text(
+            await edit_message(
+                query,
                 TRANSLATIONS[lang]["change_language_msg"],
                 reply_markup=get_language_keyboard(lang))
 
@@ -363,123 +770,241 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             selected_lang = query.data.split("_")[1]
             user_id = query.from_user.id
 
-            user_manager.save_user_language(user_id, selected_lang)
-            logger.info(f"Language changed to {selected_lang} for user {user_id}")
+            get_user_manager().save_user_language(user_id, selected_lang)
+            logger.info("Language changed to %s for user %s", selected_lang, user_id)
 
-            await query.edit_message_text(
+            await edit_message(
+                query,
                 TRANSLATIONS[selected_lang]["language_set"],
                 reply_markup=get_back_to_main_menu_keyboard(selected_lang))
 
         elif query.data == "premium":
-            is_premium = user_manager.is_user_premium(user_id)
-            await query.edit_message_text(
+            is_premium = get_user_manager().is_user_premium(user_id)
+            await edit_message(
+                query,
                 TRANSLATIONS[lang]["premium_info"],
                 reply_markup=get_premium_keyboard(is_premium, lang))
 
         elif query.data == "upgrade_premium":
-            checkout_url = create_checkout_session(str(user_id))
+            from stripe_config import create_checkout_session, invalidate_checkout_session
+            if get_user_manager().is_user_premium(user_id):
+                # Paid already; the session this process may have cached is spent
+                invalidate_checkout_session(str(user_id))
+                await edit_message(
+                    query,
+                    TRANSLATIONS[lang]["premium_info"],
+                    reply_markup=get_premium_keyboard(True, lang))
+                return
+            checkout_url = create_checkout_session(str(user_id), get_user_manager())
             if checkout_url:
-                await query.edit_message_text(
+                await edit_message(
+                    query,
                     TRANSLATIONS[lang]["checkout_session_text"] + checkout_url,
                     disable_web_page_preview=True
                 )
             else:
-                await query.edit_message_text(
+                await edit_message(
+                    query,
                     "Sorry, there was an error creating your checkout session. Please try again later.",
                     reply_markup=get_back_to_main_menu_keyboard(lang)
                 )
         elif query.data == "cancel_subscription":
             user_id = query.from_user.id
-            logger.info(f"🔄 Starting subscription cancellation for user {user_id}")
+            logger.info("🔄 Starting subscription cancellation for user %s", user_id)
 
-            is_premium = user_manager.is_user_premium(user_id)
+            is_premium = get_user_manager().is_user_premium(user_id)
             if not is_premium:
-                logger.warning(f"User {user_id} tried to cancel subscription but isn't marked as premium")
-                await query.edit_message_text(
+                logger.warning("User %s tried to cancel subscription but isn't marked as premium", user_id)
+                await edit_message(
+                    query,
                     "⚠️ You don't appear to have an active premium subscription.",
                     reply_markup=get_back_to_main_menu_keyboard(lang)
                 )
                 return
 
-            await query.edit_message_text(
+            await edit_message(
+                query,
                 "⏳ Processing your cancellation request...",
                 reply_markup=None
             )
 
-            customer_id = user_manager.get_stripe_customer_id(user_id)
+            from stripe_config import cancel_stripe_subscription, invalidate_checkout_session
+            customer_id = get_user_manager().get_stripe_customer_id(user_id)
             if not customer_id:
                 customer_id = get_customer_id_by_user_id(str(user_id))
 
             if customer_id:
-                logger.info(f"✅ Found Stripe customer ID: {customer_id}")
+                logger.info("✅ Found Stripe customer ID: %s", customer_id)
 
                 subscription_id = get_active_subscription_by_customer(customer_id)
 
                 if subscription_id:
-                    logger.info(f"✅ Found active subscription: {subscription_id}")
+                    logger.info("✅ Found active subscription: %s", subscription_id)
 
                     success = cancel_stripe_subscription(subscription_id)
-                    logger.info(f"Cancellation result: {'✅ Success' if success else '❌ Failed'}")
+                    logger.info("Cancellation result: %s", '✅ Success' if success else '❌ Failed')
 
                     if success:
-                        user_manager.users_ref.document(str(user_id)).update({
+                        get_user_manager().users_ref.document(str(user_id)).update({
                             'is_premium': False,
                             'subscription_id': None
                         })
-                        logger.info(f"Updated premium status to False for user {user_id}")
+                        logger.info("Updated premium status to False for user %s", user_id)
+                        invalidate_checkout_session(str(user_id))
 
                         message = "✅ Your subscription has been canceled successfully. You can re-subscribe anytime!"
-                        await query.edit_message_text(
+                        await edit_message(
+                            query,
                             message,
                             reply_markup=get_back_to_main_menu_keyboard(lang)
                         )
                     else:
-                        await query.edit_message_text(
+                        await edit_message(
+                            query,
                             "❌ Error canceling your subscription. Please try again later.",
                             reply_markup=get_back_to_main_menu_keyboard(lang)
                         )
                 else:
-                    logger.warning(f"⚠️ No active subscription found for customer {customer_id}")
+                    logger.warning("⚠️ No active subscription found for customer %s", customer_id)
 
                     if is_premium:
-                        user_manager.users_ref.document(str(user_id)).update({
+                        get_user_manager().users_ref.document(str(user_id)).update({
                             'is_premium': False,
                             'subscription_id': None
                         })
-                        logger.info(f"Fixed premium status inconsistency for user {user_id}")
+                        logger.info("Fixed premium status inconsistency for user %s", user_id)
 
-                    await query.edit_message_text(
+                    await edit_message(
+                        query,
                         "⚠️ You don't have an active subscription with us.",
                         reply_markup=get_back_to_main_menu_keyboard(lang)
                     )
             else:
-                logger.warning(f"⚠️ No Stripe customer found for user {user_id}")
+                logger.warning("⚠️ No Stripe customer found for user %s", user_id)
 
                 if is_premium:
-                    user_manager.users_ref.document(str(user_id)).update({
+                    get_user_manager().users_ref.document(str(user_id)).update({
                         'is_premium': False,
                         'subscription_id': None
                     })
-                    logger.info(f"Fixed premium status inconsistency for user {user_id}")
+                    logger.info("Fixed premium status inconsistency for user %s", user_id)
 
-                await query.edit_message_text(
+                await edit_message(
+                    query,
                     "⚠️ No subscription found. Your premium status has been reset.",
                     reply_markup=get_back_to_main_menu_keyboard(lang)
                 )
 
     except Exception as e:
         logger.error(f"Error in button callback: {str(e)}")
-        await query.edit_message_text(
+        await edit_message(
+            query,
             "An error occurred. Please try again or use /start to restart.",
             reply_markup=get_main_menu_keyboard("en"))
 
+def register_handlers(application: Application) -> None:
+    """Register the bot's update handlers on an application"""
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("search", search))
+    application.add_handler(CommandHandler("watch", watch))
+    application.add_handler(CommandHandler("unwatch", unwatch))
+    application.add_handler(CallbackQueryHandler(button_callback))
+    application.add_handler(InlineQueryHandler(inline_query))
+
+async def report_startup(application: Application) -> None:
+    """Log and record how long it took from import to being ready to poll"""
+    startup_seconds = time.perf_counter() - _import_started
+    STARTUP_DURATION.observe(startup_seconds, process="bot")
+    logger.info("Bot ready to poll %.3fs after start", startup_seconds)
+
+async def graceful_shutdown(application: Application, drain_timeout: float = DRAIN_TIMEOUT,
+                            flush_timeout: float = FLUSH_TIMEOUT) -> None:
+    """Stop polling, drain in-flight handlers, then flush buffered work, each within its deadline"""
+    # Stop accepting updates; Telegram redelivers anything not yet fetched
+    if application.updater and application.updater.running:
+        await application.updater.stop()
+    logger.info("Stopped polling, draining %s queued update(s)", application.update_queue.qsize())
+
+    # Application.stop() waits for queued updates and running handlers
+    if application.running:
+        stopping = asyncio.ensure_future(application.stop())
+        done, _ = await asyncio.wait({stopping}, timeout=drain_timeout)
+        if done:
+            logger.info("All in-flight handlers finished")
+        else:
+            handlers = list(RUNNING_HANDLERS)
+            logger.warning("%s handler(s) still running after %ss, cancelling them", len(handlers), drain_timeout)
+            for task in handlers:
+                task.cancel()
+            await asyncio.gather(*handlers, return_exceptions=True)
+            # With the handlers gone, stop() only has queued updates left to skip over
+            done, _ = await asyncio.wait({stopping}, timeout=1)
+            if not done:
+                stopping.cancel()
+                logger.warning("Application did not stop after cancelling handlers")
+
+    flushed = await asyncio.to_thread(run_shutdown_hooks, flush_timeout)
+    if not flushed:
+        logger.warning("Some buffered work could not be flushed before the deadline")
+
+    await application.shutdown()
+
+async def send_notifications_periodically(application: Application, interval: float,
+                                          stop: asyncio.Event) -> None:
+    """Send due store notifications every interval seconds until stop is set (see notification_sender.py)"""
+    from notification_sender import NotificationSender
+    sender = None
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=interval)
+            return
+        except asyncio.TimeoutError:
+            pass
+        try:
+            if sender is None:
+                # The services may still be connecting to Firestore, which blocks
+                sender = await asyncio.to_thread(lambda: NotificationSender(
+                    application.bot, get_notification_manager(), get_user_manager(), get_deal_fetcher()))
+            await sender.run_cycle(stop)
+        except Exception as e:
+            logger.error(f"Error sending notifications: {str(e)}")
+
+async def run_bot(application: Application) -> None:
+    """Poll for updates until SIGINT/SIGTERM, then shut down gracefully"""
+    stop_requested = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop_requested.set)
+
+    from notification_sender import NOTIFICATION_INTERVAL
+    notifier = None
+    stop_notifying = asyncio.Event()
+    await application.initialize()
+    try:
+        await application.start()
+        await application.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+        await report_startup(application)
+        if NOTIFICATION_INTERVAL > 0:
+            notifier = asyncio.create_task(
+                send_notifications_periodically(application, NOTIFICATION_INTERVAL, stop_notifying))
+        await stop_requested.wait()
+        logger.info("Received shutdown signal")
+    finally:
+        if notifier is not None:
+            # Let the user being sent to get their message and its record; cancelling
+            # in between would send them the same deals again after the restart
+            stop_notifying.set()
+            done, _ = await asyncio.wait({notifier}, timeout=DRAIN_TIMEOUT)
+            if not done:
+                logger.warning("Notifications still sending after %ss, cancelling them", DRAIN_TIMEOUT)
+                notifier.cancel()
+        await graceful_shutdown(application)
+
 def main() -> None:
     """Start the bot with enhanced error handling and logging"""
     global telegram_app
     logger.info("Starting bot initialization...")
 
-    cleanup()
-
     token = os.getenv('TELEGRAM_BOT_TOKEN')
     if not token:
         logger.error("TELEGRAM_BOT_TOKEN environment variable is not set!")
@@ -488,30 +1013,27 @@ def main() -> None:
     logger.info("Bot token verified, proceeding with initialization")
 
     try:
-        # Initialize Firebase if not already initialized
-        if not len(firebase_admin._apps):
-            cred = credentials.Certificate("credentials.json")
-            firebase_admin.initialize_app(cred)
-            logger.debug("Firebase initialized successfully")
-        else:
-            logger.debug("Firebase already initialized")
+        # Firebase and the store catalogs initialize while the application is built
+        threading.Thread(target=warm_up_services, name="warm-up", daemon=True).start()
 
         logger.debug("Building Telegram application...")
-        telegram_app = Application.builder().token(token).build()
+        # Updates run concurrently so one user's slow press doesn't hold up everyone else's;
+        # presses on the same message still run one at a time (see throttle())
+        telegram_app = Application.builder().token(token).concurrent_updates(
+            int(os.getenv('BOT_CONCURRENT_UPDATES', '16'))).build()
         logger.info("Successfully built Telegram application")
 
         logger.debug("Adding command handlers...")
-        telegram_app.add_handler(CommandHandler("start", start))
-        telegram_app.add_handler(CallbackQueryHandler(button_callback))
+        register_handlers(telegram_app)
         logger.info("Successfully added command handlers")
 
-        signal.signal(signal.SIGINT, signal_handler)
-        signal.signal(signal.SIGTERM, signal_handler)
-        logger.info("Signal handlers configured")
+        # Publish metrics for the webhook app's /metrics endpoint
+        start_snapshot_writer()
 
         logger.info("Starting bot polling...")
-        telegram_app.run_polling(allowed_updates=Update.ALL_TYPES)
-        logger.info("Bot polling started successfully")
+        asyncio.run(run_bot(telegram_app))
+        telegram_app = None
+        logger.info("Bot stopped gracefully")
 
     except Exception as e:
         logger.error(f"Critical error during bot initialization: {str(e)}")
@@ -0,0 +1,195 @@
+import base64
+import hashlib
+import hmac
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+from metrics import DEAL_CLICKS
+from lifecycle import register_shutdown_hook
+
+logger = logging.getLogger(__name__)
+
+# Public base URL of the webhook server, e.g. https://deals.example.com; links are untracked when unset
+CLICK_TRACKING_URL = os.getenv('CLICK_TRACKING_URL', '').rstrip('/')
+
+# Seconds between writes of buffered clicks to the log
+CLICK_FLUSH_INTERVAL = float(os.getenv('CLICK_FLUSH_INTERVAL', '5'))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS clicks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    clicked_at REAL NOT NULL,
+    user_id TEXT NOT NULL,
+    store TEXT NOT NULL,
+    deal_id TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS click_counts (
+    day TEXT NOT NULL,
+    store TEXT NOT NULL,
+    deal_id TEXT NOT NULL,
+    clicks INTEGER NOT NULL,
+    PRIMARY KEY (day, store, deal_id)
+);
+CREATE TABLE IF NOT EXISTS click_users (
+    day TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    PRIMARY KEY (day, user_id)
+);
+"""
+
+def _signing_key() -> bytes:
+    # The bot and the webhook server both have the bot token, so it doubles as the default key
+    secret = os.getenv('CLICK_SIGNING_SECRET') or os.getenv('TELEGRAM_BOT_TOKEN') or ''
+    return hashlib.sha256(b'click-tracking:' + secret.encode()).digest()
+
+def _sign(payload: bytes) -> str:
+    return hmac.new(_signing_key(), payload, hashlib.sha256).hexdigest()[:16]
+
+def make_click_token(user_id, store: str, deal_id, url: str) -> str:
+    """Encode a click's user, store, deal and destination, signed so links can't redirect elsewhere"""
+    payload = '\t'.join((str(user_id), str(store), str(deal_id), url)).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=') + '.' + _sign(payload)
+
+def parse_click_token(token: str) -> Optional[Tuple[str, str, str, str]]:
+    """Get (user ID, store, deal ID, URL) from a token, or None if it is malformed or forged"""
+    try:
+        encoded, _, signature = token.partition('.')
+        payload = base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4))
+        if not hmac.compare_digest(signature, _sign(payload)):
+            return None
+        user_id, store, deal_id, url = payload.decode().split('\t', 3)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if not url.startswith(('https://', 'http://')):
+        return None
+    return user_id, store, deal_id, url
+
+def tracked_url(user_id, store: str, deal_id, url: str) -> str:
+    """Link to a deal through the webhook server's /go redirect, or the deal URL if tracking is off"""
+    if not CLICK_TRACKING_URL or user_id is None or not url.startswith(('https://', 'http://')):
+        return url
+    return f"{CLICK_TRACKING_URL}/go/{quote(make_click_token(user_id, store, deal_id, url))}"
+
+class ClickLog:
+    """Append-only SQLite log of deal clicks with per-day aggregates
+
+    record() only appends to an in-memory buffer, so a redirect never
+    waits on a write. A background thread flushes the buffer every
+    flush_interval seconds, or sooner once batch_size clicks are waiting,
+    as one transaction that appends the raw clicks and adds the batch's
+    counts to the per-day click_counts and click_users tables. Reports
+    read the aggregates and never scan the raw log.
+    """
+
+    def __init__(self, path: Optional[str] = None, flush_interval: float = CLICK_FLUSH_INTERVAL,
+                 batch_size: int = 500):
+        self.path = path or os.environ.get("CLICK_LOG_PATH", "clicks.db")
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._buffer: List[Tuple[float, str, str, str]] = []
+        self._buffer_lock = threading.Lock()
+        # Only one flush writes at a time, so clicks reach the log in order
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._local = threading.local()
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get the SQLite connection for the current thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            # A power loss may drop the last flush; clicks don't need FULL durability
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def record(self, user_id: str, store: str, deal_id: str, clicked_at: Optional[float] = None) -> None:
+        """Buffer a click for the next flush"""
+        with self._buffer_lock:
+            self._buffer.append((clicked_at or time.time(), str(user_id), store, str(deal_id)))
+            pending = len(self._buffer)
+            if self._thread is None:
+                self._start()
+        DEAL_CLICKS.inc(store=store)
+        if pending >= self.batch_size:
+            self._wakeup.set()
+
+    def _start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name='click-log', daemon=True)
+        self._thread.start()
+        register_shutdown_hook(self.flush, 'click-log')
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing click log: {e}")
+
+    def flush(self) -> int:
+        """Write buffered clicks and fold them into the aggregates
+
+        Returns:
+            int: Number of clicks written
+        """
+        with self._flush_lock:
+            with self._buffer_lock:
+                batch, self._buffer = self._buffer, []
+            if not batch:
+                return 0
+
+            counts: Dict[Tuple[str, str, str], int] = {}
+            users = set()
+            for clicked_at, user_id, store, deal_id in batch:
+                day = time.strftime('%Y-%m-%d', time.gmtime(clicked_at))
+                counts[(day, store, deal_id)] = counts.get((day, store, deal_id), 0) + 1
+                users.add((day, user_id))
+
+            conn = self._connect()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(
+                    "INSERT INTO clicks (clicked_at, user_id, store, deal_id) VALUES (?, ?, ?, ?)", batch)
+                conn.executemany(
+                    "INSERT INTO click_counts (day, store, deal_id, clicks) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (day, store, deal_id) DO UPDATE SET clicks = clicks + excluded.clicks",
+                    [key + (count,) for key, count in counts.items()])
+                conn.executemany("INSERT OR IGNORE INTO click_users (day, user_id) VALUES (?, ?)", users)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                # Put the clicks back in front of any recorded since, for the next flush
+                with self._buffer_lock:
+                    self._buffer[:0] = batch
+                raise
+        logger.debug("Flushed %s clicks", len(batch))
+        return len(batch)
+
+    def stats(self, days: int = 7, top: int = 10) -> Dict:
+        """Get clicks per day and store, unique users per day and the most clicked deals"""
+        since = time.strftime('%Y-%m-%d', time.gmtime(time.time() - (days - 1) * 24 * 60 * 60))
+        conn = self._connect()
+        per_day: Dict[str, Dict] = {}
+        for row in conn.execute(
+                "SELECT day, store, SUM(clicks) AS clicks FROM click_counts WHERE day >= ? "
+                "GROUP BY day, store ORDER BY day", (since,)):
+            day = per_day.setdefault(row['day'], {'clicks': 0, 'users': 0, 'stores': {}})
+            day['clicks'] += row['clicks']
+            day['stores'][row['store']] = row['clicks']
+        for row in conn.execute(
+                "SELECT day, COUNT(*) AS users FROM click_users WHERE day >= ? GROUP BY day", (since,)):
+            per_day.setdefault(row['day'], {'clicks': 0, 'users': 0, 'stores': {}})['users'] = row['users']
+        top_deals = [dict(row) for row in conn.execute(
+            "SELECT store, deal_id, SUM(clicks) AS clicks FROM click_counts WHERE day >= ? "
+            "GROUP BY store, deal_id ORDER BY clicks DESC LIMIT ?", (since, top))]
+        return {'days': per_day, 'top_deals': top_deals}
@@ -0,0 +1,166 @@
+import hashlib
+import logging
+import struct
+from collections import defaultdict
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from deal_search import stem, tokenize
+from metrics import REGISTRY
+from ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+NUM_PERM = 32
+BANDS = 8
+ROWS = NUM_PERM // BANDS
+
+# Listing filler on top of the search stopwords; says nothing about which product it is
+FILLER_WORDS = {stem(word) for word in (
+    'hot', 'free', 'shipping', 'original', 'genuine', 'official',
+    'бесплатная', 'доставка', 'оригинал', 'оригинальный', 'bepul', 'yetkazib',
+)}
+
+# Words that make a listing a different product than the same title without them,
+# so a title differing only by one of these is never merged: accessories and model variants
+DISTINCT_PRODUCT_WORDS = {stem(word) for word in (
+    'case', 'cover', 'sleeve', 'skin', 'charger', 'cable', 'adapter', 'strap', 'band', 'protector',
+    'glass', 'film', 'stand', 'mount', 'holder', 'dock', 'refill', 'replacement', 'spare', 'kit',
+    'pro', 'max', 'ultra', 'plus', 'mini', 'lite', 'fe',
+    'чехол', 'накладка', 'кабель', 'зарядка', 'зарядное', 'адаптер', 'ремешок', 'стекло', 'пленка',
+    'подставка', 'держатель', 'сменный',
+    "g'ilof", 'kabel', 'zaryadlovchi', 'adapter', 'tasma', 'oyna', 'ushlagich',
+)}
+
+def normalize_title(title: str) -> List[str]:
+    """Split a title into search terms (see deal_search.tokenize) and drop filler words"""
+    return [token for token in tokenize(title) if token not in FILLER_WORDS]
+
+def _token_hashes(token: str) -> Tuple[int, ...]:
+    """NUM_PERM independent 32-bit hashes of a token"""
+    data = token.encode()
+    digest = hashlib.blake2b(data, digest_size=64, salt=b'minhash1').digest()
+    digest += hashlib.blake2b(data, digest_size=64, salt=b'minhash2').digest()
+    return struct.unpack(f'<{NUM_PERM}I', digest)
+
+class DealDeduplicator:
+    """Groups listings of the same product across stores using MinHash/LSH
+
+    Titles are reduced to token sets and summarized by MinHash signatures.
+    Signatures are split into bands; deals with the same numeric tokens
+    (model numbers, sizes) sharing a band bucket become candidates, which
+    are confirmed only if their token sets are near-identical. Work grows
+    linearly with the number of deals rather than with the number of pairs.
+
+    Args:
+        max_difference: Tokens the two titles may differ by (in one and not the
+            other) and still merge; none of them may be a DISTINCT_PRODUCT_WORDS
+            word, so "Galaxy S23" and "Galaxy S23 Case" stay apart
+        cross_store_only: Only merge listings from different stores
+        max_bucket_size: Candidates compared per LSH bucket, bounding hot buckets
+    """
+
+    def __init__(self, max_difference: int = 1, cross_store_only: bool = True, max_bucket_size: int = 50):
+        self.max_difference = max_difference
+        self.cross_store_only = cross_store_only
+        self.max_bucket_size = max_bucket_size
+        self._token_cache: Dict[str, Tuple[int, ...]] = {}
+        self._signatures = TTLCache(maxsize=200_000)
+        REGISTRY.register_cache('dedup_signature', self._signatures)
+
+    def signature(self, title: str) -> Tuple[FrozenSet[str], FrozenSet[str], Tuple[int, ...]]:
+        """Get (tokens, numeric tokens, MinHash signature) for a title"""
+        cached = self._signatures.get(title)
+        if cached is not None:
+            return cached
+
+        tokens = frozenset(normalize_title(title))
+        numbers = frozenset(token for token in tokens if any(ch.isdigit() for ch in token))
+        hashes = []
+        for token in tokens:
+            token_hashes = self._token_cache.get(token)
+            if token_hashes is None:
+                if len(self._token_cache) > 500_000:
+                    self._token_cache.clear()
+                token_hashes = self._token_cache[token] = _token_hashes(token)
+            hashes.append(token_hashes)
+        # Element-wise minimum over the tokens' hash vectors
+        minhash = tuple(map(min, zip(*hashes))) if hashes else ()
+        result = (tokens, numbers, minhash)
+        self._signatures.set(title, result)
+        return result
+
+    def _is_match(self, a: Tuple, b: Tuple) -> bool:
+        tokens_a, numbers_a, _ = a
+        tokens_b, numbers_b, _ = b
+        if numbers_a != numbers_b:
+            return False
+        difference = tokens_a ^ tokens_b
+        return (len(difference) <= self.max_difference and len(difference) < len(tokens_a | tokens_b)
+                and not difference & DISTINCT_PRODUCT_WORDS)
+
+    def group(self, deals: List[Dict]) -> List[List[int]]:
+        """Get groups of indexes into deals that are the same product"""
+        signatures = [self.signature(deal.get('title', '')) for deal in deals]
+        parent = list(range(len(deals)))
+
+        def find(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        buckets = defaultdict(list)
+        for i, (_, numbers, minhash) in enumerate(signatures):
+            if not minhash:
+                continue
+            for band in range(BANDS):
+                # Matches need identical numeric tokens, so they can be part of the bucket key
+                bucket = buckets[(band, numbers, minhash[band * ROWS:(band + 1) * ROWS])]
+                for j in bucket:
+                    root_i, root_j = find(i), find(j)
+                    if root_i == root_j:
+                        continue
+                    if self.cross_store_only and deals[i].get('store') == deals[j].get('store'):
+                        continue
+                    if self._is_match(signatures[i], signatures[j]):
+                        parent[root_i] = root_j
+                if len(bucket) < self.max_bucket_size:
+                    bucket.append(i)
+
+        groups = defaultdict(list)
+        for i in range(len(deals)):
+            groups[find(i)].append(i)
+        return list(groups.values())
+
+    def deduplicate(self, deals: List[Dict]) -> List[Dict]:
+        """Collapse each group of duplicates into its cheapest listing
+
+        The kept deal gets an 'offers' list with every store's price and URL,
+        cheapest first. Deals keep their original relative order.
+        """
+        if len(deals) < 2:
+            return deals
+        kept: Dict[int, Dict] = {}
+        for group in self.group(deals):
+            if len(group) == 1:
+                kept[group[0]] = deals[group[0]]
+                continue
+            offers = sorted(group, key=lambda i: deals[i].get('price', float('inf')))
+            best = dict(deals[offers[0]])
+            best['offers'] = [
+                {'store': deals[i].get('store'), 'price': deals[i].get('price'), 'url': deals[i].get('url')}
+                for i in offers
+            ]
+            kept[min(group)] = best
+        if len(kept) < len(deals):
+            logger.debug("Merged %s duplicate listings into %s deals", len(deals) - len(kept), len(kept))
+        return [kept[i] for i in sorted(kept)]
+
+_default_deduplicator: Optional[DealDeduplicator] = None
+
+def get_deduplicator() -> DealDeduplicator:
+    """Get the shared deduplicator, so signature caches are reused"""
+    global _default_deduplicator
+    if _default_deduplicator is None:
+        _default_deduplicator = DealDeduplicator()
+    return _default_deduplicator
@@ -1,13 +1,24 @@
 import logging
-from typing import List, Dict, Optional, Tuple
+import os
+import threading
+from typing import Any, List, Dict, Optional, Tuple
 from datetime import datetime
-from stores.amazon_store import AmazonStore
-from stores.aliexpress_store import AliexpressStore
-from stores.ebay_store import EbayStore
-from stores.shein_store import SheinStore
+from stores import BaseStore
+from stores.registry import StoreRegistry
+from deal_dedup import DealDeduplicator, get_deduplicator
+from deal_search import DealSearchIndex
+from deal_ranking import DealRanker
+from click_tracking import tracked_url
+from quota import DEALS_VIEWED, QuotaCounter, get_quota_counter
+from metrics import REGISTRY
+from ttl_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
+# Seconds inline results stay cached, here and by Telegram, and how many are sent per query
+INLINE_CACHE_TIME = int(os.getenv('INLINE_CACHE_TIME', '300'))
+INLINE_RESULTS = 20
+
 class Deal:
     def __init__(self, title: str, price: float, original_price: float, 
                  link: str, platform: str, discount_percentage: float):
@@ -31,17 +42,29 @@ class Deal:
         }
 
 class DealFetcher:
-    def __init__(self):
-        self.stores = {
-            'amazon': AmazonStore(),
-            'aliexpress': AliexpressStore(),
-            'ebay': EbayStore(),
-            'shein': SheinStore()
-        }
+    def __init__(self, registry: Optional[StoreRegistry] = None, deduplicator: Optional[DealDeduplicator] = None,
+                 quotas: Optional[QuotaCounter] = None):
+        # Stores build their catalogs when constructed, so the registry creates them on first use
+        self.registry = registry or StoreRegistry()
+        # Merges listings of the same product from different stores in combined feeds
+        self.deduplicator = deduplicator or (get_deduplicator() if os.getenv('DEDUP_DEALS', '1') == '1' else None)
         self.deals_per_page = 5
         self.max_deals_per_day = 15  # 3 pages for basic users
+        # Daily deal views of basic users; the shared counter is created on first use
+        self.quotas = quotas
+        # Stores are indexed when first loaded and again after every catalog refresh
+        self.search_index = DealSearchIndex()
+        self.max_search_results = 100  # 20 pages; counting further costs time at large catalogs
+        # Feature vectors for personalized feeds, kept in step with the search index
+        self.ranker = DealRanker()
+        # Normalized inline query -> deals; cleared whenever a catalog changes
+        self.inline_cache = TTLCache(maxsize=10000, ttl=INLINE_CACHE_TIME)
+        REGISTRY.register_cache('inline_results', self.inline_cache)
+        self._indexed_stores = set()
+        self._index_lock = threading.Lock()
 
-    def get_store_deals(self, store_name: str, page: int = 1, is_premium: bool = False, filters: Optional[Dict] = None) -> Tuple[List[Dict], int]:
+    def get_store_deals(self, store_name: str, page: int = 1, is_premium: bool = False, filters: Optional[Dict] = None,
+                        user_id: Optional[int] = None) -> Tuple[List[Dict], int]:
         """Fetch deals from a specific store with pagination
 
         Args:
@@ -49,16 +72,17 @@ class DealFetcher:
             page: Page number to fetch (starts at 1)
             is_premium: Whether user is premium (affects pagination limits)
             filters: Optional dictionary of filters to apply
+            user_id: Basic user whose daily deal views the page counts against
 
         Returns:
             Tuple of (deals list, total pages)
         """
-        if store_name not in self.stores:
-            logger.warning(f"Attempted to fetch deals for unknown store: {store_name}")
+        if not self.registry.is_enabled(store_name):
+            logger.warning("Attempted to fetch deals for unknown store: %s", store_name)
             return [], 0
 
         try:
-            store = self.stores[store_name]
+            store = self.get_store(store_name)
             
             # Get total number of deals for pagination
             total_deals = store.get_total_deals(filters)
@@ -77,32 +101,36 @@ class DealFetcher:
             # Get deals for current page
             deals = store.fetch_deals(page=page, limit=self.deals_per_page, filters=filters)
 
-            # For basic users, don't return more than max_deals_per_day
-            if not is_premium:
-                remaining_deals = self.max_deals_per_day - ((page - 1) * self.deals_per_page)
-                if remaining_deals <= 0:
-                    return [], total_pages
-                deals = deals[:remaining_deals]
-
-            return deals, total_pages
+            # For basic users, don't return more than max_deals_per_day, however they page
+            return self._count_daily_views(deals, user_id, is_premium), total_pages
 
         except Exception as e:
             logger.error(f"Error fetching deals for store {store_name}: {str(e)}")
             return [], 0
 
-    def get_all_deals(self, page: int = 1, filters: Optional[Dict] = None) -> Tuple[List[Dict], int]:
-        """Fetch deals from all stores with pagination"""
+    def get_all_deals(self, page: int = 1, filters: Optional[Dict] = None,
+                      interests: Optional[Dict[str, float]] = None) -> Tuple[List[Dict], int]:
+        """Fetch deals from all stores with pagination
+
+        Deals are ordered by the ranking model (discount, rating, reviews,
+        stock and price) plus the user's store and category interests.
+        """
         all_deals = []
-        for store_name, store in self.stores.items():
+        store_ids = {}
+        for store_name in self.registry.enabled():
             try:
+                store = self.get_store(store_name)
                 deals = store.fetch_deals(page=page, limit=self.deals_per_page, filters=filters)
                 all_deals.extend(deals)
+                store_ids[store.get_store_name()] = store_name
             except Exception as e:
                 logger.error(f"Error fetching deals for store {store_name}: {str(e)}")
                 continue
 
-        # Sort by discount percentage and paginate
-        sorted_deals = sorted(all_deals, key=lambda x: float(x.get('discount_percentage', '0')), reverse=True)
+        if self.deduplicator:
+            all_deals = self.deduplicator.deduplicate(all_deals)
+
+        sorted_deals = self.ranker.rank(all_deals, [store_ids.get(deal.get('store')) for deal in all_deals], interests)
         start_idx = (page - 1) * self.deals_per_page
         end_idx = start_idx + self.deals_per_page
         
@@ -111,8 +139,103 @@ class DealFetcher:
         
         return sorted_deals[start_idx:end_idx], total_pages
 
-    def format_deals_message(self, deals: List[Dict], lang: str = 'en') -> str:
-        """Format deals into a readable message with proper translation"""
+    def search_deals(self, query: str, page: int = 1, is_premium: bool = False,
+                     user_id: Optional[int] = None) -> Tuple[List[Dict], int]:
+        """Search deals from all stores by title, brand and category
+
+        Returns:
+            Tuple of (deals list, total pages), limited like store pages for basic users
+        """
+        try:
+            if not is_premium and page > 3:
+                return [], 3
+            stores = self.get_available_stores()
+            for store_id in stores:
+                self.get_store(store_id)
+            start_idx = (page - 1) * self.deals_per_page
+            max_results = self.max_search_results if is_premium else self.max_deals_per_day
+            results, total_deals = self.search_index.search(
+                query, limit=self.deals_per_page, offset=start_idx, stores=stores, max_results=max_results)
+            total_pages = (total_deals + self.deals_per_page - 1) // self.deals_per_page
+            deals = [self.get_store(store_id).format_deal(deal) for store_id, deal in results]
+            return self._count_daily_views(deals, user_id, is_premium), total_pages
+        except Exception as e:
+            logger.error(f"Error searching deals for '{query}': {str(e)}")
+            return [], 0
+
+    def get_personalized_deals(self, interests: Dict[str, float], page: int = 1, is_premium: bool = False,
+                               user_id: Optional[int] = None) -> Tuple[List[Dict], int]:
+        """Get a page of deals from all stores ranked for a user
+
+        Args:
+            interests: interest_key() to weight, from UserManager.get_user_interests()
+
+        Returns:
+            Tuple of (deals list, total pages), limited like store pages for basic users
+        """
+        try:
+            if not is_premium and page > 3:
+                return [], 3
+            for store_id in self.get_available_stores():
+                self.get_store(store_id)
+            start_idx = (page - 1) * self.deals_per_page
+            max_results = self.max_search_results if is_premium else self.max_deals_per_day
+            # Rank a few extra deals so merged duplicates don't leave the page short
+            ranked, total_deals = self.ranker.top(limit=self.deals_per_page * 2, offset=start_idx,
+                                                  interests=interests)
+            deals = [self.get_store(store_id).format_deal(deal) for store_id, deal in ranked]
+            if self.deduplicator:
+                deals = self.deduplicator.deduplicate(deals)
+            total_deals = min(total_deals, max_results)
+            total_pages = (total_deals + self.deals_per_page - 1) // self.deals_per_page
+            return self._count_daily_views(deals[:self.deals_per_page], user_id, is_premium), total_pages
+        except Exception as e:
+            logger.error(f"Error getting personalized deals: {str(e)}")
+            return [], 0
+
+    def get_inline_deals(self, query: str) -> List[Dict]:
+        """Get the deals answering an inline query, best first
+
+        Queries are completed as they are typed (see DealSearchIndex.complete)
+        and an empty query gets the top ranked deals. Results are the same
+        for every user, so they are cached per query.
+        """
+        # Case and repeated spaces don't change results, a trailing space does
+        key = ' '.join(query.lower().split()) + (' ' if query[-1:].isspace() else '')
+        deals = self.inline_cache.get(key)
+        if deals is not None:
+            return deals
+        try:
+            stores = self.get_available_stores()
+            for store_id in stores:
+                self.get_store(store_id)
+            if key.strip():
+                results = self.search_index.complete(query, limit=INLINE_RESULTS, stores=stores)
+            else:
+                results, _ = self.ranker.top(limit=INLINE_RESULTS)
+            deals = [self.get_store(store_id).format_deal(deal) for store_id, deal in results]
+        except Exception as e:
+            logger.error(f"Error getting inline deals for '{query}': {str(e)}")
+            return []
+        self.inline_cache.set(key, deals)
+        return deals
+
+    def _count_daily_views(self, deals: List[Dict], user_id: Optional[int], is_premium: bool) -> List[Dict]:
+        """Count a basic user's deal views, cutting the page short at max_deals_per_day"""
+        if is_premium or user_id is None or not deals:
+            return deals
+        quotas = self.quotas or get_quota_counter()
+        return deals[:quotas.consume(user_id, DEALS_VIEWED, self.max_deals_per_day, len(deals))]
+
+    def daily_views_left(self, user_id: int) -> int:
+        """Get how many more deals a basic user can view today"""
+        return (self.quotas or get_quota_counter()).remaining(user_id, DEALS_VIEWED, self.max_deals_per_day)
+
+    def format_deals_message(self, deals: List[Dict], lang: str = 'en', user_id: Optional[int] = None) -> str:
+        """Format deals into a readable message with proper translation
+
+        With a user_id, links go through the click-tracking redirect when CLICK_TRACKING_URL is set.
+        """
         from translations.lang import TRANSLATIONS
 
         if not deals:
@@ -126,21 +249,66 @@ class DealFetcher:
         message += f"{TRANSLATIONS[lang]['deal_count_label']} {deal_count}\n\n"
 
         for i, deal in enumerate(display_deals, 1):
-            message += f"{i}. {TRANSLATIONS[lang]['product_name_label']} {deal['title']}\n"
-            message += f"{TRANSLATIONS[lang]['price_label']} ${deal['price']:.2f}\n"
-            message += f"{TRANSLATIONS[lang]['original_price_label']} ${deal['original_price']:.2f}\n"
-            message += f"{TRANSLATIONS[lang]['discount_label']} {deal['discount_percentage']:.1f}%\n"
-            message += f"🏪 {deal.get('store', 'Unknown')}\n"
-            message += f"🔗 {deal.get('url', '#')}\n\n"
+            message += f"{i}. {self.format_deal_text(deal, lang, user_id)}\n\n"
 
         message += TRANSLATIONS[lang]['notification_info']
         return message
 
+    def format_deal_text(self, deal: Dict, lang: str = 'en', user_id: Optional[Any] = None) -> str:
+        """Format one deal's name, prices, store and link"""
+        from translations.lang import TRANSLATIONS
+
+        text = f"{TRANSLATIONS[lang]['product_name_label']} {deal['title']}\n"
+        text += f"{TRANSLATIONS[lang]['price_label']} ${deal['price']:.2f}\n"
+        text += f"{TRANSLATIONS[lang]['original_price_label']} ${deal['original_price']:.2f}\n"
+        text += f"{TRANSLATIONS[lang]['discount_label']} {deal['discount_percentage']:.1f}%\n"
+        text += f"🏪 {deal.get('store', 'Unknown')}\n"
+        url = deal.get('url', '#')
+        if user_id is not None:
+            url = tracked_url(user_id, deal.get('store', 'Unknown'), deal.get('id'), url)
+        text += f"🔗 {url}"
+        return text
+
+    def get_store(self, store_id: str) -> BaseStore:
+        """Get a store instance, creating it on first use"""
+        store = self.registry.get(store_id)
+        if store_id not in self._indexed_stores:
+            self._index_new_store(store_id, store)
+        return store
+
+    def _index_new_store(self, store_id: str, store: BaseStore) -> None:
+        with self._index_lock:
+            if store_id in self._indexed_stores:
+                return
+            self._index_catalog(store_id, store)
+            store.add_catalog_listener(lambda refreshed: self._index_catalog(store_id, refreshed))
+            self._indexed_stores.add(store_id)
+
+    def _index_catalog(self, store_id: str, store: BaseStore) -> None:
+        deals = store.get_raw_deals()
+        self.search_index.index_store(store_id, deals)
+        self.ranker.set_store_deals(store_id, deals)
+        self.inline_cache.clear()
+
+    def load_all_stores(self) -> None:
+        """Create every enabled store up front, e.g. from a warm-up thread"""
+        for store_id in self.registry.enabled():
+            try:
+                self.get_store(store_id)
+            except Exception as e:
+                logger.error(f"Error loading store {store_id}: {str(e)}")
+
     def get_available_stores(self) -> List[str]:
         """Get list of available stores"""
-        return list(self.stores.keys())
+        return self.registry.enabled()
 
     def get_store_name(self, store_id: str) -> str:
         """Get display name for store"""
-        store = self.stores.get(store_id)
-        return store.get_store_name() if store else store_id.capitalize()
\ No newline at end of file
+        if not self.registry.is_enabled(store_id):
+            return store_id.capitalize()
+        # Read from the class so menus don't build every store's catalog
+        return self.registry.get_class(store_id).display_name or store_id.capitalize()
+
+    def get_store_health(self) -> Dict[str, Dict[str, Any]]:
+        """Get the health of the stores loaded so far"""
+        return {store_id: store.health() for store_id, store in self.registry.loaded().items()}
\ No newline at end of file
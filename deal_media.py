@@ -0,0 +1,154 @@
+import asyncio
+import hashlib
+import logging
+import os
+from typing import Dict, List, Optional
+from firebase_admin import firestore
+from telegram import Bot, InputMediaPhoto, Message
+from telegram.error import BadRequest
+from firebase_client import get_db
+from metrics import REGISTRY
+from ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Offer deal photos; off by default because most store feeds don't carry images yet
+DEAL_IMAGES = os.getenv('DEAL_IMAGES', '0') == '1'
+
+# Telegram accepts 2-10 photos per media group and 1024 characters per caption
+MAX_GROUP_SIZE = 10
+MAX_CAPTION_LENGTH = 1024
+
+def has_images(deals: List[Dict]) -> bool:
+    """Check if any of the deals has a photo to show"""
+    return DEAL_IMAGES and any(deal.get('image_url') for deal in deals)
+
+def photo_caption(index: int, deal: Dict) -> str:
+    caption = f"{index}. {deal['title']}\n${deal['price']:.2f} (-{deal['discount_percentage']:.0f}%) · {deal.get('store', '')}"
+    return caption[:MAX_CAPTION_LENGTH]
+
+class TelegramFileCache:
+    """Image URL -> Telegram file_id of the photo once it has been sent
+
+    The first send of an image passes its URL and Telegram downloads it;
+    the file_id from the sent message is stored in memory and in the
+    `telegram_files` collection (keyed by a hash of the URL, which may be
+    too long or contain '/'), so later sends to any user, and after a
+    restart, reuse the uploaded file with no image transfer at all.
+    """
+
+    def __init__(self, db=None):
+        self.db = db or get_db()
+        self.files_ref = self.db.collection('telegram_files')
+        self._cache = TTLCache(maxsize=50000, ttl=7 * 24 * 60 * 60)
+        REGISTRY.register_cache('telegram_files', self._cache)
+
+    @staticmethod
+    def _key(url: str) -> str:
+        return hashlib.sha1(url.encode()).hexdigest()
+
+    def get_many(self, urls: List[str]) -> Dict[str, str]:
+        """Get the file_ids known for image URLs, reading the uncached ones in one batch
+
+        Blocks on Firestore, so call it off the event loop.
+        """
+        found = {}
+        missing = []
+        for url in dict.fromkeys(urls):
+            file_id = self._cache.get(url)
+            if file_id:
+                found[url] = file_id
+            else:
+                missing.append(url)
+        if not missing:
+            return found
+        try:
+            by_key = {self._key(url): url for url in missing}
+            for doc in self.db.get_all([self.files_ref.document(key) for key in by_key]):
+                file_id = doc.to_dict().get('file_id') if doc.exists else None
+                if file_id:
+                    url = by_key[doc.id]
+                    self._cache.set(url, file_id)
+                    found[url] = file_id
+        except Exception as e:
+            logger.error(f"Error looking up Telegram files: {e}")
+        return found
+
+    def set_many(self, file_ids: Dict[str, str]) -> None:
+        """Remember the file_ids of newly sent images, writing them in one batch"""
+        for url, file_id in file_ids.items():
+            self._cache.set(url, file_id)
+        try:
+            batch = self.db.batch()
+            for url, file_id in file_ids.items():
+                batch.set(self.files_ref.document(self._key(url)), {
+                    'url': url,
+                    'file_id': file_id,
+                    'updated_at': firestore.SERVER_TIMESTAMP
+                })
+            batch.commit()
+        except Exception as e:
+            logger.error(f"Error saving Telegram files: {e}")
+
+    def forget_many(self, urls: List[str]) -> None:
+        """Drop file_ids Telegram no longer accepts"""
+        for url in urls:
+            self._cache.pop(url)
+        try:
+            batch = self.db.batch()
+            for url in urls:
+                batch.delete(self.files_ref.document(self._key(url)))
+            batch.commit()
+        except Exception as e:
+            logger.error(f"Error deleting Telegram files: {e}")
+
+async def send_deal_photos(bot: Bot, chat_id: int, deals: List[Dict], files: TelegramFileCache) -> int:
+    """Send the photos of deals that have one, as a single media group where possible
+
+    Photos already sent once go by file_id; the others by URL, after
+    which their file_ids are cached. If Telegram rejects a cached file_id
+    the group is sent again by URL. The file_id lookups and writes are
+    batched and run off the event loop.
+
+    Returns:
+        int: Number of photos sent
+    """
+    shown = [(i, deal) for i, deal in enumerate(deals, 1) if deal.get('image_url')][:MAX_GROUP_SIZE]
+    if not shown:
+        return 0
+
+    known = await asyncio.to_thread(files.get_many, [deal['image_url'] for _, deal in shown])
+    for retry in (False, True):
+        sources = []
+        for _, deal in shown:
+            file_id = None if retry else known.get(deal['image_url'])
+            sources.append(file_id or deal['image_url'])
+        try:
+            if len(shown) == 1:
+                messages = [await bot.send_photo(chat_id, sources[0], caption=photo_caption(*shown[0]))]
+            else:
+                messages = await bot.send_media_group(chat_id, [
+                    InputMediaPhoto(source, caption=photo_caption(i, deal))
+                    for source, (i, deal) in zip(sources, shown)
+                ])
+            break
+        except BadRequest as e:
+            reused = [deal['image_url'] for source, (_, deal) in zip(sources, shown) if source != deal['image_url']]
+            if retry or not reused or 'file' not in str(e).lower():
+                raise
+            logger.warning("Telegram rejected cached photos, resending by URL: %s", e)
+            await asyncio.to_thread(files.forget_many, reused)
+
+    new_file_ids = {}
+    for message, (_, deal), source in zip(messages, shown, sources):
+        if source == deal['image_url']:
+            file_id = _largest_photo_id(message)
+            if file_id:
+                new_file_ids[deal['image_url']] = file_id
+    if new_file_ids:
+        await asyncio.to_thread(files.set_many, new_file_ids)
+    return len(messages)
+
+def _largest_photo_id(message: Message) -> Optional[str]:
+    # Telegram returns every size it generated, smallest first
+    return message.photo[-1].file_id if message.photo else None
@@ -0,0 +1,172 @@
+import logging
+import math
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Feature columns, each scaled to about [0, 1] across the catalog
+FEATURES = ('discount', 'rating', 'reviews', 'in_stock', 'price')
+
+# Linear model over the features; price counts against a deal
+DEFAULT_WEIGHTS = {'discount': 1.0, 'rating': 0.3, 'reviews': 0.2, 'in_stock': 0.1, 'price': -0.1}
+
+# How much a user's strongest store or category interest adds to a score
+PREFERENCE_WEIGHT = 0.5
+
+def interest_key(kind: str, value: str) -> str:
+    """Key of a store or category in a user's interest weights, e.g. "store:amazon" """
+    return f"{kind}:{value}"
+
+def _field(deal: Dict[str, Any], field: str) -> Any:
+    """Read a field from a raw deal, or from a formatted deal's metadata"""
+    value = deal.get(field)
+    if value is None:
+        value = (deal.get('metadata') or {}).get(field)
+    return value
+
+def _raw_features(deal: Dict[str, Any]) -> Tuple[float, ...]:
+    rating = _field(deal, 'rating')
+    return (
+        float(deal.get('discount_percentage') or 0) / 100,
+        float(rating) / 5 if rating is not None else 0.5,
+        math.log1p(float(_field(deal, 'reviews_count') or 0)),
+        1.0 if (_field(deal, 'stock_status') or 'In Stock') == 'In Stock' else 0.0,
+        math.log1p(float(deal.get('price') or 0)),
+    )
+
+def _scale_log_columns(features: np.ndarray) -> np.ndarray:
+    """Bring the log-scale review count and price columns to [0, 1], in place"""
+    for column in (FEATURES.index('reviews'), FEATURES.index('price')):
+        peak = features[:, column].max()
+        if peak > 0:
+            features[:, column] /= peak
+    return features
+
+class _Catalog:
+    """Feature matrix and codes for every store's deals, rebuilt when a store changes"""
+
+    def __init__(self, blocks: Dict[str, Tuple[List[Dict[str, Any]], np.ndarray, np.ndarray]],
+                 categories: Dict[Any, int], weights: np.ndarray):
+        self.store_ids = list(blocks)
+        self.deals: List[Tuple[str, Dict[str, Any]]] = [
+            (store_id, deal) for store_id, (deals, _, _) in blocks.items() for deal in deals]
+        self.categories = dict(categories)
+        count = len(self.deals)
+        if count:
+            features = _scale_log_columns(np.concatenate([features for _, features, _ in blocks.values()]))
+            self.category_codes = np.concatenate([codes for _, _, codes in blocks.values()])
+            self.store_codes = np.repeat(np.arange(len(blocks)), [len(deals) for deals, _, _ in blocks.values()])
+            self.base_scores = features @ weights
+        else:
+            self.category_codes = self.store_codes = np.zeros(0, dtype=np.int64)
+            self.base_scores = np.zeros(0)
+        # Order for users without interests, computed on first use
+        self._default_order: Optional[np.ndarray] = None
+
+    def default_order(self) -> np.ndarray:
+        if self._default_order is None:
+            self._default_order = np.argsort(-self.base_scores, kind='stable')
+        return self._default_order
+
+class DealRanker:
+    """Scores deals with a linear model plus per-user store and category interests
+
+    Features are computed once per store catalog and kept as a matrix, so
+    ranking is one vectorized pass: base scores (features . weights) plus
+    the user's interest in each deal's store and category, looked up
+    through integer codes. The top of the ranking is found with a partial
+    sort (argpartition), so a page costs O(n + k log k), not O(n log n).
+
+    Args:
+        weights: Feature name to weight, defaults to DEFAULT_WEIGHTS
+        preference_weight: Score added by a user's strongest interest
+    """
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None, preference_weight: float = PREFERENCE_WEIGHT):
+        weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self.weights = np.array([weights[feature] for feature in FEATURES])
+        self.preference_weight = preference_weight
+        self._blocks: Dict[str, Tuple[List[Dict[str, Any]], np.ndarray, np.ndarray]] = {}
+        self._categories: Dict[Any, int] = {}
+        self._catalog: Optional[_Catalog] = None
+        self._lock = threading.Lock()
+
+    def set_store_deals(self, store_id: str, deals: List[Dict[str, Any]]) -> None:
+        """Compute the features of a store's raw deals, replacing its previous catalog"""
+        deals = list(deals)
+        features = np.array([_raw_features(deal) for deal in deals], dtype=np.float64).reshape(-1, len(FEATURES))
+        with self._lock:
+            codes = np.array([self._categories.setdefault(deal.get('category'), len(self._categories))
+                              for deal in deals], dtype=np.int64)
+            self._blocks[store_id] = (deals, features, codes)
+            self._catalog = None
+
+    def _get_catalog(self) -> _Catalog:
+        catalog = self._catalog
+        if catalog is None:
+            with self._lock:
+                if self._catalog is None:
+                    self._catalog = _Catalog(self._blocks, self._categories, self.weights)
+                    logger.debug("Compiled ranking catalog of %s deals", len(self._catalog.deals))
+                catalog = self._catalog
+        return catalog
+
+    def _scores(self, catalog: _Catalog, interests: Dict[str, float]) -> np.ndarray:
+        """Base scores plus the user's normalized store and category interests"""
+        strongest = max((abs(weight) for weight in interests.values()), default=0)
+        if not strongest:
+            return catalog.base_scores
+        scale = self.preference_weight / strongest
+        store_preferences = np.zeros(len(catalog.store_ids))
+        for i, store_id in enumerate(catalog.store_ids):
+            store_preferences[i] = interests.get(interest_key('store', store_id), 0) * scale
+        category_preferences = np.zeros(len(catalog.categories))
+        for category, code in catalog.categories.items():
+            category_preferences[code] = interests.get(interest_key('category', category), 0) * scale
+        return (catalog.base_scores + store_preferences[catalog.store_codes]
+                + category_preferences[catalog.category_codes])
+
+    def top(self, limit: int, offset: int = 0,
+            interests: Optional[Dict[str, float]] = None) -> Tuple[List[Tuple[str, Dict[str, Any]]], int]:
+        """Get a page of the catalog ranked for a user
+
+        Args:
+            interests: interest_key() to weight, e.g. counts of the user's views and subscriptions
+
+        Returns:
+            Tuple of ([(store ID, raw deal), ...], catalog size)
+        """
+        catalog = self._get_catalog()
+        count = len(catalog.deals)
+        wanted = min(offset + limit, count)
+        if wanted <= offset:
+            return [], count
+
+        if not interests:
+            order = catalog.default_order()[offset:wanted]
+        else:
+            scores = self._scores(catalog, interests)
+            if wanted < count:
+                candidates = np.argpartition(-scores, wanted - 1)[:wanted]
+            else:
+                candidates = np.arange(count)
+            order = candidates[np.argsort(-scores[candidates], kind='stable')][offset:]
+        return [catalog.deals[i] for i in order], count
+
+    def rank(self, deals: List[Dict[str, Any]], store_ids: List[str],
+             interests: Optional[Dict[str, float]] = None) -> List[Dict[str, Any]]:
+        """Order an ad-hoc list of deals (e.g. a filtered page) by the same model"""
+        if not deals:
+            return deals
+        features = _scale_log_columns(np.array([_raw_features(deal) for deal in deals], dtype=np.float64))
+        scores = features @ self.weights
+        if interests:
+            strongest = max(abs(weight) for weight in interests.values()) or 1
+            scores = scores + self.preference_weight / strongest * np.array([
+                interests.get(interest_key('store', store_id), 0)
+                + interests.get(interest_key('category', _field(deal, 'category')), 0)
+                for deal, store_id in zip(deals, store_ids)])
+        return [deals[i] for i in np.argsort(-scores, kind='stable')]
@@ -0,0 +1,419 @@
+import bisect
+import functools
+import heapq
+import itertools
+import logging
+import math
+import re
+import threading
+import unicodedata
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Field -> weight of a term found in it
+FIELD_WEIGHTS = {'title': 3, 'brand': 2, 'category': 1}
+
+# Posting tiers split discounts into steps of a tenth of a percent
+DISCOUNT_TIERS_PER_PERCENT = 10
+
+# Indexed terms a word still being typed expands to, the most common first,
+# and the shortest such word worth expanding
+MAX_PREFIX_TERMS = 20
+MIN_PREFIX_LENGTH = 2
+
+# Words too common to narrow a search, in English, Uzbek and Russian
+STOPWORDS = {
+    'a', 'an', 'and', 'the', 'for', 'with', 'of', 'in', 'on', 'to', 'by', 'new', 'sale', 'deal', 'deals',
+    'va', 'uchun', 'bilan', 'yangi', 'chegirma',
+    'и', 'в', 'на', 'с', 'для', 'по', 'из', 'новый', 'скидка',
+}
+
+# Uzbek Latin writes o‘ and g‘ with several apostrophe look-alikes
+_APOSTROPHES = str.maketrans({'ʻ': "'", 'ʼ': "'", '‘': "'", '’': "'", '`': "'", 'ё': 'е'})
+_TOKEN = re.compile(r"[^\W_]+(?:'[^\W_]+)*")
+_CYRILLIC = re.compile(r'[а-я]')
+
+# Inflection endings stripped so "наушники"/"наушников" and "headphones"/"headphone" meet
+_RUSSIAN_ENDINGS = tuple(sorted((
+    'ами', 'ями', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ов', 'ев', 'ей', 'ам', 'ям', 'ах', 'ях',
+    'ой', 'ый', 'ий', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ом', 'ем', 'ую', 'юю',
+    'а', 'я', 'ы', 'и', 'е', 'у', 'ю', 'о', 'ь',
+), key=len, reverse=True))
+_UZBEK_ENDINGS = ('lari', 'lar', 'ning', 'dagi', 'ni', 'da', 'ga')
+
+@functools.lru_cache(maxsize=100_000)
+def stem(token: str) -> str:
+    """Strip common plural and case endings, keeping a stem of three or four letters"""
+    if token.isdigit():
+        return token
+    if _CYRILLIC.search(token):
+        endings, min_stem = _RUSSIAN_ENDINGS, 3
+    else:
+        endings, min_stem = _UZBEK_ENDINGS, 4
+        if token.endswith('s') and not token.endswith('ss') and len(token) > 4:
+            return token[:-2] if token.endswith(('ches', 'shes', 'sses', 'xes')) else token[:-1]
+    for ending in endings:
+        if token.endswith(ending) and len(token) - len(ending) >= min_stem:
+            return token[:-len(ending)]
+    return token
+
+def _words(text: Optional[str]) -> List[str]:
+    """Split text into lowercase words, before stopwords are dropped and endings stemmed"""
+    if not text:
+        return []
+    text = unicodedata.normalize('NFKC', text).lower().translate(_APOSTROPHES)
+    words = []
+    for token in _TOKEN.findall(text):
+        if token.endswith("'s"):
+            token = token[:-2]
+        if token:
+            words.append(token)
+    return words
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Split English, Uzbek or Russian text into normalized search terms"""
+    return [stem(word) for word in _words(text) if word not in STOPWORDS]
+
+class DealSearchIndex:
+    """In-memory inverted index over deal titles, brands and categories
+
+    Each term maps to the documents containing it and the term's field
+    weight there, and also groups those documents into tiers by weight and
+    discount. Stores are indexed with index_store(), which only
+    re-tokenizes deals whose searchable text changed, so it can run after
+    every catalog refresh. Queries rank by walking the rarest term's
+    tiers best first and stop once no remaining tier can beat the results
+    found, so with a max_results cap a page of results costs about the
+    same at a thousand deals as at millions.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[int, int]] = {}
+        # term -> (weight, discount tier) -> doc IDs
+        self._tiers: Dict[str, Dict[Tuple[int, int], set]] = {}
+        # doc ID -> (store ID, raw deal, terms, discount tier)
+        self._docs: Dict[int, Tuple[str, Dict[str, Any], Tuple[str, ...], int]] = {}
+        # store ID -> deal ID -> (doc ID, searchable text)
+        self._store_docs: Dict[str, Dict[Any, Tuple[int, Tuple]]] = {}
+        # Unstemmed word -> documents holding it, and the doc ID -> words map to update it;
+        # prefixes are matched against these words, since a stem may be shorter than
+        # the word being typed ("regul" begins "regular", indexed as "regu")
+        self._word_counts: Dict[str, int] = {}
+        self._doc_words: Dict[int, Tuple[str, ...]] = {}
+        # Sorted words for prefix lookups, rebuilt after words are added or removed
+        self._vocabulary: Optional[List[str]] = None
+        self._next_doc_id = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    @staticmethod
+    def _searchable_text(deal: Dict[str, Any]) -> Tuple:
+        return tuple(deal.get(field) for field in FIELD_WEIGHTS)
+
+    @staticmethod
+    def _discount(deal: Dict[str, Any]) -> float:
+        return float(deal.get('discount_percentage') or 0)
+
+    def _tier(self, deal: Dict[str, Any]) -> int:
+        return int(self._discount(deal) * DISCOUNT_TIERS_PER_PERCENT)
+
+    def _add(self, store_id: str, deal: Dict[str, Any]) -> int:
+        doc_id = self._next_doc_id
+        self._next_doc_id += 1
+        weights: Dict[str, int] = {}
+        words = set()
+        for field, weight in FIELD_WEIGHTS.items():
+            for word in _words(deal.get(field)):
+                if word in STOPWORDS:
+                    continue
+                words.add(word)
+                term = stem(word)
+                weights[term] = max(weights.get(term, 0), weight)
+        for word in words:
+            count = self._word_counts.get(word, 0)
+            if not count:
+                self._vocabulary = None
+            self._word_counts[word] = count + 1
+        self._doc_words[doc_id] = tuple(words)
+        tier = self._tier(deal)
+        for term, weight in weights.items():
+            self._postings.setdefault(term, {})[doc_id] = weight
+            self._tiers.setdefault(term, {}).setdefault((weight, tier), set()).add(doc_id)
+        self._docs[doc_id] = (store_id, deal, tuple(weights), tier)
+        return doc_id
+
+    def _untier(self, term: str, doc_id: int, tier: int) -> None:
+        tiers = self._tiers[term]
+        key = (self._postings[term][doc_id], tier)
+        tiers[key].discard(doc_id)
+        if not tiers[key]:
+            del tiers[key]
+
+    def _update(self, doc_id: int, deal: Dict[str, Any]) -> None:
+        """Swap in a new version of a deal whose searchable text is unchanged"""
+        store_id, _, terms, old_tier = self._docs[doc_id]
+        tier = self._tier(deal)
+        if tier != old_tier:
+            for term in terms:
+                self._untier(term, doc_id, old_tier)
+                self._tiers[term].setdefault((self._postings[term][doc_id], tier), set()).add(doc_id)
+        self._docs[doc_id] = (store_id, deal, terms, tier)
+
+    def _remove(self, doc_id: int) -> None:
+        _, _, terms, tier = self._docs.pop(doc_id)
+        for term in terms:
+            self._untier(term, doc_id, tier)
+            posting = self._postings[term]
+            del posting[doc_id]
+            if not posting:
+                del self._postings[term]
+                del self._tiers[term]
+        for word in self._doc_words.pop(doc_id):
+            self._word_counts[word] -= 1
+            if not self._word_counts[word]:
+                del self._word_counts[word]
+                self._vocabulary = None
+
+    def index_store(self, store_id: str, deals: Iterable[Dict[str, Any]]) -> Tuple[int, int]:
+        """Bring a store's documents in line with its current catalog
+
+        Deals are compared by identity first, so a refresh that keeps
+        unchanged deal objects (as ApiStore does) costs a lookup per deal.
+
+        Returns:
+            Tuple of (deals (re)indexed, deals removed)
+        """
+        with self._lock:
+            previous = self._store_docs.get(store_id, {})
+            current: Dict[Any, Tuple[int, Tuple]] = {}
+            indexed = 0
+            for deal in deals:
+                deal_id = deal.get('id')
+                entry = previous.pop(deal_id, None)
+                if entry is not None and self._docs[entry[0]][1] is deal:
+                    current[deal_id] = entry
+                    continue
+                text = self._searchable_text(deal)
+                if entry is not None and entry[1] == text:
+                    # Same words; only prices and stock may differ
+                    self._update(entry[0], deal)
+                    current[deal_id] = entry
+                    continue
+                if entry is not None:
+                    self._remove(entry[0])
+                current[deal_id] = (self._add(store_id, deal), text)
+                indexed += 1
+            for doc_id, _ in previous.values():
+                self._remove(doc_id)
+            self._store_docs[store_id] = current
+        if indexed or previous:
+            logger.info("Indexed %s deals from %s for search, removed %s", indexed, store_id, len(previous))
+        return indexed, len(previous)
+
+    def remove_store(self, store_id: str) -> None:
+        with self._lock:
+            for doc_id, _ in self._store_docs.pop(store_id, {}).values():
+                self._remove(doc_id)
+
+    def _matches(self, postings: List[Dict[int, int]], allowed: Optional[set]) -> Iterator[int]:
+        """Yield the documents holding every term, from the stores allowed"""
+        rest = postings[1:]
+        for doc_id in postings[0]:
+            if all(doc_id in posting for posting in rest) and (
+                    allowed is None or self._docs[doc_id][0] in allowed):
+                yield doc_id
+
+    def search(self, query: str, limit: int = 5, offset: int = 0, stores: Optional[Iterable[str]] = None,
+               max_results: Optional[int] = None) -> Tuple[List[Tuple[str, Dict[str, Any]]], int]:
+        """Find deals matching every term of the query, best first
+
+        Documents are scored by the summed field weight of the query terms,
+        each scaled by the term's inverse document frequency; ties go to
+        the bigger discount.
+
+        Args:
+            max_results: Stop counting matches here; counting is the part of
+                a broad query that grows with the catalog
+
+        Returns:
+            Tuple of ([(store ID, raw deal), ...] for the requested slice, total matches)
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return [], 0
+
+        with self._lock:
+            if any(term not in self._postings for term in terms):
+                return [], 0
+            terms.sort(key=lambda term: len(self._postings[term]))
+            postings = [self._postings[term] for term in terms]
+            total_docs = len(self._docs)
+            idf = [math.log(1 + total_docs / len(posting)) for posting in postings]
+            allowed = set(stores) if stores is not None else None
+            if allowed is not None and allowed.issuperset(self._store_docs):
+                allowed = None
+
+            if max_results is not None:
+                total = sum(1 for _ in itertools.islice(self._matches(postings, allowed), max_results))
+            elif allowed is None and len(postings) > 1:
+                matches = postings[0].keys()
+                for posting in postings[1:]:
+                    # Key views intersect by iterating the smaller side
+                    matches = posting.keys() & matches
+                total = len(matches)
+            else:
+                total = sum(1 for _ in self._matches(postings, allowed))
+
+            # Walk the rarest term's tiers best first; a tier can't beat the results found
+            # once its best possible (score, discount) is no better than the worst kept one
+            wanted = min(offset + limit, total)
+            if wanted <= offset:
+                return [], total
+            best: List[Tuple[float, float, int]] = []
+            rest_bound = sum(max(FIELD_WEIGHTS.values()) * weight for weight in idf[1:])
+            tiers = self._tiers[terms[0]]
+            for weight, tier in sorted(tiers, reverse=True):
+                if len(best) == wanted:
+                    bound = weight * idf[0] + rest_bound
+                    # Scores within rounding error of the bound count as ties
+                    worst_score, worst_discount = best[0][:2]
+                    tolerance = 1e-9 * bound
+                    if worst_score > bound + tolerance or (
+                            worst_score >= bound - tolerance
+                            and worst_discount >= (tier + 1) / DISCOUNT_TIERS_PER_PERCENT):
+                        break
+                for doc_id in tiers[(weight, tier)]:
+                    store_id, deal, _, _ = self._docs[doc_id]
+                    if allowed is not None and store_id not in allowed:
+                        continue
+                    score = weight * idf[0]
+                    for i in range(1, len(postings)):
+                        other = postings[i].get(doc_id)
+                        if other is None:
+                            break
+                        score += other * idf[i]
+                    else:
+                        entry = (score, self._discount(deal), doc_id)
+                        if len(best) < wanted:
+                            heapq.heappush(best, entry)
+                        elif entry > best[0]:
+                            heapq.heapreplace(best, entry)
+
+            ranked = sorted(best, reverse=True)[offset:]
+            return [self._docs[doc_id][:2] for _, _, doc_id in ranked], total
+
+    def _expand(self, prefix: str) -> List[str]:
+        """Get the indexed terms a word being typed may become, the most common first"""
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self._word_counts)
+        vocabulary = self._vocabulary
+        start = bisect.bisect_left(vocabulary, prefix)
+        end = bisect.bisect_left(vocabulary, prefix + '\U0010ffff', start)
+        terms = {stem(word) for word in vocabulary[start:end]}
+        # A finished inflected word, e.g. "laptops", is only a prefix of nothing
+        if stem(prefix) in self._postings:
+            terms.add(stem(prefix))
+        return heapq.nlargest(MAX_PREFIX_TERMS, terms, key=lambda term: len(self._postings[term]))
+
+    def complete(self, query: str, limit: int = 20,
+                 stores: Optional[Iterable[str]] = None) -> List[Tuple[str, Dict[str, Any]]]:
+        """Find the best deals for a query whose last word may still be being typed
+
+        Every other word must match as in search(). Unless the query ends
+        with a space, its last word also matches the terms of the indexed
+        words it begins, found by bisecting the sorted unstemmed words; a document scores
+        its best match among them. Results are found by walking those
+        terms' tiers best first and stopping as search() does, or, when
+        another word is rarer than all of them together, by scanning that
+        word's documents.
+
+        Returns:
+            [(store ID, raw deal), ...], best first
+        """
+        words = _words(query)
+        prefix = words.pop() if words and not query[-1].isspace() else None
+        if prefix is not None and (len(prefix) < MIN_PREFIX_LENGTH or prefix in STOPWORDS):
+            prefix = None
+        if prefix is None:
+            # Nothing left to complete; the query may be a finished word plus a stopword
+            return self.search(' '.join(words), limit=limit, stores=stores, max_results=limit)[0]
+        terms = list(dict.fromkeys(stem(word) for word in words if word not in STOPWORDS))
+
+        with self._lock:
+            if any(term not in self._postings for term in terms):
+                return []
+            expansions = self._expand(prefix)
+            if not expansions:
+                return []
+            total_docs = len(self._docs)
+            idf = {term: math.log(1 + total_docs / len(self._postings[term])) for term in terms + expansions}
+            allowed = set(stores) if stores is not None else None
+            if allowed is not None and allowed.issuperset(self._store_docs):
+                allowed = None
+
+            # The tier walk finds limit results after about limit / (share of documents
+            # holding the other words) documents; scan the rarest word's instead if fewer
+            terms.sort(key=lambda term: len(self._postings[term]))
+            share = math.prod(len(self._postings[term]) / total_docs for term in terms)
+            if terms and len(self._postings[terms[0]]) < limit / share:
+                best = self._complete_by_scan(terms, expansions, idf, limit, allowed)
+            else:
+                best = self._complete_by_tiers(terms, expansions, idf, limit, allowed)
+            return [self._docs[doc_id][:2] for _, _, doc_id in sorted(best, reverse=True)]
+
+    def _keep_best(self, best: List[Tuple[float, float, int]], limit: int, score: float, doc_id: int) -> None:
+        entry = (score, self._discount(self._docs[doc_id][1]), doc_id)
+        if len(best) < limit:
+            heapq.heappush(best, entry)
+        elif entry > best[0]:
+            heapq.heapreplace(best, entry)
+
+    def _complete_by_tiers(self, terms: List[str], expansions: List[str], idf: Dict[str, float], limit: int,
+                           allowed: Optional[set]) -> List[Tuple[float, float, int]]:
+        # A document's prefix score in a tier is the tier's weight times its term's IDF,
+        # so walking all tiers by that score visits each document at its best match first
+        tiers = sorted(((weight * idf[term], tier, term, weight)
+                        for term in expansions for weight, tier in self._tiers[term]), reverse=True)
+        postings = [(self._postings[term], idf[term]) for term in terms]
+        rest_bound = sum(max(FIELD_WEIGHTS.values()) * weight for _, weight in postings)
+        best: List[Tuple[float, float, int]] = []
+        seen = set()
+        for prefix_score, tier, term, weight in tiers:
+            if len(best) == limit:
+                bound = prefix_score + rest_bound
+                worst_score, worst_discount = best[0][:2]
+                tolerance = 1e-9 * bound
+                if worst_score > bound + tolerance or (
+                        worst_score >= bound - tolerance
+                        and worst_discount >= (tier + 1) / DISCOUNT_TIERS_PER_PERCENT):
+                    break
+            for doc_id in self._tiers[term][(weight, tier)]:
+                if doc_id in seen:
+                    continue
+                seen.add(doc_id)
+                if allowed is not None and self._docs[doc_id][0] not in allowed:
+                    continue
+                score = prefix_score
+                for posting, term_weight in postings:
+                    other = posting.get(doc_id)
+                    if other is None:
+                        break
+                    score += other * term_weight
+                else:
+                    self._keep_best(best, limit, score, doc_id)
+        return best
+
+    def _complete_by_scan(self, terms: List[str], expansions: List[str], idf: Dict[str, float], limit: int,
+                          allowed: Optional[set]) -> List[Tuple[float, float, int]]:
+        postings = [(self._postings[term], idf[term]) for term in terms]
+        prefix_postings = [(self._postings[term], idf[term]) for term in expansions]
+        best: List[Tuple[float, float, int]] = []
+        for doc_id in self._matches([posting for posting, _ in postings], allowed):
+            prefix_score = max(posting.get(doc_id, 0) * weight for posting, weight in prefix_postings)
+            if prefix_score:
+                self._keep_best(best, limit, sum(posting[doc_id] * weight for posting, weight in postings)
+                                + prefix_score, doc_id)
+        return best
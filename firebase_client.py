@@ -0,0 +1,36 @@
+import logging
+import os
+import threading
+import firebase_admin
+from firebase_admin import credentials, firestore
+from firestore_metrics import instrument_firestore
+
+logger = logging.getLogger(__name__)
+
+CREDENTIALS_PATH = os.getenv("FIREBASE_CREDENTIALS", "credentials.json")
+
+_db = None
+_lock = threading.Lock()
+
+def initialize_firebase() -> None:
+    """Initialize the default Firebase app once per process"""
+    if not len(firebase_admin._apps):
+        cred = credentials.Certificate(CREDENTIALS_PATH)
+        firebase_admin.initialize_app(cred)
+        logger.info("Firebase initialized successfully")
+
+def get_db():
+    """Get the shared, instrumented Firestore client, creating it on first use"""
+    global _db
+    if _db is None:
+        with _lock:
+            if _db is None:
+                initialize_firebase()
+                _db = instrument_firestore(firestore.client())
+    return _db
+
+def set_db(db) -> None:
+    """Replace the shared client, e.g. with an in-memory fake for benchmarks"""
+    global _db
+    with _lock:
+        _db = instrument_firestore(db) if db is not None else None
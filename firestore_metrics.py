@@ -0,0 +1,109 @@
+import time
+from metrics import FIRESTORE_LATENCY, FIRESTORE_OPERATIONS
+
+def _track(collection: str, operation: str, func, *args, **kwargs):
+    FIRESTORE_OPERATIONS.inc(collection=collection, operation=operation)
+    started = time.perf_counter()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        FIRESTORE_LATENCY.observe(time.perf_counter() - started, collection=collection, operation=operation)
+
+def _unwrap(ref):
+    return getattr(ref, '_ref', ref)
+
+class _Proxy:
+    """Pass-through wrapper around a Firestore object"""
+
+    def __init__(self, ref, collection: str = ''):
+        self._ref = ref
+        self._collection = collection
+
+    def __getattr__(self, name):
+        return getattr(self._ref, name)
+
+class InstrumentedDocument(_Proxy):
+    def get(self, *args, **kwargs):
+        return _track(self._collection, 'read', self._ref.get, *args, **kwargs)
+
+    def set(self, *args, **kwargs):
+        return _track(self._collection, 'write', self._ref.set, *args, **kwargs)
+
+    def update(self, *args, **kwargs):
+        return _track(self._collection, 'write', self._ref.update, *args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        return _track(self._collection, 'delete', self._ref.delete, *args, **kwargs)
+
+    def collection(self, name: str):
+        return InstrumentedCollection(self._ref.collection(name), name)
+
+class InstrumentedQuery(_Proxy):
+    def where(self, *args, **kwargs):
+        return InstrumentedQuery(self._ref.where(*args, **kwargs), self._collection)
+
+    def order_by(self, *args, **kwargs):
+        return InstrumentedQuery(self._ref.order_by(*args, **kwargs), self._collection)
+
+    def limit(self, *args, **kwargs):
+        return InstrumentedQuery(self._ref.limit(*args, **kwargs), self._collection)
+
+    def get(self, *args, **kwargs):
+        return _track(self._collection, 'query', self._ref.get, *args, **kwargs)
+
+    def stream(self, *args, **kwargs):
+        FIRESTORE_OPERATIONS.inc(collection=self._collection, operation='query')
+        started = time.perf_counter()
+        try:
+            yield from self._ref.stream(*args, **kwargs)
+        finally:
+            FIRESTORE_LATENCY.observe(time.perf_counter() - started,
+                                      collection=self._collection, operation='query')
+
+class InstrumentedCollection(InstrumentedQuery):
+    def document(self, *args, **kwargs):
+        return InstrumentedDocument(self._ref.document(*args, **kwargs), self._collection)
+
+    def add(self, *args, **kwargs):
+        return _track(self._collection, 'write', self._ref.add, *args, **kwargs)
+
+class InstrumentedBatch(_Proxy):
+    """Counts each batched write against its collection and times the commit"""
+
+    def _count(self, ref, operation: str):
+        FIRESTORE_OPERATIONS.inc(collection=getattr(ref, '_collection', ''), operation=operation)
+
+    def set(self, ref, *args, **kwargs):
+        self._count(ref, 'write')
+        return self._ref.set(_unwrap(ref), *args, **kwargs)
+
+    def update(self, ref, *args, **kwargs):
+        self._count(ref, 'write')
+        return self._ref.update(_unwrap(ref), *args, **kwargs)
+
+    def delete(self, ref, *args, **kwargs):
+        self._count(ref, 'delete')
+        return self._ref.delete(_unwrap(ref), *args, **kwargs)
+
+    def commit(self, *args, **kwargs):
+        return _track('batch', 'commit', self._ref.commit, *args, **kwargs)
+
+class InstrumentedClient(_Proxy):
+    def collection(self, name: str):
+        return InstrumentedCollection(self._ref.collection(name), name)
+
+    def batch(self):
+        return InstrumentedBatch(self._ref.batch())
+
+    def get_all(self, references, *args, **kwargs):
+        """Read several documents in one round trip, counted once against the first one's collection"""
+        references = list(references)
+        collection = getattr(references[0], '_collection', '') if references else ''
+        return _track(collection, 'read', lambda: list(
+            self._ref.get_all([_unwrap(ref) for ref in references], *args, **kwargs)))
+
+def instrument_firestore(db):
+    """Wrap a Firestore client so every call is counted and timed per collection"""
+    if isinstance(db, InstrumentedClient):
+        return db
+    return InstrumentedClient(db)
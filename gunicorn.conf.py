@@ -0,0 +1,35 @@
+import os
+
+# Gunicorn settings for the Stripe webhook server (`gunicorn webhook:app`)
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('WEBHOOK_WORKERS', '2'))
+worker_class = 'gthread'
+threads = int(os.getenv('WEBHOOK_THREADS', '4'))
+timeout = int(os.getenv('WEBHOOK_TIMEOUT', '30'))
+graceful_timeout = int(os.getenv('WEBHOOK_GRACEFUL_TIMEOUT', '30'))
+keepalive = 5
+max_requests = int(os.getenv('WEBHOOK_MAX_REQUESTS', '0'))
+max_requests_jitter = max_requests // 10
+accesslog = '-' if os.getenv('WEBHOOK_ACCESS_LOG') == '1' else None
+
+def post_worker_init(worker):
+    """Connect to Firestore and start the event queue workers inside each forked worker process"""
+    import logging
+    import metrics
+    from firebase_client import get_db
+    metrics.start_snapshot_writer()
+
+    # Firestore's gRPC channel must be created after the fork, never in the master
+    try:
+        get_db()
+    except Exception as e:
+        logging.getLogger(__name__).error(f"Failed to initialize Firebase: {e}")
+
+    event_workers = worker.wsgi.extensions.get('event_workers')
+    if event_workers is not None:
+        event_workers.start()
+
+def worker_exit(server, worker):
+    """Let queued events in flight finish and flush metrics before the worker process exits"""
+    from lifecycle import run_shutdown_hooks
+    run_shutdown_hooks(graceful_timeout)
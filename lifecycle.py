@@ -0,0 +1,49 @@
+import logging
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_hooks: List[Tuple[str, Callable[[], None]]] = []
+_lock = threading.Lock()
+
+def register_shutdown_hook(func: Callable[[], None], name: Optional[str] = None) -> Callable[[], None]:
+    """Run func during a graceful shutdown, e.g. to flush buffered writes"""
+    with _lock:
+        _hooks.append((name or func.__qualname__, func))
+    return func
+
+def _run_hook(name: str, func: Callable[[], None]) -> None:
+    try:
+        func()
+        logger.info("Shutdown hook %s finished", name)
+    except Exception as e:
+        logger.error(f"Error in shutdown hook {name}: {e}")
+
+def run_shutdown_hooks(timeout: float) -> bool:
+    """Run the registered hooks in order within one shared deadline
+
+    Returns:
+        bool: True if every hook finished before the deadline
+    """
+    deadline = time.monotonic() + timeout
+    with _lock:
+        hooks = list(_hooks)
+        _hooks.clear()
+
+    finished = True
+    for name, func in hooks:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            logger.warning("Shutdown deadline passed, skipping hook %s", name)
+            finished = False
+            continue
+        # Daemon threads keep a stuck hook from blocking the process exit
+        thread = threading.Thread(target=_run_hook, args=(name, func), name=f"shutdown-{name}", daemon=True)
+        thread.start()
+        thread.join(remaining)
+        if thread.is_alive():
+            logger.warning("Shutdown hook %s did not finish within the deadline", name)
+            finished = False
+    return finished
@@ -0,0 +1,139 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+from typing import Dict, Iterable, Optional
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Chatty third-party loggers that would otherwise log every Telegram poll
+DEFAULT_MODULE_LEVELS = {
+    'httpx': 'WARNING',
+    'httpcore': 'WARNING',
+    'telegram.ext': 'INFO',
+}
+
+# Loggers on per-update hot paths whose INFO/DEBUG records are sampled
+DEFAULT_SAMPLED_LOGGERS = ('__main__', 'bot', 'user_manager', 'notification_manager', 'deal_fetcher')
+
+_STANDARD_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+_listener = None
+
+class JsonFormatter(logging.Formatter):
+    """Render each record as a single JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            'ts': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        # Anything passed via extra={...} becomes a structured field
+        for key, value in vars(record).items():
+            if key not in _STANDARD_RECORD_FIELDS and not key.startswith('_'):
+                payload[key] = value
+        if record.exc_info:
+            payload['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+class DeferredFormatQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the listener's handler
+
+    QueueHandler.prepare() formats the whole record in the calling thread.
+    This only merges the message arguments, which may change after the
+    call, and hands the record over as is; timestamps, JSON encoding and
+    tracebacks are rendered on the listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of INFO/DEBUG records from hot-path loggers
+
+    WARNING and above always pass, as do records from loggers that are not
+    listed.
+    """
+
+    def __init__(self, rate: float, loggers: Iterable[str]):
+        super().__init__()
+        self.rate = rate
+        self.loggers = tuple(loggers)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate >= 1.0 or record.levelno >= logging.WARNING:
+            return True
+        if not any(record.name == name or record.name.startswith(name + '.') for name in self.loggers):
+            return True
+        return random.random() < self.rate
+
+def parse_module_levels(spec: Optional[str]) -> Dict[str, str]:
+    """Parse a 'module=LEVEL,other=LEVEL' string into a dict"""
+    levels = {}
+    for item in (spec or '').split(','):
+        if '=' in item:
+            name, level = item.split('=', 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+def configure_logging() -> None:
+    """Configure process-wide logging from environment variables
+
+    LOG_LEVEL: root level (default INFO)
+    LOG_FORMAT: 'text' (default) or 'json'
+    LOG_LEVELS: per-module overrides, e.g. 'webhook=DEBUG,httpx=WARNING'
+    LOG_SAMPLE_RATE: fraction of hot-path INFO/DEBUG records kept (default 1.0)
+    LOG_ASYNC: '1' (default) emits through a background queue listener
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    if os.getenv('LOG_FORMAT', 'text').lower() == 'json':
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(TEXT_FORMAT)
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(formatter)
+
+    sampling = SamplingFilter(float(os.getenv('LOG_SAMPLE_RATE', '1.0')), DEFAULT_SAMPLED_LOGGERS)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+
+    if os.getenv('LOG_ASYNC', '1') == '1':
+        # Callers only merge the message and enqueue the record; formatting and I/O happen on the listener thread
+        queue_handler = DeferredFormatQueueHandler(queue.SimpleQueue())
+        queue_handler.addFilter(sampling)
+        root.addHandler(queue_handler)
+        _listener = logging.handlers.QueueListener(queue_handler.queue, stream_handler)
+        _listener.start()
+        atexit.register(shutdown_logging)
+    else:
+        stream_handler.addFilter(sampling)
+        root.addHandler(stream_handler)
+        _listener = stream_handler
+
+    module_levels = dict(DEFAULT_MODULE_LEVELS)
+    module_levels.update(parse_module_levels(os.getenv('LOG_LEVELS')))
+    for name, level in module_levels.items():
+        logging.getLogger(name).setLevel(level)
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the background listener"""
+    global _listener
+    if isinstance(_listener, logging.handlers.QueueListener):
+        _listener.stop()
+    _listener = None
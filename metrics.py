@@ -0,0 +1,272 @@
+import bisect
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Sequence
+from lifecycle import register_shutdown_hook
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Processes sharing this directory publish snapshots that /metrics merges
+METRICS_DIR = os.getenv('METRICS_DIR')
+SNAPSHOT_INTERVAL = float(os.getenv('METRICS_SNAPSHOT_INTERVAL', '15'))
+# Snapshots not refreshed for this long belong to processes that are gone
+SNAPSHOT_STALE_AFTER = 5 * 60
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict) -> tuple:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def describe(self) -> Dict:
+        return {'type': self.kind, 'help': self.documentation, 'labelnames': list(self.labelnames)}
+
+class Counter(_Metric):
+    """Monotonically increasing count, optionally split by labels"""
+    kind = 'counter'
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            samples = {json.dumps(key): value for key, value in self._values.items()}
+        return dict(self.describe(), samples=samples)
+
+class Histogram(_Metric):
+    """Distribution of observed values over fixed buckets"""
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'buckets': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+            state['buckets'][index] += 1
+            state['sum'] += value
+            state['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall-clock duration of the with-block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def describe(self) -> Dict:
+        return dict(super().describe(), buckets=list(self.buckets))
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            samples = {
+                json.dumps(key): {'buckets': list(state['buckets']), 'sum': state['sum'], 'count': state['count']}
+                for key, state in self._values.items()
+            }
+        return dict(self.describe(), samples=samples)
+
+class MetricsRegistry:
+    """Collection of metrics rendered together in Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._caches = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_cache(self, name: str, cache) -> None:
+        """Report hit/miss counts of a cache exposing `hits` and `misses`"""
+        with self._lock:
+            self._caches[name] = cache
+
+    def snapshot(self) -> Dict:
+        """Get a JSON-serializable copy of every metric"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            caches = dict(self._caches)
+
+        snapshot = {metric.name: metric.snapshot() for metric in metrics}
+        cache_samples = {}
+        for name, cache in caches.items():
+            cache_samples[json.dumps([name, 'hit'])] = float(cache.hits)
+            cache_samples[json.dumps([name, 'miss'])] = float(cache.misses)
+        snapshot['cache_requests_total'] = {
+            'type': 'counter',
+            'help': 'Cache lookups by result',
+            'labelnames': ['cache', 'result'],
+            'samples': cache_samples
+        }
+        return snapshot
+
+REGISTRY = MetricsRegistry()
+
+HANDLER_LATENCY = REGISTRY.histogram(
+    'bot_handler_duration_seconds', 'Time spent handling a Telegram update', ['handler', 'route'])
+BOT_STAGE_LATENCY = REGISTRY.histogram(
+    'bot_stage_duration_seconds', 'Time spent in a stage of update handling', ['stage'])
+FIRESTORE_OPERATIONS = REGISTRY.counter(
+    'firestore_operations_total', 'Firestore calls by collection and operation', ['collection', 'operation'])
+FIRESTORE_LATENCY = REGISTRY.histogram(
+    'firestore_operation_duration_seconds', 'Firestore call latency', ['collection', 'operation'])
+STRIPE_LATENCY = REGISTRY.histogram(
+    'stripe_request_duration_seconds', 'Stripe API call latency', ['operation'])
+STARTUP_DURATION = REGISTRY.histogram(
+    'process_startup_duration_seconds', 'Time from module import to ready', ['process'],
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+STORE_REQUESTS = REGISTRY.counter(
+    'store_requests_total', 'Store API requests by store and status or failure', ['store', 'result'])
+STORE_LATENCY = REGISTRY.histogram(
+    'store_request_duration_seconds', 'Store API request latency per attempt', ['store'])
+WEBHOOK_EVENTS = REGISTRY.counter(
+    'webhook_events_total', 'Queued webhook events applied by type and result', ['type', 'result'])
+DEAL_CLICKS = REGISTRY.counter(
+    'deal_clicks_total', 'Tracked deal link clicks by store', ['store'])
+SKIPPED_EDITS = REGISTRY.counter(
+    'bot_skipped_edits_total', 'Message edits not sent or not applied because the content was unchanged', ['reason'])
+THROTTLED_UPDATES = REGISTRY.counter(
+    'bot_throttled_updates_total', 'Updates dropped by the per-user rate limit or coalesced away',
+    ['handler', 'reason'])
+NOTIFICATIONS_SENT = REGISTRY.counter(
+    'bot_notifications_sent_total', 'Deal notification messages sent, and the subscriptions they covered',
+    ['mode', 'kind'])
+
+def merge_snapshots(snapshots: Iterable[Dict]) -> Dict:
+    """Sum the samples of several registry snapshots"""
+    merged = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.get(name)
+            if target is None:
+                merged[name] = json.loads(json.dumps(metric))
+                continue
+            for key, value in metric['samples'].items():
+                current = target['samples'].get(key)
+                if current is None:
+                    target['samples'][key] = json.loads(json.dumps(value))
+                elif metric['type'] == 'histogram':
+                    current['buckets'] = [a + b for a, b in zip(current['buckets'], value['buckets'])]
+                    current['sum'] += value['sum']
+                    current['count'] += value['count']
+                else:
+                    target['samples'][key] = current + value
+    return merged
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names: List[str], values: List[str], extra: Optional[Dict] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{value}"' for name, value in (extra or {}).items()]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def render(snapshot: Dict) -> str:
+    """Render a snapshot in the Prometheus text exposition format"""
+    lines = []
+    for name in sorted(snapshot):
+        metric = snapshot[name]
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        labelnames = metric['labelnames']
+        for key in sorted(metric['samples']):
+            values = json.loads(key)
+            sample = metric['samples'][key]
+            if metric['type'] == 'histogram':
+                cumulative = 0
+                for bound, count in zip(metric['buckets'] + ['+Inf'], sample['buckets']):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(labelnames, values, {'le': bound})} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labelnames, values)} {sample['sum']}")
+                lines.append(f"{name}_count{_labels(labelnames, values)} {sample['count']}")
+            else:
+                lines.append(f"{name}{_labels(labelnames, values)} {sample}")
+    return '\n'.join(lines) + '\n'
+
+def _snapshot_path(directory: str) -> str:
+    return os.path.join(directory, f"{os.getpid()}.json")
+
+def write_snapshot(directory: Optional[str] = None) -> None:
+    """Atomically publish this process's metrics to the shared directory"""
+    directory = directory or METRICS_DIR
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    path = _snapshot_path(directory)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(REGISTRY.snapshot(), f)
+    os.replace(tmp_path, path)
+
+def collect(directory: Optional[str] = None) -> str:
+    """Render this process's metrics merged with other processes' snapshots"""
+    directory = directory or METRICS_DIR
+    snapshots = [REGISTRY.snapshot()]
+    if directory:
+        own_path = _snapshot_path(directory)
+        now = time.time()
+        for path in glob.glob(os.path.join(directory, '*.json')):
+            if path == own_path:
+                continue
+            try:
+                if now - os.path.getmtime(path) > SNAPSHOT_STALE_AFTER:
+                    continue
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError) as e:
+                logger.warning("Skipping unreadable metrics snapshot %s: %s", path, e)
+    return render(merge_snapshots(snapshots))
+
+_writer_started = False
+
+def start_snapshot_writer(interval: float = SNAPSHOT_INTERVAL) -> None:
+    """Periodically publish this process's metrics if METRICS_DIR is set"""
+    global _writer_started
+    if not METRICS_DIR or _writer_started:
+        return
+    _writer_started = True
+
+    def run():
+        while True:
+            try:
+                write_snapshot()
+            except Exception as e:
+                logger.error(f"Error writing metrics snapshot: {e}")
+            time.sleep(interval)
+
+    threading.Thread(target=run, name='metrics-snapshot', daemon=True).start()
+    # Publish the final counts so a restart doesn't lose the last interval
+    register_shutdown_hook(write_snapshot, 'metrics-snapshot')
+    logger.info("Publishing metrics snapshots to %s every %ss", METRICS_DIR, interval)
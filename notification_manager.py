@@ -1,52 +1,63 @@
 import logging
 from datetime import datetime, timedelta
-from typing import List, Optional
+from typing import Callable, Dict, List, Optional
 from firebase_admin import firestore
+from firebase_client import get_db
+from watch_rules import RULE_FIELDS, WatchRuleMatcher
+from quota import ALERTS_SENT, QuotaCounter, get_quota_counter
 
 logger = logging.getLogger(__name__)
 
+# Firestore allows at most 500 writes per batch
+MAX_BATCH_WRITES = 500
+
 class NotificationManager:
-    def __init__(self):
+    def __init__(self, quotas: Optional[QuotaCounter] = None):
         self.notification_limits = {
             'basic': {
                 'max_stores': 1,
-                'notifications_per_day': 3
+                'notifications_per_day': 3,
+                'max_watch_rules': 3
             },
             'premium': {
                 'max_stores': float('inf'),  # No limit for premium users
-                'notifications_per_day': 8
+                'notifications_per_day': 8,
+                'max_watch_rules': 25
             }
         }
-        self.db = firestore.client()
+        self.db = get_db()
         self.notifications_ref = self.db.collection('notifications')
+        self.watch_rules_ref = self.db.collection('watch_rules')
+        # Alerts sent per user per day
+        self.quotas = quotas or get_quota_counter()
+        # Built from every user's rules on first use, then kept in step with changes
+        self._watch_matcher: Optional[WatchRuleMatcher] = None
+        # Subscriptions saved before next_due_at existed get it on the first due query
+        self._next_due_backfilled = False
 
     def can_add_notification(self, user_id: str, store: str, is_premium: bool) -> bool:
         """Check if user can add more notifications based on their tier"""
         try:
             # Get user's current store notifications from database
             user_notifications = self.get_user_notifications(user_id)
-            logger.debug(f"Current notifications for user {user_id}: {len(user_notifications)}")
+            logger.debug("Current notifications for user %s: %s", user_id, len(user_notifications))
 
             # Get user's tier limits
             tier_limits = self.notification_limits['premium' if is_premium else 'basic']
-            logger.debug(f"User {user_id} tier limits: {tier_limits}")
+            logger.debug("User %s tier limits: %s", user_id, tier_limits)
 
             # Check store limit
             current_stores = set(notif['store'] for notif in user_notifications)
             if store not in current_stores and len(current_stores) >= tier_limits['max_stores']:
-                logger.info(f"User {user_id} has reached their store limit ({tier_limits['max_stores']})")
+                logger.info("User %s has reached their store limit (%s)", user_id, tier_limits['max_stores'])
                 return False
 
             # Check daily notification limit
-            today = datetime.utcnow().date()
-            notifications_today = len([
-                n for n in user_notifications 
-                if n.get('last_sent') and datetime.fromisoformat(n['last_sent']).date() == today
-            ])
-            logger.debug(f"User {user_id} notifications today: {notifications_today}")
+            notifications_today = self.alerts_sent_today(user_id)
+            logger.debug("User %s notifications today: %s", user_id, notifications_today)
 
             if notifications_today >= tier_limits['notifications_per_day']:
-                logger.info(f"User {user_id} has reached their daily notification limit ({tier_limits['notifications_per_day']})")
+                logger.info("User %s has reached their daily notification limit (%s)", user_id, tier_limits['notifications_per_day'])
                 return False
 
             return True
@@ -64,14 +75,14 @@ class NotificationManager:
 
             if store_notifications:
                 # Remove notification if it exists
-                logger.info(f"Removing notification for user {user_id} and store {store}")
+                logger.info("Removing notification for user %s and store %s", user_id, store)
                 for notif in store_notifications:
                     self.notifications_ref.document(notif['id']).delete()
                 return True
             else:
                 # Check if user can add notification
                 if not self.can_add_notification(user_id, store, is_premium):
-                    logger.info(f"User {user_id} cannot add more notifications")
+                    logger.info("User %s cannot add more notifications", user_id)
                     return False
 
                 # Add notification if it doesn't exist
@@ -85,17 +96,19 @@ class NotificationManager:
         """Add a new notification for the user"""
         try:
             if not self.can_add_notification(user_id, store, is_premium):
-                logger.info(f"Cannot add notification for user {user_id} and store {store}")
+                logger.info("Cannot add notification for user %s and store %s", user_id, store)
                 return False
 
-            # Add notification to database
+            # Add notification to database; it is due right away
+            created_at = datetime.utcnow().isoformat()
             notification = {
                 'user_id': user_id,
                 'store': store,
-                'created_at': datetime.utcnow().isoformat(),
-                'last_sent': None
+                'created_at': created_at,
+                'last_sent': None,
+                'next_due_at': created_at
             }
-            logger.info(f"Adding notification for user {user_id} and store {store}")
+            logger.info("Adding notification for user %s and store %s", user_id, store)
 
             # Save to Firestore
             doc_ref = self.notifications_ref.add(notification)
@@ -109,7 +122,7 @@ class NotificationManager:
     def get_user_notifications(self, user_id: str) -> List[dict]:
         """Get all notifications for a user from Firestore"""
         try:
-            logger.debug(f"Getting notifications for user {user_id}")
+            logger.debug("Getting notifications for user %s", user_id)
             notifications = []
             docs = self.notifications_ref.where('user_id', '==', user_id).stream()
 
@@ -140,14 +153,185 @@ class NotificationManager:
             logger.error(f"Error checking notification timing: {str(e)}")
             return False
 
-    def record_notification_sent(self, notification: dict) -> bool:
-        """Record that a notification was sent"""
+    def next_due_at(self, sent_at: datetime, is_premium: bool) -> str:
+        """Get when a subscription sent at sent_at is due again, as stored in next_due_at"""
+        tier_limits = self.notification_limits['premium' if is_premium else 'basic']
+        return (sent_at + timedelta(hours=24 / tier_limits['notifications_per_day'])).isoformat()
+
+    def alerts_sent_today(self, user_id: str) -> int:
+        """Get the number of alerts sent to a user today"""
+        return self.quotas.get(user_id, ALERTS_SENT)
+
+    def record_notification_sent(self, notification: dict, is_premium: bool = False) -> bool:
+        """Record that a notification was sent, counting it against the user's daily limit"""
         try:
-            notification['last_sent'] = datetime.utcnow().isoformat()
+            sent_at = datetime.utcnow()
+            notification['last_sent'] = sent_at.isoformat()
+            notification['next_due_at'] = self.next_due_at(sent_at, is_premium)
             self.notifications_ref.document(notification['id']).update({
-                'last_sent': notification['last_sent']
+                'last_sent': notification['last_sent'],
+                'next_due_at': notification['next_due_at']
             })
+            self.quotas.add(notification['user_id'], ALERTS_SENT)
             return True
         except Exception as e:
             logger.error(f"Error recording notification: {str(e)}")
-            return False
\ No newline at end of file
+            return False
+
+    def get_due_notifications(self, is_premium: Callable[[str], bool]) -> Dict[str, List[dict]]:
+        """Get the subscriptions due a notification, grouped by user ID
+
+        Only subscriptions whose next_due_at has passed are read, in one
+        query, so a user's due stores can go out together as one digest.
+        Users who already had their daily number of alerts are left out.
+
+        Args:
+            is_premium: Looks up a user's tier, once per user with a due subscription
+        """
+        try:
+            self._backfill_next_due_at()
+            by_user: Dict[str, List[dict]] = {}
+            now = datetime.utcnow().isoformat()
+            for doc in self.notifications_ref.where('next_due_at', '<=', now).stream():
+                notification = doc.to_dict()
+                notification['id'] = doc.id
+                by_user.setdefault(notification['user_id'], []).append(notification)
+
+            due = {}
+            for user_id, notifications in by_user.items():
+                premium = is_premium(user_id)
+                tier_limits = self.notification_limits['premium' if premium else 'basic']
+                if self.alerts_sent_today(user_id) >= tier_limits['notifications_per_day']:
+                    continue
+                ready = [notification for notification in notifications if self.should_notify(notification, premium)]
+                if ready:
+                    due[user_id] = ready
+            return due
+        except Exception as e:
+            logger.error(f"Error getting due notifications: {str(e)}")
+            return {}
+
+    def record_watch_alert_sent(self, user_id: str) -> None:
+        """Count a watch rule alert against the user's daily limit"""
+        self.quotas.add(user_id, ALERTS_SENT)
+
+    def _backfill_next_due_at(self) -> None:
+        """Give subscriptions saved before next_due_at one, once per process"""
+        if self._next_due_backfilled:
+            return
+        batch, writes = self.db.batch(), 0
+        for doc in self.notifications_ref.stream():
+            notification = doc.to_dict()
+            if notification.get('next_due_at'):
+                continue
+            # should_notify still applies the tier's interval to these
+            next_due_at = notification.get('last_sent') or notification.get('created_at') or datetime.utcnow().isoformat()
+            batch.update(self.notifications_ref.document(doc.id), {'next_due_at': next_due_at})
+            writes += 1
+            if writes % MAX_BATCH_WRITES == 0:
+                batch.commit()
+                batch = self.db.batch()
+        if writes % MAX_BATCH_WRITES:
+            batch.commit()
+        if writes:
+            logger.info("Set next_due_at on %s older subscription(s)", writes)
+        self._next_due_backfilled = True
+
+    def record_digest_sent(self, user_id: str, notifications: List[dict], is_premium: bool = False) -> bool:
+        """Record that one message covered several of a user's subscriptions
+
+        The subscriptions' last_sent and next_due_at times are written in one
+        batch, and the message counts once against the user's daily limit.
+        """
+        try:
+            now = datetime.utcnow()
+            sent_at, next_due_at = now.isoformat(), self.next_due_at(now, is_premium)
+            for start in range(0, len(notifications), MAX_BATCH_WRITES):
+                batch = self.db.batch()
+                for notification in notifications[start:start + MAX_BATCH_WRITES]:
+                    notification['last_sent'] = sent_at
+                    notification['next_due_at'] = next_due_at
+                    batch.update(self.notifications_ref.document(notification['id']),
+                                 {'last_sent': sent_at, 'next_due_at': next_due_at})
+                batch.commit()
+            self.quotas.add(user_id, ALERTS_SENT)
+            return True
+        except Exception as e:
+            logger.error(f"Error recording digest for user {user_id}: {str(e)}")
+            return False
+
+    def get_user_watch_rules(self, user_id: str) -> List[dict]:
+        """Get a user's keyword/price watch rules, oldest first"""
+        try:
+            rules = []
+            for doc in self.watch_rules_ref.where('user_id', '==', user_id).stream():
+                rule = doc.to_dict()
+                rule['id'] = doc.id
+                rules.append(rule)
+            return sorted(rules, key=lambda rule: rule.get('created_at') or '')
+        except Exception as e:
+            logger.error(f"Error getting watch rules for user {user_id}: {str(e)}")
+            return []
+
+    def add_watch_rule(self, user_id: str, rule: dict, is_premium: bool) -> Optional[dict]:
+        """Save a watch rule (see watch_rules.parse_watch_rule) if the user's tier allows another
+
+        Returns:
+            The saved rule with its ID, or None if the limit is reached or saving failed
+        """
+        try:
+            tier_limits = self.notification_limits['premium' if is_premium else 'basic']
+            if len(self.get_user_watch_rules(user_id)) >= tier_limits['max_watch_rules']:
+                logger.info("User %s has reached their watch rule limit (%s)", user_id, tier_limits['max_watch_rules'])
+                return None
+
+            saved = {field: rule[field] for field in RULE_FIELDS if rule.get(field) is not None}
+            saved.update({'user_id': user_id, 'created_at': datetime.utcnow().isoformat()})
+            doc_ref = self.watch_rules_ref.add(saved)
+            saved['id'] = doc_ref[1].id
+            logger.info("Added watch rule %s for user %s", saved['id'], user_id)
+            if self._watch_matcher is not None:
+                self._watch_matcher.add_rule(saved)
+            return saved
+        except Exception as e:
+            logger.error(f"Error adding watch rule for user {user_id}: {str(e)}")
+            return None
+
+    def remove_watch_rule(self, user_id: str, rule_id: str) -> bool:
+        """Delete one of the user's watch rules"""
+        try:
+            doc_ref = self.watch_rules_ref.document(rule_id)
+            doc = doc_ref.get()
+            if not doc.exists or doc.to_dict().get('user_id') != user_id:
+                return False
+            doc_ref.delete()
+            if self._watch_matcher is not None:
+                self._watch_matcher.remove_rule(rule_id)
+            return True
+        except Exception as e:
+            logger.error(f"Error removing watch rule {rule_id} for user {user_id}: {str(e)}")
+            return False
+
+    def get_watch_matcher(self) -> WatchRuleMatcher:
+        """Get the matcher compiled from every user's watch rules, loading them once"""
+        if self._watch_matcher is None:
+            rules = []
+            try:
+                for doc in self.watch_rules_ref.stream():
+                    rule = doc.to_dict()
+                    rule['id'] = doc.id
+                    rules.append(rule)
+            except Exception as e:
+                logger.error(f"Error loading watch rules: {str(e)}")
+                return WatchRuleMatcher()
+            self._watch_matcher = WatchRuleMatcher(rules)
+            logger.info("Compiled %s watch rules", len(rules))
+        return self._watch_matcher
+
+    def match_watch_rules(self, deals: List[dict], store_id: Optional[str] = None) -> Dict[str, List[dict]]:
+        """Get the deals matching each user's watch rules, by user ID"""
+        try:
+            return self.get_watch_matcher().match_deals(deals, store_id)
+        except Exception as e:
+            logger.error(f"Error matching watch rules: {str(e)}")
+            return {}
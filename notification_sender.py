@@ -0,0 +1,221 @@
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+from telegram import Bot
+from telegram.error import Forbidden, RetryAfter, TelegramError
+from metrics import NOTIFICATIONS_SENT, REGISTRY
+from translations.lang import TRANSLATIONS
+from ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# One message per user per cycle covering all their due stores; 0 sends one message per store
+DIGEST_MODE = os.getenv('DIGEST_MODE', '1') == '1'
+
+# Seconds between checks for due subscriptions; 0 turns sending off
+NOTIFICATION_INTERVAL = float(os.getenv('NOTIFICATION_INTERVAL', '900'))
+
+# Deals listed per store in a digest
+DIGEST_DEALS_PER_STORE = int(os.getenv('DIGEST_DEALS_PER_STORE', '3'))
+
+# Deals listed in one watch rule alert, the biggest discounts first
+WATCH_DEALS_PER_ALERT = int(os.getenv('WATCH_DEALS_PER_ALERT', '5'))
+
+# Telegram rejects longer messages
+MAX_MESSAGE_LENGTH = 4096
+
+# Seconds a user's tier is reused between cycles; it only paces notifications,
+# so an upgrade takes effect within this long
+TIER_CACHE_TTL = float(os.getenv('NOTIFICATION_TIER_CACHE_TTL', '3600'))
+
+class NotificationSender:
+    """Sends the deals of due store subscriptions and watch rule alerts, once per cycle
+
+    In digest mode every user with due subscriptions gets one message
+    listing the top deals of each due store, so a user subscribed to four
+    stores gets one message per slot instead of four. Otherwise each
+    subscription gets its own message, as a store's deal page.
+
+    Deals that appeared or got cheaper since the previous cycle are then
+    matched against every /watch rule, and each user with matches gets
+    one alert. Both kinds of message count against the daily limit.
+    """
+
+    def __init__(self, bot: Bot, notification_manager, user_manager, deal_fetcher, digest: bool = DIGEST_MODE):
+        self.bot = bot
+        self.notification_manager = notification_manager
+        self.user_manager = user_manager
+        self.deal_fetcher = deal_fetcher
+        self.digest = digest
+        self._tiers = TTLCache(maxsize=100_000, ttl=TIER_CACHE_TTL)
+        REGISTRY.register_cache('notification_tiers', self._tiers)
+        # Store ID -> deal ID -> price at the previous cycle, to find the deals worth a watch alert
+        self._watched_prices: Dict[str, Dict[Any, float]] = {}
+
+    def is_premium(self, user_id: str) -> bool:
+        premium = self._tiers.get(user_id)
+        if premium is None:
+            premium = self.user_manager.is_user_premium(user_id)
+            self._tiers.set(user_id, premium)
+        return premium
+
+    async def run_cycle(self, stop: Optional[asyncio.Event] = None) -> int:
+        """Send everything due now
+
+        Args:
+            stop: Once set, the cycle ends after the current user's messages
+                and their records, leaving the other users for the next run
+
+        Returns:
+            int: Number of messages sent
+        """
+        # Firestore calls block, so they run off the event loop
+        due = await asyncio.to_thread(self.notification_manager.get_due_notifications, self.is_premium)
+        # Every user of a tier sees the same deals from a store
+        store_deals: Dict[Tuple[str, bool], List[Dict]] = {}
+        sent = 0
+        for done, (user_id, notifications) in enumerate(due.items()):
+            if stop is not None and stop.is_set():
+                logger.info("Stopping notifications, %s user(s) left for the next run", len(due) - done)
+                break
+            premium = self.is_premium(user_id)
+            stores = []
+            for notification in sorted(notifications, key=lambda notification: notification['store']):
+                key = (notification['store'], premium)
+                if key not in store_deals:
+                    store_deals[key] = self.deal_fetcher.get_store_deals(notification['store'], 1, premium)[0]
+                if store_deals[key]:
+                    stores.append((notification, store_deals[key]))
+            if not stores:
+                continue
+            lang = await asyncio.to_thread(self.user_manager.get_user_language, user_id)
+            if self.digest:
+                sent += await self._send_digest(user_id, stores, lang, premium)
+            else:
+                sent += await self._send_per_store(user_id, stores, lang, premium)
+        if due:
+            logger.info("Sent %s notification message(s) to %s user(s)", sent, len(due))
+        if stop is None or not stop.is_set():
+            sent += await self._send_watch_alerts(stop)
+        return sent
+
+    def find_watch_alerts(self) -> Dict[str, List[Dict]]:
+        """Match the deals that are new, or cheaper, since the previous call against every watch rule
+
+        A store's first non-empty catalog is only recorded, so the deals
+        already listed at startup don't alert everyone at once.
+
+        Returns:
+            User ID -> formatted deals matching any of their rules
+        """
+        alerts: Dict[str, List[Dict]] = {}
+        for store_id in self.deal_fetcher.get_available_stores():
+            store = self.deal_fetcher.get_store(store_id)
+            previous = self._watched_prices.get(store_id)
+            current, fresh = {}, []
+            for deal in store.get_raw_deals():
+                price = current[deal.get('id')] = float(deal['price'])
+                if previous and price < previous.get(deal.get('id'), float('inf')):
+                    fresh.append(deal)
+            self._watched_prices[store_id] = current
+            if not fresh:
+                continue
+            for user_id, deals in self.notification_manager.match_watch_rules(fresh, store_id).items():
+                alerts.setdefault(user_id, []).extend(store.format_deal(deal) for deal in deals)
+        return alerts
+
+    async def _send_watch_alerts(self, stop: Optional[asyncio.Event]) -> int:
+        alerts = await asyncio.to_thread(self.find_watch_alerts)
+        sent = 0
+        for done, (user_id, deals) in enumerate(alerts.items()):
+            if stop is not None and stop.is_set():
+                logger.info("Stopping watch alerts, %s user(s) skipped", len(alerts) - done)
+                break
+            premium = await asyncio.to_thread(self.is_premium, user_id)
+            tier_limits = self.notification_manager.notification_limits['premium' if premium else 'basic']
+            if await asyncio.to_thread(self.notification_manager.alerts_sent_today, user_id) \
+                    >= tier_limits['notifications_per_day']:
+                continue
+            lang = await asyncio.to_thread(self.user_manager.get_user_language, user_id)
+            deals = sorted(deals, key=lambda deal: deal['discount_percentage'], reverse=True)[:WATCH_DEALS_PER_ALERT]
+            message = TRANSLATIONS[lang]['watch_alert_header']
+            for i, deal in enumerate(deals, 1):
+                message += f"\n\n{i}. {self.deal_fetcher.format_deal_text(deal, lang, user_id)}"
+            message += "\n\n" + TRANSLATIONS[lang]['watch_alert_footer']
+            if not await self._send(user_id, message[:MAX_MESSAGE_LENGTH]):
+                continue
+            await asyncio.to_thread(self.notification_manager.record_watch_alert_sent, user_id)
+            NOTIFICATIONS_SENT.inc(mode='watch', kind='message')
+            NOTIFICATIONS_SENT.inc(len(deals), mode='watch', kind='deal')
+            sent += 1
+        if alerts:
+            logger.info("Sent %s watch alert(s) to %s user(s) with matches", sent, len(alerts))
+        return sent
+
+    def render_digest(self, user_id: str, stores: List[Tuple[dict, List[Dict]]], lang: str) -> Tuple[str, List[dict]]:
+        """Render several stores' deals as one message
+
+        Returns:
+            Tuple of (message text, subscriptions covered); stores that would
+            push the message over Telegram's limit are left for the next cycle
+        """
+        message = TRANSLATIONS[lang]['digest_header']
+        footer = "\n\n" + TRANSLATIONS[lang]['notification_info']
+        covered = []
+        for notification, deals in stores:
+            store_name = self.deal_fetcher.get_store_name(notification['store'])
+            section = "\n\n" + TRANSLATIONS[lang]['store_deals_header'].format(store_name)
+            for i, deal in enumerate(deals[:DIGEST_DEALS_PER_STORE], 1):
+                section += f"\n\n{i}. {self.deal_fetcher.format_deal_text(deal, lang, user_id)}"
+            if covered and len(message) + len(section) + len(footer) > MAX_MESSAGE_LENGTH:
+                break
+            message += section
+            covered.append(notification)
+        return message + footer, covered
+
+    async def _send_digest(self, user_id: str, stores: List[Tuple[dict, List[Dict]]], lang: str,
+                           premium: bool) -> int:
+        message, covered = self.render_digest(user_id, stores, lang)
+        if not await self._send(user_id, message):
+            return 0
+        await asyncio.to_thread(self.notification_manager.record_digest_sent, user_id, covered, premium)
+        NOTIFICATIONS_SENT.inc(mode='digest', kind='message')
+        NOTIFICATIONS_SENT.inc(len(covered), mode='digest', kind='subscription')
+        return 1
+
+    async def _send_per_store(self, user_id: str, stores: List[Tuple[dict, List[Dict]]], lang: str,
+                              premium: bool) -> int:
+        tier_limits = self.notification_manager.notification_limits['premium' if premium else 'basic']
+        allowed = tier_limits['notifications_per_day'] - self.notification_manager.alerts_sent_today(user_id)
+        sent = 0
+        for notification, deals in stores[:max(0, allowed)]:
+            store_name = self.deal_fetcher.get_store_name(notification['store'])
+            message = (TRANSLATIONS[lang]['store_deals_header'].format(store_name) + "\n\n"
+                       + self.deal_fetcher.format_deals_message(deals, lang, user_id))
+            if not await self._send(user_id, message):
+                break
+            await asyncio.to_thread(self.notification_manager.record_notification_sent, notification, premium)
+            NOTIFICATIONS_SENT.inc(mode='store', kind='message')
+            NOTIFICATIONS_SENT.inc(mode='store', kind='subscription')
+            sent += 1
+        return sent
+
+    async def _send(self, user_id: str, text: str) -> bool:
+        for attempt in range(2):
+            try:
+                await self.bot.send_message(chat_id=int(user_id), text=text, disable_web_page_preview=True)
+                return True
+            except RetryAfter as e:
+                if attempt:
+                    break
+                delay = e.retry_after
+                await asyncio.sleep(delay.total_seconds() if hasattr(delay, 'total_seconds') else delay)
+            except Forbidden:
+                logger.info("User %s has blocked the bot, skipping their notifications", user_id)
+                return False
+            except TelegramError as e:
+                logger.error(f"Error sending notification to user {user_id}: {e}")
+                return False
+        logger.error(f"Telegram kept rate limiting notifications to user {user_id}")
+        return False
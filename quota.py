@@ -0,0 +1,178 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+from firebase_admin import firestore
+from firebase_client import get_db
+from lifecycle import register_shutdown_hook
+from metrics import REGISTRY
+from ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Seconds between writes of buffered quota usage to Firestore
+QUOTA_FLUSH_INTERVAL = float(os.getenv('QUOTA_FLUSH_INTERVAL', '30'))
+
+# Firestore allows at most 500 writes per batch
+MAX_BATCH_WRITES = 500
+
+# Counted kinds of usage
+DEALS_VIEWED = 'deals_viewed'
+ALERTS_SENT = 'alerts_sent'
+
+def today() -> str:
+    """The current quota day, in UTC like notification timestamps"""
+    return datetime.utcnow().strftime('%Y-%m-%d')
+
+class QuotaCounter:
+    """Per-user, per-day usage counters checked in O(1)
+
+    Each user's counts for a day live in one `daily_quotas` document,
+    keyed `<user_id>_<day>`, read once and then kept in memory. Usage is
+    counted in memory under a lock, so check-and-consume is atomic within
+    the process, and the increments are written as Firestore `Increment`s
+    in batches every flush_interval seconds and at shutdown. Counters
+    start from zero each UTC day because the day is part of the key.
+    """
+
+    def __init__(self, db=None, flush_interval: float = QUOTA_FLUSH_INTERVAL):
+        self.db = db or get_db()
+        self.quotas_ref = self.db.collection('daily_quotas')
+        self.flush_interval = flush_interval
+        # (user ID, day) -> kind -> count last read from or written to Firestore
+        self._stored = TTLCache(maxsize=50000, ttl=2 * 24 * 60 * 60)
+        REGISTRY.register_cache('daily_quotas', self._stored)
+        # (user ID, day) -> kind -> count not yet written, and count being written
+        self._pending: Dict[Tuple[str, str], Dict[str, int]] = {}
+        self._inflight: Dict[Tuple[str, str], Dict[str, int]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flusher_started = False
+
+    @staticmethod
+    def _doc_id(key: Tuple[str, str]) -> str:
+        return f"{key[0]}_{key[1]}"
+
+    def _load(self, key: Tuple[str, str]) -> Dict[str, int]:
+        stored = self._stored.get(key)
+        if stored is not None:
+            return stored
+        try:
+            doc = self.quotas_ref.document(self._doc_id(key)).get()
+            data = doc.to_dict() if doc.exists else {}
+            loaded = {kind: count for kind, count in data.items() if isinstance(count, int)}
+        except Exception as e:
+            logger.error(f"Error loading quota usage for user {key[0]}: {str(e)}")
+            loaded = {}
+        with self._lock:
+            # Another request may have loaded it meanwhile; keep the first copy
+            stored = self._stored.get(key)
+            if stored is None:
+                stored = loaded
+                self._stored.set(key, stored)
+        return stored
+
+    def _count(self, key: Tuple[str, str], stored: Dict[str, int], kind: str) -> int:
+        return (stored.get(kind, 0) + self._pending.get(key, {}).get(kind, 0)
+                + self._inflight.get(key, {}).get(kind, 0))
+
+    def get(self, user_id, kind: str) -> int:
+        """Get a user's usage of a kind today"""
+        key = (str(user_id), today())
+        stored = self._load(key)
+        with self._lock:
+            return self._count(key, stored, kind)
+
+    def add(self, user_id, kind: str, amount: int = 1) -> None:
+        """Count usage without a limit"""
+        self.consume(user_id, kind, None, amount)
+
+    def consume(self, user_id, kind: str, limit: Optional[int], amount: int = 1) -> int:
+        """Take up to amount from what is left of a user's daily limit
+
+        Returns:
+            int: The amount granted, between 0 and amount; all of it without a limit
+        """
+        key = (str(user_id), today())
+        stored = self._load(key)
+        with self._lock:
+            used = self._count(key, stored, kind)
+            granted = amount if limit is None else max(0, min(amount, limit - used))
+            if granted:
+                pending = self._pending.setdefault(key, {})
+                pending[kind] = pending.get(kind, 0) + granted
+                if not self._flusher_started:
+                    self._start_flusher()
+        return granted
+
+    def remaining(self, user_id, kind: str, limit: int) -> int:
+        """Get how much of a user's daily limit is left"""
+        return max(0, limit - self.get(user_id, kind))
+
+    def _start_flusher(self) -> None:
+        self._flusher_started = True
+
+        def run():
+            while True:
+                time.sleep(self.flush_interval)
+                self.flush()
+
+        threading.Thread(target=run, name='quota-flush', daemon=True).start()
+        register_shutdown_hook(self.flush, 'quota-flush')
+
+    def flush(self) -> int:
+        """Write buffered usage as increments, one batch per 500 user-days
+
+        Returns:
+            int: Number of user-days written
+        """
+        with self._flush_lock:
+            with self._lock:
+                # Usage being written still counts until it is part of the stored counts
+                self._inflight, self._pending = self._pending, {}
+                entries = list(self._inflight.items())
+            if not entries:
+                return 0
+
+            written = 0
+            try:
+                for start in range(0, len(entries), MAX_BATCH_WRITES):
+                    chunk = entries[start:start + MAX_BATCH_WRITES]
+                    batch = self.db.batch()
+                    for (user_id, day), counts in chunk:
+                        data = {kind: firestore.Increment(count) for kind, count in counts.items()}
+                        data.update({'user_id': user_id, 'day': day})
+                        batch.set(self.quotas_ref.document(self._doc_id((user_id, day))), data, merge=True)
+                    batch.commit()
+                    written += len(chunk)
+                    with self._lock:
+                        for key, counts in chunk:
+                            del self._inflight[key]
+                            stored = self._stored.get(key)
+                            if stored is not None:
+                                for kind, count in counts.items():
+                                    stored[kind] = stored.get(kind, 0) + count
+            except Exception as e:
+                logger.error(f"Error saving quota usage: {str(e)}")
+                # Keep the unwritten usage for the next flush
+                with self._lock:
+                    for key, counts in self._inflight.items():
+                        current = self._pending.setdefault(key, {})
+                        for kind, count in counts.items():
+                            current[kind] = current.get(kind, 0) + count
+                    self._inflight = {}
+            return written
+
+_default_counter: Optional[QuotaCounter] = None
+_default_lock = threading.Lock()
+
+def get_quota_counter() -> QuotaCounter:
+    """Get the shared counter, so deal views and alerts count against one set of quotas"""
+    global _default_counter
+    if _default_counter is None:
+        with _default_lock:
+            if _default_counter is None:
+                _default_counter = QuotaCounter()
+    return _default_counter
@@ -1,19 +1,124 @@
+import logging
+import time
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Filter name -> predicate(raw_deal, filter_value) shared by every store
+COMMON_FILTERS: Dict[str, Callable[[Dict, Any], bool]] = {
+    'min_discount': lambda deal, value: deal['discount_percentage'] >= value,
+    'max_price': lambda deal, value: deal['price'] <= value,
+    'category': lambda deal, value: deal['category'] == value,
+    'brand': lambda deal, value: deal['brand'] == value,
+    'in_stock': lambda deal, value: deal['stock_status'] == 'In Stock',
+}
+
+FREE_SHIPPING_FILTER = {
+    'free_shipping': lambda deal, value: deal['shipping'] == 'Free Shipping',
+}
+
+COMMON_METADATA_FIELDS = ('stock_status', 'rating', 'reviews_count', 'category', 'brand')
 
 class BaseStore(ABC):
-    @abstractmethod
-    def fetch_deals(self, page: int = 1, limit: int = 5) -> List[Dict[str, Any]]:
-        pass
+    """Marketplace integration loaded through stores.registry
+
+    Subclasses provide the raw catalog and a display name; filtering,
+    pagination, counting and formatting are shared.
+    """
+    display_name = ''
+    filters: Dict[str, Callable[[Dict, Any], bool]] = COMMON_FILTERS
+    metadata_fields = COMMON_METADATA_FIELDS
+
+    def __init__(self):
+        # Called after each refresh, e.g. to re-index the catalog for search
+        self._catalog_listeners: List[Callable[['BaseStore'], None]] = []
 
     @abstractmethod
+    def get_raw_deals(self) -> List[Dict[str, Any]]:
+        """Get the store's current catalog of raw deals"""
+
     def get_store_name(self) -> str:
-        pass
-
-    def format_deal(self, deal: Dict[str, Any]) -> str:
-        return f"""
-🏷 {deal['title']}
-💰 Price: {deal['price']}
-🔗 Link: {deal['url']}
-📍 Store: {self.get_store_name()}
-"""
+        """Get display name for the store"""
+        return self.display_name
+
+    def add_catalog_listener(self, callback: Callable[['BaseStore'], None]) -> None:
+        """Call callback(store) whenever a refresh replaces the catalog"""
+        self._catalog_listeners.append(callback)
+
+    def _catalog_changed(self) -> None:
+        for callback in self._catalog_listeners:
+            try:
+                callback(self)
+            except Exception as e:
+                logger.error(f"Error in catalog listener of {self.get_store_name()}: {str(e)}")
+
+    def capabilities(self) -> Dict[str, Any]:
+        """Describe what the store supports, e.g. for building filter menus"""
+        return {'filters': sorted(self.filters)}
+
+    def _apply_filters(self, deals: List[Dict], filters: Optional[Dict]) -> List[Dict]:
+        """Apply the supported filters to raw deals; unknown filters are ignored"""
+        if not filters:
+            return deals
+        predicates = [(self.filters[key], value) for key, value in filters.items() if key in self.filters]
+        if not predicates:
+            return deals
+        return [deal for deal in deals if all(predicate(deal, value) for predicate, value in predicates)]
+
+    def fetch_deals(self, page: int = 1, limit: int = 5, filters: Optional[Dict] = None) -> List[Dict[str, Any]]:
+        """
+        Fetch formatted deals with pagination and filtering
+        Args:
+            page: Page number (1-based)
+            limit: Number of items per page
+            filters: Optional dictionary of filters, see capabilities()
+        """
+        try:
+            deals = self._apply_filters(self.get_raw_deals(), filters)
+            start_idx = (page - 1) * limit
+            return [self.format_deal(deal) for deal in deals[start_idx:start_idx + limit]]
+        except Exception as e:
+            logger.error(f"Error fetching deals from {self.get_store_name()}: {str(e)}")
+            return []
+
+    async def fetch_deals_async(self, page: int = 1, limit: int = 5,
+                                filters: Optional[Dict] = None) -> List[Dict[str, Any]]:
+        """Async variant of fetch_deals; stores backed by a remote API override this"""
+        return self.fetch_deals(page=page, limit=limit, filters=filters)
+
+    def get_total_deals(self, filters: Optional[Dict] = None) -> int:
+        """Get total number of deals (for pagination)"""
+        return len(self._apply_filters(self.get_raw_deals(), filters))
+
+    def format_deal(self, raw_deal: Dict) -> Dict:
+        """Format the raw deal data into standard format"""
+        metadata = {field: raw_deal.get(field) for field in self.metadata_fields}
+        metadata['last_updated'] = raw_deal.get('last_updated')
+        return {
+            'id': raw_deal['id'],
+            'title': raw_deal['title'],
+            'price': float(raw_deal['price']),
+            'original_price': float(raw_deal['original_price']),
+            'url': raw_deal['url'],
+            'store': self.get_store_name(),
+            'discount_percentage': float(raw_deal['discount_percentage']),
+            'image_url': raw_deal.get('image_url'),
+            'metadata': metadata
+        }
+
+    def health(self) -> Dict[str, Any]:
+        """Check that the catalog can be read"""
+        started = time.perf_counter()
+        try:
+            deals = len(self.get_raw_deals())
+            healthy, error = deals > 0, None
+        except Exception as e:
+            deals, healthy, error = 0, False, str(e)
+        return {
+            'store': self.get_store_name(),
+            'healthy': healthy,
+            'deals': deals,
+            'latency_ms': round((time.perf_counter() - started) * 1000, 3),
+            'error': error
+        }
@@ -0,0 +1,106 @@
+import json
+import logging
+import os
+from typing import List, Dict, Any, Optional, Tuple
+
+import httpx
+
+from stores import BaseStore
+from stores.feed_cache import FeedCache
+from stores.http_client import CircuitOpenError, StoreApiClient, UpstreamError
+
+logger = logging.getLogger(__name__)
+
+class ApiStore(BaseStore):
+    """Store backed by a remote deals API
+
+    Subclasses set store_id and api_url; <STORE_ID>_API_URL overrides the URL
+    per deployment. refresh() downloads the catalog so the synchronous
+    fetch_deals path keeps serving from memory, while fetch_deals_async asks
+    the API directly and falls back to the last catalog if it is unavailable.
+    """
+    store_id = ''
+    api_url = ''
+    deals_path = 'deals'
+
+    def __init__(self, api_client: Optional[StoreApiClient] = None, feed_cache: Optional[FeedCache] = None):
+        super().__init__()
+        self.api_client = api_client or StoreApiClient(
+            self.store_id, os.getenv(f"{self.store_id.upper()}_API_URL", self.api_url))
+        self.feed_cache = feed_cache or FeedCache()
+        self.catalog: List[Dict[str, Any]] = []
+        # Normalized deals per feed page, and per deal ID with its last_updated
+        self._pages: Dict[int, List[Dict[str, Any]]] = {}
+        self._normalized: Dict[str, Tuple[Any, Dict[str, Any]]] = {}
+
+    def get_raw_deals(self) -> List[Dict[str, Any]]:
+        return self.catalog
+
+    def normalize_deal(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """Map an API record to the raw deal shape BaseStore works with"""
+        deal = dict(record)
+        for field in ('price', 'original_price', 'discount_percentage'):
+            deal[field] = float(deal[field])
+        return deal
+
+    def _normalize_page(self, records: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
+        """Normalize a changed page, reusing deals whose last_updated didn't change"""
+        deals, normalized = [], 0
+        for record in records:
+            previous = self._normalized.get(record.get('id'))
+            if previous and record.get('last_updated') is not None and previous[0] == record.get('last_updated'):
+                deals.append(previous[1])
+                continue
+            deal = self.normalize_deal(record)
+            self._normalized[record.get('id')] = (record.get('last_updated'), deal)
+            deals.append(deal)
+            normalized += 1
+        return deals, normalized
+
+    async def fetch_deals_async(self, page: int = 1, limit: int = 5,
+                                filters: Optional[Dict] = None) -> List[Dict[str, Any]]:
+        try:
+            data = await self.api_client.get_deals(page=page, limit=limit, filters=filters, path=self.deals_path)
+            return [self.format_deal(self.normalize_deal(deal)) for deal in data.get('deals', [])]
+        except (CircuitOpenError, UpstreamError, httpx.HTTPError, ValueError) as e:
+            logger.error(f"Error fetching deals from {self.get_store_name()} API, serving cached catalog: {str(e)}")
+            return self.fetch_deals(page=page, limit=limit, filters=filters)
+
+    async def refresh(self, page_size: int = 100, max_pages: int = 100) -> int:
+        """Download the catalog page by page; keeps the old one on failure
+
+        Pages are requested conditionally, so unchanged pages cost a 304 and
+        are neither parsed nor normalized again.
+
+        Returns:
+            int: Number of deals in the catalog
+        """
+        pages, catalog = {}, []
+        unchanged = normalized = 0
+        try:
+            for page in range(1, max_pages + 1):
+                body, changed = await self.api_client.get_conditional(
+                    self.deals_path, {'page': page, 'limit': page_size}, self.feed_cache)
+                deals = None if changed else self._pages.get(page)
+                if deals is None:
+                    deals, page_normalized = self._normalize_page(json.loads(body).get('deals', []))
+                    normalized += page_normalized
+                else:
+                    unchanged += 1
+                pages[page] = deals
+                catalog.extend(deals)
+                if len(deals) < page_size:
+                    break
+        except (CircuitOpenError, UpstreamError, httpx.HTTPError, ValueError) as e:
+            logger.error(f"Error refreshing {self.get_store_name()} catalog: {str(e)}")
+            return len(self.catalog)
+
+        self._pages = pages
+        self.catalog = catalog
+        # Forget deals that dropped out of the feed
+        live_ids = {deal.get('id') for deal in catalog}
+        self._normalized = {deal_id: entry for deal_id, entry in self._normalized.items() if deal_id in live_ids}
+        self._catalog_changed()
+        logger.info("Refreshed %s catalog: %s deals, %s/%s pages unchanged, %s deals normalized",
+                    self.get_store_name(), len(catalog), unchanged, len(pages), normalized)
+        return len(catalog)
@@ -0,0 +1,100 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS feed_responses (
+    cache_key TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    content_hash TEXT NOT NULL,
+    body BLOB NOT NULL,
+    fetched_at REAL NOT NULL,
+    checked_at REAL NOT NULL
+);
+"""
+
+class FeedCache:
+    """Disk-backed cache of store feed responses and their HTTP validators
+
+    Each feed URL (including its page and filter parameters) keeps the last
+    body with its ETag and Last-Modified, so the next refresh can ask the
+    store whether anything changed and survive a restart without refetching.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.environ.get("STORE_FEED_CACHE_PATH", "store_feeds.db")
+        self._local = threading.local()
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get the SQLite connection for the current thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Losing the newest entries on a crash only costs a refetch
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, cache_key: str) -> Optional[Dict]:
+        """Get the cached response for a feed URL"""
+        row = self._connect().execute(
+            "SELECT etag, last_modified, content_hash, body, fetched_at, checked_at "
+            "FROM feed_responses WHERE cache_key = ?",
+            (cache_key,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def conditional_headers(self, cached: Optional[Dict]) -> Dict[str, str]:
+        """Build If-None-Match / If-Modified-Since headers from a cached response"""
+        headers = {}
+        if cached and cached['etag']:
+            headers['If-None-Match'] = cached['etag']
+        if cached and cached['last_modified']:
+            headers['If-Modified-Since'] = cached['last_modified']
+        return headers
+
+    def put(self, cache_key: str, body: bytes, etag: Optional[str] = None,
+            last_modified: Optional[str] = None) -> bool:
+        """Store a fresh response body
+
+        Returns:
+            bool: True if the body differs from the cached one
+        """
+        content_hash = hashlib.sha256(body).hexdigest()
+        now = time.time()
+        conn = self._connect()
+        row = conn.execute("SELECT content_hash FROM feed_responses WHERE cache_key = ?", (cache_key,)).fetchone()
+        if row and row['content_hash'] == content_hash:
+            conn.execute(
+                "UPDATE feed_responses SET etag = ?, last_modified = ?, checked_at = ? WHERE cache_key = ?",
+                (etag, last_modified, now, cache_key)
+            )
+            return False
+        conn.execute(
+            "INSERT OR REPLACE INTO feed_responses "
+            "(cache_key, etag, last_modified, content_hash, body, fetched_at, checked_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (cache_key, etag, last_modified, content_hash, body, now, now)
+        )
+        return True
+
+    def touch(self, cache_key: str) -> None:
+        """Record that the cached response was revalidated (304 Not Modified)"""
+        self._connect().execute(
+            "UPDATE feed_responses SET checked_at = ? WHERE cache_key = ?", (time.time(), cache_key))
+
+    def purge(self, older_than_seconds: float) -> int:
+        """Delete responses not revalidated for older_than_seconds"""
+        cursor = self._connect().execute(
+            "DELETE FROM feed_responses WHERE checked_at < ?", (time.time() - older_than_seconds,))
+        return cursor.rowcount
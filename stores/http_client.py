@@ -0,0 +1,249 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+import httpx
+
+from metrics import STORE_LATENCY, STORE_REQUESTS
+from stores.feed_cache import FeedCache
+
+logger = logging.getLogger(__name__)
+
+# Statuses worth retrying: rate limiting and transient upstream failures
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit breaker is open"""
+
+class UpstreamError(Exception):
+    """Raised when an upstream request fails after all retries"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+class CircuitBreaker:
+    """Stops calling a failing upstream for reset_timeout seconds
+
+    After failure_threshold consecutive failures the breaker opens and calls
+    fail fast. Once reset_timeout has passed a single trial call is let
+    through (half-open); its success closes the breaker, its failure reopens it.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow(self) -> bool:
+        """Check whether a call may go through, reserving the half-open trial"""
+        state = self.state
+        if state == 'closed':
+            return True
+        if state == 'half_open' and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning("Circuit opened after %s consecutive failures", self.failures)
+            self.opened_at = time.monotonic()
+
+class HttpClientPool:
+    """One keep-alive httpx.AsyncClient (connection pool) per upstream host
+
+    Args:
+        max_connections: Connection limit per host
+        max_keepalive_connections: Idle connections kept open per host
+        keepalive_expiry: Seconds an idle connection is kept
+        timeout: Default request timeout in seconds
+        transport: Optional httpx transport, e.g. httpx.MockTransport in tests
+    """
+
+    def __init__(self, max_connections: int = 20, max_keepalive_connections: int = 10,
+                 keepalive_expiry: float = 30.0, timeout: float = 10.0,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_keepalive_connections,
+                                   keepalive_expiry=keepalive_expiry)
+        self.timeout = httpx.Timeout(timeout)
+        self.transport = transport
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+    def get(self, base_url: str) -> httpx.AsyncClient:
+        """Get the client for base_url's host, creating it on first use"""
+        parts = urlsplit(base_url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        client = self._clients.get(origin)
+        if client is None or client.is_closed:
+            client = self._clients[origin] = httpx.AsyncClient(
+                base_url=origin, limits=self.limits, timeout=self.timeout, transport=self.transport,
+                headers={'User-Agent': 'DealsHunterBot/1.0'})
+        return client
+
+    async def aclose(self) -> None:
+        """Close every pooled connection"""
+        clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            await client.aclose()
+
+_default_pool: Optional[HttpClientPool] = None
+
+def get_default_pool() -> HttpClientPool:
+    """Get the process-wide pool shared by all store clients"""
+    global _default_pool
+    if _default_pool is None:
+        _default_pool = HttpClientPool(
+            max_connections=int(os.getenv('STORE_HTTP_MAX_CONNECTIONS', '20')),
+            timeout=float(os.getenv('STORE_HTTP_TIMEOUT', '10')))
+    return _default_pool
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    """Seconds requested by a Retry-After header, if any"""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+class StoreApiClient:
+    """Async client for one store's API with retries, a circuit breaker and a concurrency limit
+
+    Args:
+        store_id: Store the client belongs to, used in logs and metrics
+        base_url: API root, e.g. "https://api.example.com/v1"
+        max_concurrency: Requests to this store allowed in flight at once
+        retries: Extra attempts after a retryable failure
+        backoff_base: First retry delay in seconds, doubled per attempt with full jitter
+        backoff_max: Upper bound for a single retry delay
+        breaker: Circuit breaker for this store (one is created by default)
+        pool: Connection pools to use (defaults to the shared process-wide pool)
+    """
+
+    def __init__(self, store_id: str, base_url: str, max_concurrency: int = 10, retries: int = 3,
+                 backoff_base: float = 0.5, backoff_max: float = 10.0,
+                 breaker: Optional[CircuitBreaker] = None, pool: Optional[HttpClientPool] = None,
+                 headers: Optional[Dict[str, str]] = None):
+        self.store_id = store_id
+        self.base_url = base_url.rstrip('/')
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.pool = pool or get_default_pool()
+        self.headers = headers or {}
+        self._max_concurrency = max_concurrency
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def request(self, method: str, path: str, stream: bool = False, **kwargs) -> httpx.Response:
+        """Send a request, retrying transport errors and retryable statuses
+
+        With stream=True the body is not read; the caller consumes it with
+        aiter_bytes()/aiter_text() and must close the response with aclose().
+
+        Raises:
+            CircuitOpenError: If the store's circuit breaker is open
+            UpstreamError: If the request still fails after all retries
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        headers = {**self.headers, **kwargs.pop('headers', {})}
+
+        for attempt in range(self.retries + 1):
+            if not self.breaker.allow():
+                STORE_REQUESTS.inc(store=self.store_id, result='circuit_open')
+                raise CircuitOpenError(f"Circuit open for store {self.store_id}")
+
+            delay = None
+            started = time.perf_counter()
+            try:
+                async with self._semaphore:
+                    client = self.pool.get(url)
+                    response = await client.send(client.build_request(method, url, headers=headers, **kwargs),
+                                                 stream=stream)
+            except httpx.TransportError as e:
+                error = UpstreamError(f"{method} {url} failed: {e!r}")
+            else:
+                # Other client errors won't fix themselves and don't mean the store is down
+                if response.status_code not in RETRY_STATUSES:
+                    STORE_LATENCY.observe(time.perf_counter() - started, store=self.store_id)
+                    STORE_REQUESTS.inc(store=self.store_id, result=str(response.status_code))
+                    self.breaker.record_success()
+                    return response
+                error = UpstreamError(f"{method} {url} returned {response.status_code}", response.status_code)
+                delay = _retry_after(response)
+                await response.aclose()
+
+            STORE_LATENCY.observe(time.perf_counter() - started, store=self.store_id)
+            STORE_REQUESTS.inc(store=self.store_id, result='error')
+            self.breaker.record_failure()
+            if attempt == self.retries:
+                raise error
+            delay = min(self.backoff_max, delay) if delay is not None else self._backoff(attempt)
+            logger.warning("Store %s request failed (%s), retry %s/%s in %.2fs",
+                           self.store_id, error, attempt + 1, self.retries, delay)
+            await asyncio.sleep(delay)
+
+    async def get_json(self, path: str, params: Optional[Dict[str, Any]] = None, **kwargs) -> Any:
+        """GET path and decode the JSON body"""
+        response = await self.request('GET', path, params=params, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    async def get_conditional(self, path: str, params: Optional[Dict[str, Any]], cache: FeedCache) -> Tuple[bytes, bool]:
+        """GET path with the cached ETag/Last-Modified validators
+
+        Returns:
+            Tuple of (response body, whether it changed since the cached copy)
+        """
+        query = urlencode(sorted((params or {}).items()))
+        cache_key = f"{self.base_url}/{path.lstrip('/')}?{query}"
+        # SQLite calls block, so they run off the event loop
+        cached = await asyncio.to_thread(cache.get, cache_key)
+        response = await self.request('GET', path, params=params, headers=cache.conditional_headers(cached))
+        if response.status_code == 304 and cached:
+            await asyncio.to_thread(cache.touch, cache_key)
+            return cached['body'], False
+        response.raise_for_status()
+        changed = await asyncio.to_thread(cache.put, cache_key, response.content,
+                                          response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        return response.content, changed
+
+    async def get_deals(self, page: int = 1, limit: int = 5, filters: Optional[Dict] = None,
+                        path: str = 'deals') -> Dict[str, Any]:
+        """Fetch one page of raw deals as {'deals': [...], 'total': n}"""
+        params = {'page': page, 'limit': limit, **(filters or {})}
+        return await self.get_json(path, params=params)
@@ -0,0 +1,109 @@
+import importlib
+import logging
+import os
+import threading
+from importlib.metadata import entry_points
+from typing import Dict, List, Optional, Type
+
+from stores import BaseStore
+
+logger = logging.getLogger(__name__)
+
+# Third-party packages can add stores under this entry point group, e.g.
+# [project.entry-points."dealshunter.stores"] walmart = "walmart_store:WalmartStore"
+ENTRY_POINT_GROUP = "dealshunter.stores"
+
+# Built-in stores as "module:Class", imported only when first used
+BUILTIN_STORES = {
+    'amazon': 'stores.amazon_store:AmazonStore',
+    'aliexpress': 'stores.aliexpress_store:AliexpressStore',
+    'ebay': 'stores.ebay_store:EbayStore',
+    'shein': 'stores.shein_store:SheinStore'
+}
+
+def _import_target(target: str) -> Type[BaseStore]:
+    module_name, _, class_name = target.partition(':')
+    return getattr(importlib.import_module(module_name), class_name)
+
+def parse_enabled_stores(value: Optional[str]) -> Optional[List[str]]:
+    """Parse ENABLED_STORES ("amazon,ebay"); None means every registered store"""
+    if not value or not value.strip():
+        return None
+    return [store_id.strip() for store_id in value.split(',') if store_id.strip()]
+
+class StoreRegistry:
+    """Registered store plugins, imported and instantiated lazily
+
+    Args:
+        targets: Store ID to "module:Class" (defaults to the built-in stores)
+        enabled: Store IDs to expose, in display order (defaults to ENABLED_STORES,
+            or every registered store)
+        load_entry_points: Whether to also register stores from installed packages
+    """
+
+    def __init__(self, targets: Optional[Dict[str, str]] = None, enabled: Optional[List[str]] = None,
+                 load_entry_points: bool = True):
+        self._targets = dict(BUILTIN_STORES if targets is None else targets)
+        self._entry_points = {}
+        if load_entry_points:
+            for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+                self._entry_points[entry_point.name] = entry_point
+        self._classes: Dict[str, Type[BaseStore]] = {}
+        self._instances: Dict[str, BaseStore] = {}
+        self._lock = threading.Lock()
+
+        registered = list(self._targets) + [name for name in self._entry_points if name not in self._targets]
+        enabled = enabled if enabled is not None else parse_enabled_stores(os.getenv('ENABLED_STORES'))
+        if enabled is None:
+            self._enabled = registered
+        else:
+            unknown = [store_id for store_id in enabled if store_id not in registered]
+            if unknown:
+                logger.warning("Ignoring unknown stores in ENABLED_STORES: %s", ', '.join(unknown))
+            self._enabled = [store_id for store_id in enabled if store_id in registered]
+
+    def register(self, store_id: str, target: str, enable: bool = True) -> None:
+        """Register a store as "module:Class" without importing it"""
+        with self._lock:
+            self._targets[store_id] = target
+            self._classes.pop(store_id, None)
+            self._instances.pop(store_id, None)
+            if enable and store_id not in self._enabled:
+                self._enabled.append(store_id)
+
+    def enabled(self) -> List[str]:
+        """Get the IDs of the stores enabled for this deployment"""
+        return list(self._enabled)
+
+    def is_enabled(self, store_id: str) -> bool:
+        return store_id in self._enabled
+
+    def get_class(self, store_id: str) -> Type[BaseStore]:
+        """Import the store's class without creating an instance"""
+        store_class = self._classes.get(store_id)
+        if store_class is None:
+            if store_id in self._targets:
+                store_class = _import_target(self._targets[store_id])
+            else:
+                store_class = self._entry_points[store_id].load()
+            if not issubclass(store_class, BaseStore):
+                raise TypeError(f"Store {store_id} ({store_class.__name__}) does not implement BaseStore")
+            self._classes[store_id] = store_class
+        return store_class
+
+    def get(self, store_id: str) -> BaseStore:
+        """Get the store instance, importing and creating it on first use"""
+        store = self._instances.get(store_id)
+        if store is None:
+            if not self.is_enabled(store_id):
+                raise KeyError(f"Store {store_id} is not enabled")
+            with self._lock:
+                store = self._instances.get(store_id)
+                if store is None:
+                    store = self._instances[store_id] = self.get_class(store_id)()
+                    logger.info("Loaded store %s", store_id)
+        return store
+
+    def loaded(self) -> Dict[str, BaseStore]:
+        """Get the stores instantiated so far"""
+        return dict(self._instances)
@@ -0,0 +1,239 @@
+import asyncio
+import logging
+import re
+import time
+from html.parser import HTMLParser
+from typing import List, Dict, Any, Optional
+from urllib.parse import urljoin
+
+from stores import BaseStore
+from stores.http_client import StoreApiClient
+
+logger = logging.getLogger(__name__)
+
+# Elements that never have a closing tag
+VOID_ELEMENTS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'
+}
+
+# Elements implicitly closed by a following sibling of the same kind, as in <li>a<li>b
+IMPLICITLY_CLOSED = {'p', 'li', 'option', 'dt', 'dd', 'tr', 'td', 'th'}
+
+_NUMBER = re.compile(r'\d[\d,]*(?:\.\d+)?')
+
+def parse_number(text: Optional[str]) -> Optional[float]:
+    """Extract the first number from text like "$1,299.99" or "4.5 out of 5" """
+    if not text:
+        return None
+    match = _NUMBER.search(text)
+    return float(match.group().replace(',', '')) if match else None
+
+def _matches(rule: Dict[str, str], tag: str, attrs: Dict[str, str]) -> bool:
+    """Check a start tag against a rule of tag name and/or a class it must carry"""
+    if rule.get('tag') and rule['tag'] != tag:
+        return False
+    if rule.get('class') and rule['class'] not in (attrs.get('class') or '').split():
+        return False
+    return True
+
+class ListingParser(HTMLParser):
+    """Event-driven extractor of listing items; never builds a document tree
+
+    Args:
+        item_rule: Rule for the element wrapping one product, e.g.
+            {'tag': 'div', 'class': 'product-card'}
+        field_rules: Field name -> rule; a rule with 'attr' takes that attribute
+            of the matching element (or of the item itself if it has no tag or
+            class), otherwise the element's text. The first match wins.
+
+    Completed items accumulate in `items`, so a page can be fed in chunks
+    as it downloads and items consumed after every feed().
+    """
+
+    def __init__(self, item_rule: Dict[str, str], field_rules: Dict[str, Dict[str, str]]):
+        super().__init__(convert_charrefs=True)
+        self.item_rule = item_rule
+        self.field_rules = field_rules
+        self.items: List[Dict[str, str]] = []
+        # Open element names; only the path to the current element is kept
+        self._open: List[str] = []
+        self._item: Optional[Dict[str, str]] = None
+        self._item_depth = 0
+        # (field, depth) of elements whose text is being captured
+        self._capturing: List[List] = []
+
+    def handle_starttag(self, tag: str, attrs) -> None:
+        attrs = dict(attrs)
+        if tag in IMPLICITLY_CLOSED and self._open and self._open[-1] == tag:
+            self.handle_endtag(tag)
+        if tag not in VOID_ELEMENTS:
+            self._open.append(tag)
+
+        if self._item is None:
+            if _matches(self.item_rule, tag, attrs) and tag not in VOID_ELEMENTS:
+                self._item = {}
+                self._item_depth = len(self._open)
+                for field, rule in self.field_rules.items():
+                    if 'attr' in rule and not rule.get('tag') and not rule.get('class'):
+                        self._item[field] = attrs.get(rule['attr'])
+            return
+
+        for field, rule in self.field_rules.items():
+            if field in self._item or not (rule.get('tag') or rule.get('class')):
+                continue
+            if not _matches(rule, tag, attrs):
+                continue
+            if 'attr' in rule:
+                if attrs.get(rule['attr']) is not None:
+                    self._item[field] = attrs[rule['attr']]
+            elif tag not in VOID_ELEMENTS:
+                self._item[field] = ''
+                self._capturing.append([field, len(self._open)])
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag not in self._open:
+            # Stray closing tag
+            return
+        # Close elements left open inside this one (e.g. <li> or <p> without an end tag)
+        while True:
+            depth = len(self._open)
+            closed = self._open.pop()
+            if self._capturing and self._capturing[-1][1] == depth:
+                field = self._capturing.pop()[0]
+                self._item[field] = ' '.join(self._item[field].split())
+            if self._item is not None and depth == self._item_depth:
+                self.items.append(self._item)
+                self._item = None
+                self._capturing = []
+            if closed == tag:
+                return
+
+    def handle_data(self, data: str) -> None:
+        for field, _ in self._capturing:
+            self._item[field] += data
+
+    def take_items(self) -> List[Dict[str, str]]:
+        """Get and clear the items completed so far"""
+        items, self.items = self.items, []
+        return items
+
+def parse_listing(html: str, item_rule: Dict[str, str], field_rules: Dict[str, Dict[str, str]],
+                  chunk_size: int = 64 * 1024) -> List[Dict[str, str]]:
+    """Extract all items from a listing page"""
+    parser = ListingParser(item_rule, field_rules)
+    items = []
+    for start in range(0, len(html), chunk_size):
+        parser.feed(html[start:start + chunk_size])
+        items.extend(parser.take_items())
+    parser.close()
+    items.extend(parser.take_items())
+    return items
+
+class ScraperStore(BaseStore):
+    """Store scraped from HTML listing pages
+
+    Subclasses set store_id, base_url, listing_path (formatted with page),
+    item_rule and field_rules, and may override parse_deal() to map the
+    extracted text to the raw deal shape. Fetches go through StoreApiClient,
+    limited to max_concurrency at once and one request start per crawl_delay.
+    """
+    store_id = ''
+    base_url = ''
+    listing_path = '/deals?page={page}'
+    item_rule: Dict[str, str] = {}
+    field_rules: Dict[str, Dict[str, str]] = {}
+    max_concurrency = 2
+    crawl_delay = 1.0
+
+    def __init__(self, client: Optional[StoreApiClient] = None):
+        super().__init__()
+        self.client = client or StoreApiClient(self.store_id, self.base_url, max_concurrency=self.max_concurrency)
+        self.catalog: List[Dict[str, Any]] = []
+        self._politeness_lock: Optional[asyncio.Lock] = None
+        self._next_request_at = 0.0
+
+    def get_raw_deals(self) -> List[Dict[str, Any]]:
+        return self.catalog
+
+    def parse_deal(self, fields: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        """Map extracted fields to a raw deal; None skips the item"""
+        price = parse_number(fields.get('price'))
+        if price is None or not fields.get('title'):
+            return None
+        original_price = parse_number(fields.get('original_price')) or price
+        discount = parse_number(fields.get('discount_percentage'))
+        if discount is None:
+            discount = round((1 - price / original_price) * 100, 1) if original_price else 0.0
+        return {
+            'id': fields.get('id') or fields.get('url'),
+            'title': fields['title'],
+            'price': price,
+            'original_price': original_price,
+            'url': urljoin(self.client.base_url + '/', fields.get('url') or ''),
+            'discount_percentage': discount,
+            'stock_status': fields.get('stock_status') or 'In Stock',
+            'rating': parse_number(fields.get('rating')),
+            'reviews_count': int(parse_number(fields.get('reviews_count')) or 0),
+            'category': fields.get('category'),
+            'brand': fields.get('brand'),
+            'image_url': urljoin(self.client.base_url + '/', fields['image_url']) if fields.get('image_url') else None,
+            'last_updated': time.strftime('%Y-%m-%d')
+        }
+
+    async def _wait_for_turn(self) -> None:
+        """Space request starts at least crawl_delay apart"""
+        if self._politeness_lock is None:
+            self._politeness_lock = asyncio.Lock()
+        async with self._politeness_lock:
+            delay = self._next_request_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next_request_at = time.monotonic() + self.crawl_delay
+
+    async def scrape_page(self, page: int) -> List[Dict[str, Any]]:
+        """Fetch and parse one listing page, feeding the parser as the body downloads"""
+        await self._wait_for_turn()
+        response = await self.client.request('GET', self.listing_path.format(page=page), stream=True)
+        deals = []
+        try:
+            response.raise_for_status()
+            parser = ListingParser(self.item_rule, self.field_rules)
+            async for chunk in response.aiter_text():
+                parser.feed(chunk)
+                deals.extend(self._parse_items(parser.take_items()))
+            parser.close()
+            deals.extend(self._parse_items(parser.take_items()))
+        finally:
+            await response.aclose()
+        return deals
+
+    def _parse_items(self, items: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+        deals = []
+        for fields in items:
+            deal = self.parse_deal(fields)
+            if deal:
+                deals.append(deal)
+        return deals
+
+    async def refresh(self, max_pages: int = 20) -> int:
+        """Scrape listing pages concurrently until one comes back empty
+
+        Returns:
+            int: Number of deals in the catalog
+        """
+        catalog = []
+        try:
+            for first in range(1, max_pages + 1, self.max_concurrency):
+                pages = range(first, min(first + self.max_concurrency, max_pages + 1))
+                results = await asyncio.gather(*(self.scrape_page(page) for page in pages))
+                for deals in results:
+                    catalog.extend(deals)
+                if any(not deals for deals in results):
+                    break
+        except Exception as e:
+            logger.error(f"Error scraping {self.get_store_name()}: {str(e)}")
+            return len(self.catalog)
+        self.catalog = catalog
+        self._catalog_changed()
+        logger.info("Scraped %s deals from %s", len(catalog), self.get_store_name())
+        return len(catalog)
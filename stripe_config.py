@@ -1,6 +1,12 @@
 import os
 import logging
+import time
+import traceback
+from typing import Optional
 import stripe
+from ttl_cache import TTLCache
+from metrics import REGISTRY, STRIPE_LATENCY
+from firebase_client import get_db
 
 logger = logging.getLogger(__name__)
 
@@ -8,8 +14,61 @@ logger = logging.getLogger(__name__)
 stripe.api_key = os.environ.get("STRIPE_SECRET_KEY")
 PRICE_ID = os.environ.get("STRIPE_PRICE_ID")
 
-def create_checkout_session(user_id: str):
-    """Create a Checkout Session for a user - SIMPLIFIED"""
+# How long a pending checkout session URL is handed out again on repeated clicks
+CHECKOUT_SESSION_TTL = int(os.environ.get("STRIPE_CHECKOUT_SESSION_TTL", "1800"))
+
+# user_id -> verified Stripe customer ID
+_customer_cache = TTLCache(maxsize=10000, ttl=24 * 60 * 60)
+# user_id -> URL of the pending checkout session
+_checkout_session_cache = TTLCache(maxsize=10000, ttl=CHECKOUT_SESSION_TTL)
+REGISTRY.register_cache('stripe_customer', _customer_cache)
+REGISTRY.register_cache('checkout_session', _checkout_session_cache)
+
+def get_or_create_customer(user_id: str, user_manager) -> Optional[str]:
+    """Return the user's Stripe customer ID, creating a customer only on a miss
+
+    A new customer is saved through user_manager straight away, so a failed
+    checkout or a restart can't leave it orphaned and create another.
+    """
+    customer_id = _customer_cache.get(user_id)
+    if customer_id:
+        logger.info("Reusing cached Stripe customer %s for user %s", customer_id, user_id)
+        return customer_id
+
+    # The stored ID is verified against Stripe once, then served from the cache
+    customer_id = get_customer_id_by_user_id(user_id)
+    if customer_id:
+        try:
+            with STRIPE_LATENCY.time(operation='customer_retrieve'):
+                customer = stripe.Customer.retrieve(customer_id)
+            if not getattr(customer, 'deleted', False):
+                logger.info("Reusing stored Stripe customer %s for user %s", customer_id, user_id)
+                _customer_cache.set(user_id, customer_id)
+                return customer_id
+            logger.warning("Stored Stripe customer %s was deleted, creating a new one", customer_id)
+        except stripe.error.InvalidRequestError as e:
+            logger.warning("Stored Stripe customer %s is invalid: %s", customer_id, e)
+
+    logger.info("Creating new Stripe customer for user %s", user_id)
+    with STRIPE_LATENCY.time(operation='customer_create'):
+        customer = stripe.Customer.create(
+            metadata={"user_id": user_id}
+        )
+    logger.info("Created customer ID: %s", customer.id)
+    user_manager.save_stripe_customer_id(user_id, customer.id)
+    _customer_cache.set(user_id, customer.id)
+    return customer.id
+
+def invalidate_checkout_session(user_id: str) -> None:
+    """Forget the pending checkout session for a user"""
+    _checkout_session_cache.pop(str(user_id))
+
+def create_checkout_session(user_id: str, user_manager):
+    """Create a Checkout Session for a user, reusing a pending one if possible
+
+    A new customer ID is saved through user_manager, so the customer -> user
+    index the webhook looks users up by is filled in before payment.
+    """
     try:
         # Check required configuration
         if not stripe.api_key:
@@ -20,20 +79,15 @@ def create_checkout_session(user_id: str):
             logger.error("Stripe Price ID not configured")
             return None
 
-        logger.info(f"=== CREATING CHECKOUT SESSION FOR USER {user_id} ===")
+        # Repeated upgrade clicks within the window get the same pending session
+        cached_url = _checkout_session_cache.get(user_id)
+        if cached_url:
+            logger.info("Reusing pending checkout session for user %s", user_id)
+            return cached_url
 
-        # Import firestore here to avoid circular imports
-        from firebase_admin import firestore
-        db = firestore.client()
+        logger.info("=== CREATING CHECKOUT SESSION FOR USER %s ===", user_id)
 
-        # Simple approach: Create a new customer every time
-        # This avoids issues with invalid customers
-        logger.info(f"Creating new Stripe customer for user {user_id}")
-        customer = stripe.Customer.create(
-            metadata={"user_id": user_id}
-        )
-        customer_id = customer.id
-        logger.info(f"Created customer ID: {customer_id}")
+        customer_id = get_or_create_customer(user_id, user_manager)
 
         # Basic session parameters - keep it simple
         session_params = {
@@ -51,22 +105,24 @@ def create_checkout_session(user_id: str):
         }
 
         # Create checkout session
-        logger.info(f"Creating checkout session with parameters: {session_params}")
-        session = stripe.checkout.Session.create(**session_params)
+        logger.debug("Creating checkout session with parameters: %s", session_params)
+        with STRIPE_LATENCY.time(operation='checkout_session_create'):
+            session = stripe.checkout.Session.create(**session_params)
 
         session_id = session.id
-        logger.info(f"Created checkout session ID: {session_id}")
-
-        # Save essential data to Firestore right away
-        # This will help with debugging and ensure customer ID is saved
-        logger.info(f"Saving customer ID to Firestore for user {user_id}")
-        db.collection('users').document(user_id).set({
-            'stripe_customer_id': customer_id,
-            'latest_checkout_session': session_id,
-            'checkout_created_at': firestore.SERVER_TIMESTAMP
-        }, merge=True)
-
-        logger.info(f"✅ Successfully created checkout process for user {user_id}")
+        logger.info("Created checkout session ID: %s", session_id)
+
+        # Never hand out a cached URL after Stripe has expired the session
+        ttl = CHECKOUT_SESSION_TTL
+        expires_at = getattr(session, 'expires_at', None)
+        if expires_at:
+            ttl = min(ttl, max(0, expires_at - time.time() - 60))
+        _checkout_session_cache.set(user_id, session.url, ttl=ttl)
+
+        # Kept for debugging payments that never reach the webhook
+        user_manager.save_checkout_session(user_id, session_id)
+
+        logger.info("✅ Successfully created checkout process for user %s", user_id)
         return session.url
     except Exception as e:
         logger.error(f"💥 ERROR creating checkout session: {e}")
@@ -80,27 +136,25 @@ def get_customer_id_by_user_id(user_id: str) -> str:
             logger.error("Stripe API key not configured")
             return None
 
-        logger.info(f"Looking for customer ID in Firestore for user: {user_id}")
+        logger.info("Looking for customer ID in Firestore for user: %s", user_id)
 
-        # Import Firestore here to avoid circular imports
-        from firebase_admin import firestore
-        db = firestore.client()
+        db = get_db()
 
         # Get user document from Firestore
         user_doc = db.collection('users').document(user_id).get()
 
         if not user_doc.exists:
-            logger.warning(f"User document not found for user_id: {user_id}")
+            logger.warning("User document not found for user_id: %s", user_id)
             return None
 
         user_data = user_doc.to_dict()
         customer_id = user_data.get('stripe_customer_id')
 
         if not customer_id:
-            logger.warning(f"No Stripe customer ID found for user: {user_id}")
+            logger.warning("No Stripe customer ID found for user: %s", user_id)
             return None
 
-        logger.info(f"Found Stripe customer ID: {customer_id} for user: {user_id}")
+        logger.info("Found Stripe customer ID: %s for user: %s", customer_id, user_id)
         return customer_id
 
     except Exception as e:
@@ -114,21 +168,22 @@ def get_active_subscription_by_customer(customer_id: str) -> str:
             logger.error("No customer ID provided")
             return None
 
-        logger.info(f"Retrieving active subscriptions for customer: {customer_id}")
+        logger.info("Retrieving active subscriptions for customer: %s", customer_id)
 
         # Get all subscriptions for this customer
-        subscriptions = stripe.Subscription.list(
-            customer=customer_id,
-            status='active',
-            limit=1
-        )
+        with STRIPE_LATENCY.time(operation='subscription_list'):
+            subscriptions = stripe.Subscription.list(
+                customer=customer_id,
+                status='active',
+                limit=1
+            )
 
         if not subscriptions.data:
-            logger.warning(f"No active subscriptions found for customer: {customer_id}")
+            logger.warning("No active subscriptions found for customer: %s", customer_id)
             return None
 
         subscription = subscriptions.data[0]
-        logger.info(f"Found active subscription: {subscription.id} for customer: {customer_id}")
+        logger.info("Found active subscription: %s for customer: %s", subscription.id, customer_id)
         return subscription.id
 
     except Exception as e:
@@ -146,26 +201,28 @@ def cancel_stripe_subscription(subscription_id: str) -> bool:
             logger.error("No subscription ID provided")
             return False
 
-        logger.info(f"Attempting to cancel subscription with ID: {subscription_id}")
+        logger.info("Attempting to cancel subscription with ID: %s", subscription_id)
 
         # Retrieve the subscription to check its status
         try:
-            subscription = stripe.Subscription.retrieve(subscription_id)
-            logger.info(f"Successfully retrieved subscription: {subscription.id}")
+            with STRIPE_LATENCY.time(operation='subscription_retrieve'):
+                subscription = stripe.Subscription.retrieve(subscription_id)
+            logger.info("Successfully retrieved subscription: %s", subscription.id)
 
             # Check if already canceled
             if subscription.status == 'canceled':
-                logger.info(f"Subscription {subscription_id} is already canceled.")
+                logger.info("Subscription %s is already canceled.", subscription_id)
                 return True
 
             # Important: Check if the subscription is active before attempting to cancel
             if subscription.status not in ['active', 'trialing']:
-                logger.warning(f"Cannot cancel subscription with status: {subscription.status}")
+                logger.warning("Cannot cancel subscription with status: %s", subscription.status)
                 return False
 
             # Cancel subscription immediately
-            result = stripe.Subscription.delete(subscription_id)
-            logger.info(f"Subscription {subscription_id} canceled immediately. Status: {result.status}")
+            with STRIPE_LATENCY.time(operation='subscription_delete'):
+                result = stripe.Subscription.delete(subscription_id)
+            logger.info("Subscription %s canceled immediately. Status: %s", subscription_id, result.status)
             return True
 
         except stripe.error.InvalidRequestError as e:
@@ -0,0 +1,82 @@
+import logging
+from typing import Optional
+from firebase_admin import firestore
+from ttl_cache import TTLCache
+from metrics import REGISTRY
+from firebase_client import get_db
+
+logger = logging.getLogger(__name__)
+
+class StripeIndex:
+    """Reverse index mapping Stripe customer and subscription IDs to Telegram user IDs
+
+    Each mapping is its own document in the `stripe_index` collection, keyed
+    `customer_<id>` or `subscription_<id>`, so a lookup is a single point read
+    instead of a query over the whole `users` collection.
+    """
+
+    def __init__(self, db=None):
+        self.db = db or get_db()
+        self.index_ref = self.db.collection('stripe_index')
+        self._cache = TTLCache(maxsize=10000, ttl=60 * 60)
+        REGISTRY.register_cache('stripe_index', self._cache)
+
+    @staticmethod
+    def _key(kind: str, stripe_id: str) -> str:
+        return f"{kind}_{stripe_id}"
+
+    def link(self, user_id: str, customer_id: Optional[str] = None,
+             subscription_id: Optional[str] = None) -> None:
+        """Record which user owns the given customer and/or subscription"""
+        user_id = str(user_id)
+        keys = []
+        if customer_id:
+            keys.append((self._key('customer', customer_id), 'customer', customer_id))
+        if subscription_id:
+            keys.append((self._key('subscription', subscription_id), 'subscription', subscription_id))
+        if not keys:
+            return
+
+        try:
+            batch = self.db.batch()
+            for key, kind, stripe_id in keys:
+                batch.set(self.index_ref.document(key), {
+                    'user_id': user_id,
+                    'type': kind,
+                    'stripe_id': stripe_id,
+                    'updated_at': firestore.SERVER_TIMESTAMP
+                })
+            batch.commit()
+            for key, _, _ in keys:
+                self._cache.set(key, user_id)
+            logger.info("Indexed Stripe IDs %s for user %s", [k for k, _, _ in keys], user_id)
+        except Exception as e:
+            logger.error(f"Error indexing Stripe IDs for user {user_id}: {e}")
+
+    def _lookup(self, key: str) -> Optional[str]:
+        user_id = self._cache.get(key)
+        if user_id:
+            return user_id
+
+        doc = self.index_ref.document(key).get()
+        if not doc.exists:
+            return None
+        user_id = doc.to_dict().get('user_id')
+        if user_id:
+            self._cache.set(key, user_id)
+        return user_id
+
+    def find_user_id(self, customer_id: Optional[str] = None,
+                     subscription_id: Optional[str] = None) -> Optional[str]:
+        """Resolve a Telegram user ID from a Stripe customer or subscription ID"""
+        try:
+            if customer_id:
+                user_id = self._lookup(self._key('customer', customer_id))
+                if user_id:
+                    return user_id
+            if subscription_id:
+                return self._lookup(self._key('subscription', subscription_id))
+            return None
+        except Exception as e:
+            logger.error(f"Error looking up Stripe index: {e}")
+            return None
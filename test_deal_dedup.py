@@ -0,0 +1,23 @@
+from deal_dedup import DealDeduplicator, normalize_title
+
+def _deal(title: str, store: str, price: float) -> dict:
+    return {'title': title, 'store': store, 'price': price, 'url': f'https://{store}.example.com/{price}'}
+
+def test_cyrillic_titles_keep_their_words():
+    assert normalize_title("Наушники Sony WH-1000XM5") == ['наушник', 'sony', 'wh', '1000xm5']
+
+def test_accessory_is_not_merged_with_its_product():
+    deals = [_deal("Samsung Galaxy S23", 'amazon', 799.0), _deal("Samsung Galaxy S23 Case", 'ebay', 12.0)]
+    assert len(DealDeduplicator().deduplicate(deals)) == 2
+
+def test_russian_accessory_is_not_merged_with_its_product():
+    deals = [_deal("Наушники Sony WH-1000XM5", 'uzum', 349.0), _deal("Чехол для Sony WH-1000XM5", 'olx', 15.0)]
+    assert len(DealDeduplicator().deduplicate(deals)) == 2
+
+def test_same_product_across_stores_is_merged():
+    deals = [_deal("Apple AirPods Pro 2", 'amazon', 249.0),
+             _deal("NEW Apple AirPods Pro 2 - Free Shipping", 'ebay', 229.0)]
+    merged = DealDeduplicator().deduplicate(deals)
+    assert len(merged) == 1
+    assert merged[0]['price'] == 229.0
+    assert [offer['store'] for offer in merged[0]['offers']] == ['ebay', 'amazon']
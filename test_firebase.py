@@ -49,7 +49,7 @@ def test_firestore_connection():
         }
 
         # Write the data
-        logger.info(f"Writing test data: {test_data}")
+        logger.info("Writing test data: %s", test_data)
         test_ref.set(test_data)
         logger.info("Write operation completed")
 
@@ -59,7 +59,7 @@ def test_firestore_connection():
         # Read it back
         doc = test_ref.get()
         if doc.exists:
-            logger.info(f"Read test data: {doc.to_dict()}")
+            logger.info("Read test data: %s", doc.to_dict())
             logger.info("✅ Firestore read/write test PASSED")
         else:
             logger.error("❌ Test document not found after writing")
@@ -82,7 +82,7 @@ def test_user_premium_update(user_id="123456789"):
             firebase_admin.initialize_app(cred)
 
         db = firestore.client()
-        logger.info(f"Testing premium update for user {user_id}")
+        logger.info("Testing premium update for user %s", user_id)
 
         # Get reference to user document
         user_ref = db.collection("users").document(str(user_id))
@@ -96,12 +96,12 @@ def test_user_premium_update(user_id="123456789"):
         }
 
         # Try direct update
-        logger.info(f"Attempting direct update with: {update_data}")
+        logger.info("Attempting direct update with: %s", update_data)
         try:
             user_ref.update(update_data)
             logger.info("Update operation succeeded")
         except Exception as update_error:
-            logger.warning(f"Update failed (expected if new user): {update_error}")
+            logger.warning("Update failed (expected if new user): %s", update_error)
             logger.info("Trying set with merge instead")
             # If update fails (new user), try setting with merge
             user_ref.set(update_data, merge=True)
@@ -114,7 +114,7 @@ def test_user_premium_update(user_id="123456789"):
         doc = user_ref.get()
         if doc.exists:
             user_data = doc.to_dict()
-            logger.info(f"User data after update: {user_data}")
+            logger.info("User data after update: %s", user_data)
 
             if user_data.get('is_premium') == True:
                 logger.info("✅ Premium status was updated successfully")
@@ -0,0 +1,83 @@
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+from ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Requests a user may make in a burst, and tokens refilled per second after it
+THROTTLE_BURST = float(os.getenv('THROTTLE_BURST', '8'))
+THROTTLE_RATE = float(os.getenv('THROTTLE_RATE', '2'))
+
+class RateLimiter:
+    """Token bucket per key: `burst` requests at once, refilled at `rate` per second
+
+    Buckets are kept in a TTLCache that forgets one once it would have
+    refilled completely, so memory only holds recently active users.
+    Meant for a single event loop; allow() never awaits.
+    """
+
+    def __init__(self, rate: float = THROTTLE_RATE, burst: float = THROTTLE_BURST, maxsize: int = 100_000):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = TTLCache(maxsize=maxsize, ttl=burst / rate)
+
+    def allow(self, key: Hashable, cost: float = 1.0) -> bool:
+        """Take cost tokens from key's bucket; False if it doesn't hold enough"""
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+        self._buckets.set(key, (tokens, now))
+        return allowed
+
+class Coalescer:
+    """Runs one update per key at a time, collapsing the ones that arrive meanwhile into the latest
+
+    While a key's handler runs, a new update for the key is parked; a
+    later one replaces it and the replaced update goes to on_skip. When
+    the handler returns, the parked update (if any) runs next. With rapid
+    repeated presses on one message, only the first and the last are
+    handled, whatever happened in between.
+    """
+
+    def __init__(self, on_skip: Optional[Callable[[Any], Awaitable[None]]] = None):
+        self.on_skip = on_skip
+        # key -> parked (update, context), or None while only the running one exists
+        self._parked: Dict[Hashable, Optional[Tuple[Any, Any]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._parked)
+
+    async def run(self, key: Hashable, handler: Callable[[Any, Any], Awaitable[Any]], update: Any, context: Any) -> None:
+        if key in self._parked:
+            replaced = self._parked[key]
+            self._parked[key] = (update, context)
+            if replaced is not None:
+                await self._skip(replaced[0])
+            return
+
+        self._parked[key] = None
+        try:
+            while True:
+                await handler(update, context)
+                parked = self._parked.get(key)
+                if parked is None:
+                    break
+                self._parked[key] = None
+                update, context = parked
+        finally:
+            parked = self._parked.pop(key, None)
+            if parked is not None:
+                await self._skip(parked[0])
+
+    async def _skip(self, update: Any) -> None:
+        if self.on_skip is None:
+            return
+        try:
+            await self.on_skip(update)
+        except Exception as e:
+            logger.error(f"Error skipping a coalesced update: {e}")
@@ -32,6 +32,22 @@ TRANSLATIONS = {
         'view_deal_button': '🔍 View Deal',
         'deal_count_label': 'Deals found:',
         'no_deals_found': 'No deals found at the moment. Please check back later!',
+        'search_usage': '🔎 Type what you are looking for after /search, e.g. /search wireless headphones',
+        'search_results_header': '🔎 Results for "{}":',
+        'search_no_results': 'Nothing matches "{}". Try fewer or different words.',
+        'for_you_button': '✨ For You',
+        'for_you_header': '✨ Picked for you:',
+        'photos_button': '🖼 Photos',
+        'digest_header': '🔔 New deals from your stores:',
+        'too_many_requests': '⏳ Too many requests, please slow down.',
+        'watch_usage': '👀 Watch for deals: /watch <words> [max=100] [discount=30] [brand=Sony] [category=Audio] [store=amazon] [freeship]\nRemove a rule: /unwatch <number>',
+        'watch_added': '✅ Watching: {}',
+        'watch_limit': 'You have reached your watch rule limit. Remove one with /unwatch or upgrade to Premium for more!',
+        'watch_list_header': '👀 Your watch rules:',
+        'watch_removed': '❌ Stopped watching: {}',
+        'watch_not_found': 'There is no watch rule with that number.',
+        'watch_alert_header': '👀 New deals matching your watch rules:',
+        'watch_alert_footer': 'See your rules with /watch, remove one with /unwatch <number>.',
 
         # Navigation buttons
         'next_page': 'Next ➡️',
@@ -95,6 +111,22 @@ Premium users: All stores (8 notifications/day)""",
         'view_deal_button': '🔍 Ko\'rish',
         'deal_count_label': 'Topilgan chegirmalar:',
         'no_deals_found': 'Hozircha chegirmalar yo\'q. Keyinroq qayta tekshiring!',
+        'search_usage': '🔎 /search dan keyin nima qidirayotganingizni yozing, masalan: /search simsiz quloqchinlar',
+        'search_results_header': '🔎 "{}" bo\'yicha natijalar:',
+        'search_no_results': '"{}" bo\'yicha hech narsa topilmadi. Boshqa so\'zlar bilan urinib ko\'ring.',
+        'for_you_button': '✨ Siz uchun',
+        'for_you_header': '✨ Siz uchun tanlangan:',
+        'photos_button': '🖼 Rasmlar',
+        'digest_header': "🔔 Do'konlaringizdan yangi chegirmalar:",
+        'too_many_requests': '⏳ So\'rovlar juda ko\'p, biroz sekinroq.',
+        'watch_usage': '👀 Chegirmalarni kuzatish: /watch <so\'zlar> [max=100] [discount=30] [brand=Sony] [category=Audio] [store=amazon] [freeship]\nQoidani o\'chirish: /unwatch <raqam>',
+        'watch_added': '✅ Kuzatilmoqda: {}',
+        'watch_limit': 'Kuzatish qoidalari chegarasiga yetdingiz. /unwatch bilan birini o\'chiring yoki Premiumga o\'ting!',
+        'watch_list_header': '👀 Kuzatish qoidalaringiz:',
+        'watch_removed': '❌ Kuzatish to\'xtatildi: {}',
+        'watch_not_found': 'Bunday raqamli kuzatish qoidasi yo\'q.',
+        'watch_alert_header': '👀 Kuzatish qoidalaringizga mos yangi chegirmalar:',
+        'watch_alert_footer': 'Qoidalaringiz: /watch, birini o\'chirish: /unwatch <raqam>.',
 
         # Navigation buttons
         'next_page': 'Keyingi ➡️',
@@ -157,6 +189,22 @@ Premium foydalanuvchilar: Barcha do'konlar (kuniga 8 ta)""",
         'view_deal_button': '🔍 Посмотреть',
         'deal_count_label': 'Найдено предложений:',
         'no_deals_found': 'Сейчас нет доступных предложений. Проверьте позже!',
+        'search_usage': '🔎 Напишите, что ищете, после /search, например: /search беспроводные наушники',
+        'search_results_header': '🔎 Результаты по запросу «{}»:',
+        'search_no_results': 'По запросу «{}» ничего не найдено. Попробуйте другие слова.',
+        'for_you_button': '✨ Для вас',
+        'for_you_header': '✨ Подобрано для вас:',
+        'photos_button': '🖼 Фото',
+        'digest_header': '🔔 Новые скидки из ваших магазинов:',
+        'too_many_requests': '⏳ Слишком много запросов, пожалуйста, помедленнее.',
+        'watch_usage': '👀 Отслеживание скидок: /watch <слова> [max=100] [discount=30] [brand=Sony] [category=Audio] [store=amazon] [freeship]\nУдалить правило: /unwatch <номер>',
+        'watch_added': '✅ Отслеживается: {}',
+        'watch_limit': 'Достигнут лимит правил отслеживания. Удалите одно через /unwatch или перейдите на Премиум!',
+        'watch_list_header': '👀 Ваши правила отслеживания:',
+        'watch_removed': '❌ Отслеживание остановлено: {}',
+        'watch_not_found': 'Правила с таким номером нет.',
+        'watch_alert_header': '👀 Новые скидки по вашим правилам отслеживания:',
+        'watch_alert_footer': 'Ваши правила: /watch, удалить правило: /unwatch <номер>.',
 
         # Navigation buttons
         'next_page': 'Далее ➡️',
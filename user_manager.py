@@ -1,20 +1,37 @@
 import logging
-import firebase_admin
-from firebase_admin import credentials, firestore
-from typing import Optional
+import os
+import threading
+import time
+from firebase_admin import firestore
+from typing import Dict, Optional
+from stripe_index import StripeIndex
+from firebase_client import get_db
+from lifecycle import register_shutdown_hook
+from metrics import REGISTRY
+from ttl_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
+# Seconds between writes of buffered interest counts to Firestore
+INTEREST_FLUSH_INTERVAL = float(os.getenv('INTEREST_FLUSH_INTERVAL', '60'))
+
+# Firestore allows at most 500 writes per batch
+MAX_BATCH_WRITES = 500
+
 class UserManager:
     def __init__(self):
         """Initialize Firestore users collection reference"""
         try:
-            # Initialize Firebase if not already initialized
-            if not len(firebase_admin._apps):
-                cred = credentials.Certificate("credentials.json")
-                firebase_admin.initialize_app(cred)
-            self.db = firestore.client()
+            self.db = get_db()
             self.users_ref = self.db.collection('users')
+            self.stripe_index = StripeIndex(self.db)
+            self.interests_ref = self.db.collection('user_interests')
+            self._interest_cache = TTLCache(maxsize=10000, ttl=60 * 60)
+            REGISTRY.register_cache('user_interests', self._interest_cache)
+            # user ID -> interest key -> weight not yet written to Firestore
+            self._pending_interests: Dict[str, Dict[str, float]] = {}
+            self._interest_lock = threading.Lock()
+            self._flusher_started = False
             logger.info("Firebase connection initialized successfully")
         except Exception as e:
             logger.error(f"Error initializing Firebase: {str(e)}")
@@ -28,7 +45,7 @@ class UserManager:
             doc = doc_ref.get()
             if doc.exists:
                 return doc.to_dict().get('language', 'en')
-            logger.warning(f"User {user_id} not found, returning default language")
+            logger.warning("User %s not found, returning default language", user_id)
             return 'en'
         except Exception as e:
             logger.error(f"Error getting user language: {str(e)}")
@@ -40,7 +57,7 @@ class UserManager:
         try:
             doc_ref = self.users_ref.document(str(user_id))
             doc_ref.set({'language': language}, merge=True)
-            logger.info(f"Language preference saved for user {user_id}: {language}")
+            logger.info("Language preference saved for user %s: %s", user_id, language)
         except Exception as e:
             logger.error(f"Error saving user language: {str(e)}")
             raise
@@ -54,7 +71,7 @@ class UserManager:
                     'language': 'en',
                     'created_at': firestore.SERVER_TIMESTAMP
                 })
-                logger.info(f"Created new user: {user_id}")
+                logger.info("Created new user: %s", user_id)
         except Exception as e:
             logger.error(f"Error creating user: {str(e)}")
             raise
@@ -83,7 +100,7 @@ class UserManager:
         try:
             doc_ref = self.users_ref.document(str(user_id))
             doc_ref.set({'subscription_id': subscription_id}, merge=True)
-            logger.info(f"Saved subscription ID for user {user_id}: {subscription_id}")
+            logger.info("Saved subscription ID for user %s: %s", user_id, subscription_id)
         except Exception as e:
             logger.error(f"Error saving subscription ID: {e}")
 
@@ -92,10 +109,22 @@ class UserManager:
         try:
             doc_ref = self.users_ref.document(str(user_id))
             doc_ref.set({'stripe_customer_id': customer_id}, merge=True)
-            logger.info(f"Saved Stripe customer ID for user {user_id}: {customer_id}")
+            logger.info("Saved Stripe customer ID for user %s: %s", user_id, customer_id)
+            self.stripe_index.link(user_id, customer_id=customer_id)
         except Exception as e:
             logger.error(f"Error saving Stripe customer ID: {e}")
 
+    def save_checkout_session(self, user_id: int, session_id: str) -> None:
+        """Save the ID of the user's latest Stripe checkout session"""
+        try:
+            doc_ref = self.users_ref.document(str(user_id))
+            doc_ref.set({
+                'latest_checkout_session': session_id,
+                'checkout_created_at': firestore.SERVER_TIMESTAMP
+            }, merge=True)
+        except Exception as e:
+            logger.error(f"Error saving checkout session: {e}")
+
     def get_stripe_customer_id(self, user_id: int) -> Optional[str]:
         """Get the user's Stripe customer ID"""
         try:
@@ -105,11 +134,11 @@ class UserManager:
                 user_data = doc.to_dict()
                 customer_id = user_data.get('stripe_customer_id')
                 if customer_id:
-                    logger.info(f"Found Stripe customer ID {customer_id} for user {user_id}")
+                    logger.info("Found Stripe customer ID %s for user %s", customer_id, user_id)
                     return customer_id
-                logger.warning(f"No Stripe customer ID found for user {user_id}")
+                logger.warning("No Stripe customer ID found for user %s", user_id)
                 return None
-            logger.warning(f"User document not found for user {user_id}")
+            logger.warning("User document not found for user %s", user_id)
             return None
         except Exception as e:
             logger.error(f"Error retrieving Stripe customer ID: {e}")
@@ -125,20 +154,107 @@ class UserManager:
                 # Try to get subscription_id first
                 subscription_id = user_data.get('subscription_id')
                 if subscription_id:
-                    logger.info(f"Found subscription_id {subscription_id} for user {user_id}")
+                    logger.info("Found subscription_id %s for user %s", subscription_id, user_id)
                     return subscription_id
 
                 # If not found, try subscription_item_id
                 subscription_item_id = user_data.get('subscription_item_id')
                 if subscription_item_id:
-                    logger.info(f"Found subscription_item_id {subscription_item_id} for user {user_id}")
+                    logger.info("Found subscription_item_id %s for user %s", subscription_item_id, user_id)
                     return subscription_item_id
 
-                logger.warning(f"No subscription IDs found for user {user_id}")
+                logger.warning("No subscription IDs found for user %s", user_id)
                 return None
 
-            logger.warning(f"User document not found for user {user_id}")
+            logger.warning("User document not found for user %s", user_id)
             return None
         except Exception as e:
             logger.error(f"Error retrieving subscription ID: {e}")
-            return None
\ No newline at end of file
+            return None
+
+    def record_interests(self, user_id: int, weights: Dict[str, float]) -> None:
+        """Add to a user's store and category interest weights
+
+        Weights are buffered in memory and written in batches, so recording
+        a view costs no Firestore round trip.
+
+        Args:
+            weights: deal_ranking.interest_key() to weight to add
+        """
+        if not weights:
+            return
+        user_id = str(user_id)
+        with self._interest_lock:
+            pending = self._pending_interests.setdefault(user_id, {})
+            for key, weight in weights.items():
+                pending[key] = pending.get(key, 0) + weight
+            if not self._flusher_started:
+                self._start_interest_flusher()
+
+    def _start_interest_flusher(self) -> None:
+        self._flusher_started = True
+
+        def run():
+            while True:
+                time.sleep(INTEREST_FLUSH_INTERVAL)
+                self.flush_interests()
+
+        threading.Thread(target=run, name='interest-flush', daemon=True).start()
+        register_shutdown_hook(self.flush_interests, 'interest-flush')
+
+    def flush_interests(self) -> int:
+        """Write buffered interest weights as increments, one batch per 500 users
+
+        Returns:
+            int: Number of users written
+        """
+        with self._interest_lock:
+            pending, self._pending_interests = self._pending_interests, {}
+        if not pending:
+            return 0
+
+        users = list(pending.items())
+        written = 0
+        try:
+            for start in range(0, len(users), MAX_BATCH_WRITES):
+                chunk = users[start:start + MAX_BATCH_WRITES]
+                batch = self.db.batch()
+                for user_id, weights in chunk:
+                    batch.set(self.interests_ref.document(user_id),
+                              {key: firestore.Increment(weight) for key, weight in weights.items()},
+                              merge=True)
+                batch.commit()
+                written += len(chunk)
+                with self._interest_lock:
+                    for user_id, weights in chunk:
+                        cached = self._interest_cache.get(user_id)
+                        if cached is not None:
+                            for key, weight in weights.items():
+                                cached[key] = cached.get(key, 0) + weight
+        except Exception as e:
+            logger.error(f"Error saving user interests: {str(e)}")
+            # Keep the unwritten weights for the next flush
+            with self._interest_lock:
+                for user_id, weights in users[written:]:
+                    current = self._pending_interests.setdefault(user_id, {})
+                    for key, weight in weights.items():
+                        current[key] = current.get(key, 0) + weight
+        return written
+
+    def get_user_interests(self, user_id: int) -> Dict[str, float]:
+        """Get a user's interest weights, including ones not yet written"""
+        user_id = str(user_id)
+        interests = self._interest_cache.get(user_id)
+        if interests is None:
+            try:
+                doc = self.interests_ref.document(user_id).get()
+                interests = doc.to_dict() if doc.exists else {}
+                self._interest_cache.set(user_id, interests)
+            except Exception as e:
+                logger.error(f"Error getting user interests: {str(e)}")
+                interests = {}
+        with self._interest_lock:
+            merged = dict(interests)
+            for key, weight in self._pending_interests.get(user_id, {}).items():
+                merged[key] = merged.get(key, 0) + weight
+        return merged
@@ -0,0 +1,208 @@
+import bisect
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from deal_search import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Rule fields besides user_id; every field set on a rule must hold for a deal to match
+RULE_FIELDS = ('keywords', 'max_price', 'min_discount', 'category', 'brand', 'free_shipping', 'store')
+
+def parse_watch_rule(args: List[str]) -> Dict[str, Any]:
+    """Parse /watch arguments, e.g. ["sony", "headphones", "max=100", "discount=30", "freeship"]
+
+    Plain words are keywords; key=value pairs set max (price), discount,
+    brand, category and store; "freeship" asks for free shipping.
+
+    Raises:
+        ValueError: If an option is unknown or a number is malformed
+    """
+    rule: Dict[str, Any] = {}
+    keywords = []
+    for arg in args:
+        key, sep, value = arg.partition('=')
+        key = key.lower()
+        if not sep:
+            if key in ('freeship', 'free_shipping'):
+                rule['free_shipping'] = True
+            else:
+                keywords.append(arg)
+        elif key in ('max', 'max_price'):
+            rule['max_price'] = float(value.lstrip('$'))
+        elif key in ('discount', 'min_discount'):
+            rule['min_discount'] = float(value.rstrip('%'))
+        elif key in ('brand', 'category'):
+            rule[key] = value.replace('_', ' ')
+        elif key == 'store':
+            rule['store'] = value.lower()
+        else:
+            raise ValueError(f"Unknown watch option: {key}")
+    if keywords:
+        rule['keywords'] = keywords
+    if not rule:
+        raise ValueError("A watch rule needs at least one keyword or option")
+    return rule
+
+def describe_watch_rule(rule: Dict[str, Any]) -> str:
+    """Short language-neutral summary of a rule, e.g. "sony headphones · ≤ $100 · ≥ 30%" """
+    parts = [' '.join(rule.get('keywords') or [])]
+    if rule.get('max_price') is not None:
+        parts.append(f"≤ ${rule['max_price']:g}")
+    if rule.get('min_discount') is not None:
+        parts.append(f"≥ {rule['min_discount']:g}%")
+    parts.extend(rule[field] for field in ('brand', 'category', 'store') if rule.get(field))
+    if rule.get('free_shipping'):
+        parts.append('🚚')
+    return ' · '.join(part for part in parts if part)
+
+def _deal_field(deal: Dict[str, Any], field: str) -> Any:
+    """Read a field from a formatted deal, falling back to its metadata"""
+    value = deal.get(field)
+    if value is None:
+        value = (deal.get('metadata') or {}).get(field)
+    return value
+
+def _casefold(value: Optional[str]) -> Optional[str]:
+    return value.casefold() if isinstance(value, str) else value
+
+class CompiledRule:
+    """A watch rule with its keywords tokenized and text fields normalized"""
+    __slots__ = ('rule_id', 'user_id', 'rule', 'terms', 'max_price', 'min_discount',
+                 'category', 'brand', 'free_shipping', 'store', 'filed_under')
+
+    def __init__(self, rule: Dict[str, Any]):
+        self.rule_id = rule['id']
+        self.user_id = rule['user_id']
+        self.rule = rule
+        self.terms = frozenset(term for keyword in rule.get('keywords') or [] for term in tokenize(keyword))
+        self.max_price = rule.get('max_price')
+        self.min_discount = rule.get('min_discount')
+        self.category = _casefold(rule.get('category'))
+        self.brand = _casefold(rule.get('brand'))
+        self.free_shipping = bool(rule.get('free_shipping'))
+        self.store = rule.get('store')
+        # (index name, key) the matcher filed the rule under
+        self.filed_under = None
+
+    def matches(self, deal: Dict[str, Any], store_id: Optional[str], terms: Set[str]) -> bool:
+        if self.store and self.store != store_id:
+            return False
+        if self.max_price is not None and float(deal['price']) > self.max_price:
+            return False
+        if self.min_discount is not None and float(deal.get('discount_percentage') or 0) < self.min_discount:
+            return False
+        if self.category and _casefold(_deal_field(deal, 'category')) != self.category:
+            return False
+        if self.brand and _casefold(_deal_field(deal, 'brand')) != self.brand:
+            return False
+        if self.free_shipping and _deal_field(deal, 'shipping') != 'Free Shipping':
+            return False
+        return self.terms <= terms
+
+class WatchRuleMatcher:
+    """Every user's watch rules compiled into indexes for matching deals
+
+    Each rule is filed under its most selective condition: one of its
+    keywords, else its brand, category or store, else its price limit.
+    A deal then only checks the rules filed under its own words, brand,
+    category and store, plus the price-limited rules it is cheap enough
+    for, so matching costs about the number of candidate rules rather
+    than the number of rules. Rules watch prices from zero up to their
+    limit, so the price intervals all start at zero and the interval tree
+    reduces to a list sorted by limit, searched with bisect.
+    """
+
+    def __init__(self, rules: Iterable[Dict[str, Any]] = ()):
+        self._rules: Dict[Any, CompiledRule] = {}
+        # Index name -> key -> rule ID -> rule
+        self._indexes: Dict[str, Dict[str, Dict[Any, CompiledRule]]] = {
+            'term': {}, 'brand': {}, 'category': {}, 'store': {}
+        }
+        # (max price, rule ID) sorted, for rules filed under their price limit
+        self._price_limits: List[tuple] = []
+        self._unindexed: Dict[Any, CompiledRule] = {}
+        self._lock = threading.Lock()
+        for rule in rules:
+            self.add_rule(rule)
+
+    def __len__(self) -> int:
+        return len(self._rules)
+
+    def _file_under(self, compiled: CompiledRule):
+        """Choose the index name and key for a rule"""
+        if compiled.terms:
+            # The keyword with the fewest rules filed under it keeps candidate lists short
+            terms = self._indexes['term']
+            return 'term', min(compiled.terms, key=lambda term: (len(terms.get(term, ())), term))
+        for name, key in (('brand', compiled.brand), ('category', compiled.category), ('store', compiled.store)):
+            if key:
+                return name, key
+        return ('price', None) if compiled.max_price is not None else (None, None)
+
+    def add_rule(self, rule: Dict[str, Any]) -> None:
+        """Compile a rule and file it, replacing an earlier version with the same ID"""
+        compiled = CompiledRule(rule)
+        with self._lock:
+            self._remove(compiled.rule_id)
+            self._rules[compiled.rule_id] = compiled
+            name, key = compiled.filed_under = self._file_under(compiled)
+            if name == 'price':
+                bisect.insort(self._price_limits, (compiled.max_price, compiled.rule_id))
+            elif name is None:
+                self._unindexed[compiled.rule_id] = compiled
+            else:
+                self._indexes[name].setdefault(key, {})[compiled.rule_id] = compiled
+
+    def remove_rule(self, rule_id: Any) -> None:
+        with self._lock:
+            self._remove(rule_id)
+
+    def _remove(self, rule_id: Any) -> None:
+        compiled = self._rules.pop(rule_id, None)
+        if compiled is None:
+            return
+        name, key = compiled.filed_under
+        if name == 'price':
+            del self._price_limits[bisect.bisect_left(self._price_limits, (compiled.max_price, rule_id))]
+        elif name is None:
+            del self._unindexed[rule_id]
+        else:
+            rules = self._indexes[name][key]
+            del rules[rule_id]
+            if not rules:
+                del self._indexes[name][key]
+
+    def _candidates(self, deal: Dict[str, Any], store_id: Optional[str], terms: Set[str]) -> Iterable[CompiledRule]:
+        by_term = self._indexes['term']
+        for term in terms:
+            yield from by_term.get(term, {}).values()
+        for name, value in (('brand', _casefold(_deal_field(deal, 'brand'))),
+                            ('category', _casefold(_deal_field(deal, 'category'))), ('store', store_id)):
+            if value:
+                yield from self._indexes[name].get(value, {}).values()
+        # Price-limited rules whose limit is at least the deal's price
+        start = bisect.bisect_left(self._price_limits, (float(deal['price']),))
+        for _, rule_id in self._price_limits[start:]:
+            yield self._rules[rule_id]
+        yield from self._unindexed.values()
+
+    def match(self, deal: Dict[str, Any], store_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get the rules a deal satisfies"""
+        terms = set()
+        for field in ('title', 'brand', 'category'):
+            terms.update(tokenize(_deal_field(deal, field)))
+        with self._lock:
+            return [compiled.rule for compiled in self._candidates(deal, store_id, terms)
+                    if compiled.matches(deal, store_id, terms)]
+
+    def match_deals(self, deals: Iterable[Dict[str, Any]],
+                    store_id: Optional[str] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """Group the deals that satisfy any of a user's rules by user ID"""
+        alerts: Dict[str, List[Dict[str, Any]]] = {}
+        for deal in deals:
+            users = {rule['user_id'] for rule in self.match(deal, store_id)}
+            for user_id in users:
+                alerts.setdefault(user_id, []).append(deal)
+        return alerts
@@ -1,22 +1,27 @@
 import logging
 import os
 import sys
-import firebase_admin
-from firebase_admin import credentials, firestore
-from flask import Flask, request, jsonify
+from firebase_admin import firestore
+from flask import Flask, Response, redirect, request, jsonify
 import stripe
 import socket
 import time
 import traceback
 import asyncio
+import hmac
 from telegram import Bot
 from telegram.constants import ParseMode
-
-# Configure logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.DEBUG
-)
+from webhook_queue import WebhookQueue, WebhookWorkerPool
+from stripe_index import StripeIndex
+from stripe_config import invalidate_checkout_session
+from click_tracking import ClickLog, parse_click_token
+from logging_config import configure_logging
+from firebase_client import get_db
+from lifecycle import run_shutdown_hooks
+import metrics
+
+# Configure logging (see logging_config.py for LOG_* settings)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # Verify environment variables first
@@ -34,18 +39,18 @@ for var_name in required_env_vars:
         logger.error(error_msg)
         raise ValueError(error_msg)
     required_env_vars[var_name] = value
-    logger.info(f"✓ {var_name} is properly set")
+    logger.info("✓ %s is properly set", var_name)
 
-# Initialize Firebase with error handling
-try:
-    if not len(firebase_admin._apps):
-        cred = credentials.Certificate("credentials.json")
-        firebase_admin.initialize_app(cred)
-    db = firestore.client()
-    logger.info("✓ Firebase initialized successfully")
-except Exception as e:
-    logger.error(f"Failed to initialize Firebase: {e}")
-    raise
+# Firestore is connected on first use, inside each gunicorn worker: a gRPC
+# channel created before the fork can't be shared with the forked workers
+_stripe_index = None
+
+def get_stripe_index() -> StripeIndex:
+    """Get the Stripe ID reverse index, connecting to Firestore on first use"""
+    global _stripe_index
+    if _stripe_index is None:
+        _stripe_index = StripeIndex(get_db())
+    return _stripe_index
 
 app = Flask(__name__)
 
@@ -77,28 +82,65 @@ def wait_for_port_available(port, max_retries=5, retry_delay=2):
     while retries > 0:
         if not is_port_in_use(port):
             return True
-        logger.warning(f"Port {port} is in use, waiting... ({retries} retries left)")
+        logger.warning("Port %s is in use, waiting... (%s retries left)", port, retries)
         retries -= 1
         time.sleep(retry_delay)
     return False
 
 @app.route('/')
 def health_check():
-    """Basic health check endpoint"""
+    """Basic health check endpoint; never touches Firestore or Stripe"""
     return jsonify({
         'status': 'healthy',
         'service': 'stripe-webhook',
         'timestamp': time.time()
     })
 
+def is_authorized(token_env: str) -> bool:
+    """Check the request's bearer token against the secret in token_env
+
+    Internal endpoints share the public webhook host, so they answer only
+    with the token, and not at all while it is unset.
+    """
+    token = os.getenv(token_env)
+    if not token:
+        return False
+    scheme, _, given = request.headers.get('Authorization', '').partition(' ')
+    return scheme.lower() == 'bearer' and hmac.compare_digest(given.encode(), token.encode())
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus metrics for this process merged with the bot's published snapshots"""
+    if not is_authorized('METRICS_TOKEN'):
+        return jsonify({"error": "Not found"}), 404
+    return Response(metrics.collect(), mimetype='text/plain; version=0.0.4')
+
+# Deal link clicks, buffered and written to a local SQLite log in batches
+click_log = ClickLog()
+
+@app.route('/go/<token>')
+def deal_redirect(token):
+    """Record a click on a tracked deal link and send the user on to the deal"""
+    click = parse_click_token(token)
+    if click is None:
+        logger.warning("Rejected click with an invalid token")
+        return jsonify({"error": "Unknown link"}), 404
+    user_id, store, deal_id, url = click
+    click_log.record(user_id, store, deal_id)
+    return redirect(url, code=302)
+
+@app.route('/clicks')
+def click_stats():
+    """Clicks per day and store, unique clicking users and the top deals over the last `days` days"""
+    if not is_authorized('CLICKS_TOKEN'):
+        return jsonify({"error": "Not found"}), 404
+    days = request.args.get('days', 7, type=int)
+    return jsonify(click_log.stats(days=max(1, min(days, 90))))
+
 @app.route('/webhook', methods=['POST'])
 def stripe_webhook():
-    # Log all incoming requests
-    logger.info("======= RECEIVED STRIPE WEBHOOK =======")
-    logger.info(f"Headers: {dict(request.headers)}")
-
     payload = request.get_data(as_text=True)
-    logger.debug(f"Payload (first 100 chars): {payload[:100]}...")
+    logger.debug("Received Stripe webhook (%d bytes)", len(payload))
     sig_header = request.headers.get('Stripe-Signature')
 
     try:
@@ -108,12 +150,12 @@ def stripe_webhook():
             return jsonify({"error": "Webhook secret not configured"}), 500
 
         # Construct event
-        logger.info("Verifying Stripe signature...")
+        logger.debug("Verifying Stripe signature...")
         event = stripe.Webhook.construct_event(
             payload, sig_header, webhook_secret
         )
         event_type = event['type']
-        logger.info(f"✅ VALID WEBHOOK: {event_type}")
+        logger.info("✅ VALID WEBHOOK: %s", event_type)
 
         # Extract and validate session data for checkout completion
         if event_type == 'checkout.session.completed':
@@ -132,17 +174,18 @@ def stripe_webhook():
 
             # Ensure user_id is a string
             user_id = str(user_id)
-            logger.info(f"✅ Valid user_id found in metadata: {user_id}")
+            logger.info("✅ Valid user_id found in metadata: %s", user_id)
 
             # Log full session data for debugging
-            logger.info(f"Full session data: {session}")
-
-            # Proceed with payment handling
-            handle_successful_payment(session)
+            logger.debug("Full session data: %s", session)
 
-        elif event_type == 'customer.subscription.deleted':
-            subscription = event['data']['object']
-            handle_subscription_cancelled(subscription)
+        # Persist the event and acknowledge right away; the workers apply it
+        if event_type in EVENT_HANDLERS:
+            if event_queue.enqueue(event['id'], event_type, payload):
+                event_workers.notify()
+                logger.info("Queued webhook event %s (%s)", event['id'], event_type)
+            else:
+                logger.info("Ignoring duplicate webhook event %s", event['id'])
 
         return jsonify(success=True), 200
 
@@ -160,18 +203,18 @@ def stripe_webhook():
 def handle_successful_payment(session):
     """Handle successful payment webhook"""
     logger.info("=== PROCESSING SUCCESSFUL PAYMENT ===")
-    logger.info(f"Full session data: {session}")
+    logger.debug("Full session data: %s", session)
 
     # Extract essential data with detailed logging
     checkout_session_id = session.get("id")
-    logger.info(f"Processing checkout session ID: {checkout_session_id}")
+    logger.info("Processing checkout session ID: %s", checkout_session_id)
 
     # Get user ID from session metadata with verification
     metadata = session.get("metadata", {})
-    logger.info(f"Session metadata: {metadata}")
+    logger.debug("Session metadata: %s", metadata)
 
     user_id = metadata.get("user_id")
-    logger.info(f"Extracted user_id from metadata: {user_id}")
+    logger.info("Extracted user_id from metadata: %s", user_id)
 
     if not user_id:
         logger.error("❌ No user ID found in session metadata")
@@ -179,25 +222,25 @@ def handle_successful_payment(session):
 
     # Ensure user_id is string
     user_id = str(user_id)
-    logger.info(f"Processing payment for user ID: {user_id}")
+    logger.info("Processing payment for user ID: %s", user_id)
 
     # Get subscription ID with verification
     subscription_id = session.get('subscription')
-    logger.info(f"Subscription ID from session: {subscription_id}")
+    logger.info("Subscription ID from session: %s", subscription_id)
 
     # Get customer ID with verification
     customer_id = session.get('customer')
-    logger.info(f"Customer ID from session: {customer_id}")
+    logger.info("Customer ID from session: %s", customer_id)
 
     try:
         # Get reference to user document
-        user_ref = db.collection("users").document(user_id)
-        logger.info(f"Got reference to user document: {user_id}")
+        user_ref = get_db().collection("users").document(user_id)
+        logger.info("Got reference to user document: %s", user_id)
 
         # First verify if the document exists
         user_doc = user_ref.get()
         if user_doc.exists:
-            logger.info(f"Found existing user document: {user_doc.to_dict()}")
+            logger.debug("Found existing user document: %s", user_doc.to_dict())
         else:
             logger.info("Creating new user document")
 
@@ -212,7 +255,7 @@ def handle_successful_payment(session):
             'stripe_customer_id': customer_id
         }
 
-        logger.info(f"Preparing to update with data: {update_data}")
+        logger.debug("Preparing to update with data: %s", update_data)
 
         # Try updating with retry logic
         max_retries = 3
@@ -228,7 +271,7 @@ def handle_successful_payment(session):
                 else:
                     user_ref.set(update_data, merge=True)
 
-                logger.info(f"✅ Update attempt {attempt + 1} successful")
+                logger.info("✅ Update attempt %s successful", attempt + 1)
                 success = True
                 break
             except Exception as e:
@@ -238,7 +281,12 @@ def handle_successful_payment(session):
 
         if not success:
             logger.error(f"All update attempts failed. Last error: {last_error}")
-            return
+            raise RuntimeError(f"Could not update premium status for user {user_id}") from last_error
+
+        # Keep the reverse index current so cancellation is a single point read
+        get_stripe_index().link(user_id, customer_id=customer_id, subscription_id=subscription_id)
+        # The paid session must not be handed out again by this process
+        invalidate_checkout_session(user_id)
 
         # Verify the update
         time.sleep(1)  # Wait for Firestore consistency
@@ -246,16 +294,16 @@ def handle_successful_payment(session):
 
         if updated_doc.exists:
             updated_data = updated_doc.to_dict()
-            logger.info(f"Updated user data: {updated_data}")
+            logger.debug("Updated user data: %s", updated_data)
 
             if updated_data.get('is_premium') == True:
-                logger.info(f"✅ SUCCESS: Premium status verified for user {user_id}")
+                logger.info("✅ SUCCESS: Premium status verified for user %s", user_id)
 
                 # Send success message to user
                 try:
                     message = "🎉 Congratulations! You are now a Premium member. Enjoy exclusive deals!"
                     bot.send_message(chat_id=user_id, text=message)
-                    logger.info(f"✅ Success notification sent to user {user_id}")
+                    logger.info("✅ Success notification sent to user %s", user_id)
                 except Exception as msg_err:
                     logger.error(f"Failed to send success message: {msg_err}")
             else:
@@ -266,12 +314,14 @@ def handle_successful_payment(session):
     except Exception as e:
         logger.error(f"💥 CRITICAL ERROR updating premium status: {e}")
         logger.error(f"Stacktrace: {traceback.format_exc()}")
+        # Let the queue retry the event
+        raise
 
 def handle_subscription_cancelled(subscription):
     """Handle subscription cancellation webhook - SIMPLIFIED"""
     try:
         # Log the full subscription data for debugging
-        logger.info(f"SUBSCRIPTION CANCELLED EVENT: {subscription}")
+        logger.debug("SUBSCRIPTION CANCELLED EVENT: %s", subscription)
 
         # Get subscription ID
         subscription_id = subscription.get("id")
@@ -285,29 +335,35 @@ def handle_subscription_cancelled(subscription):
             logger.error("No customer ID found in cancellation event")
             return
 
-        logger.info(f"Looking for user with customer_id: {customer_id}")
-
-        # Find user by customer ID - simplest approach
-        users_ref = db.collection("users")
-        query = users_ref.where("stripe_customer_id", "==", customer_id).limit(1)
-        docs = query.get()
+        logger.info("Looking for user with customer_id: %s", customer_id)
 
-        if not docs:
-            logger.error(f"❌ No user found with customer_id: {customer_id}")
+        # Resolve the user through the reverse index
+        user_id = get_stripe_index().find_user_id(customer_id=customer_id, subscription_id=subscription_id)
 
-            # Fallback to subscription ID
-            logger.info(f"Trying to find user by subscription_id: {subscription_id}")
-            query = users_ref.where("subscription_id", "==", subscription_id).limit(1)
+        if not user_id:
+            # Fall back to querying users that predate the index, then backfill it
+            logger.info("Stripe IDs not indexed, querying users for customer_id: %s", customer_id)
+            users_ref = get_db().collection("users")
+            query = users_ref.where("stripe_customer_id", "==", customer_id).limit(1)
             docs = query.get()
 
             if not docs:
-                logger.error(f"❌ No user found for subscription {subscription_id} either")
-                return
+                logger.error(f"❌ No user found with customer_id: {customer_id}")
 
-        # Get the user document
-        user_doc = docs[0]
-        user_id = user_doc.id
-        logger.info(f"Found user {user_id} for cancelled subscription")
+                # Fallback to subscription ID
+                logger.info("Trying to find user by subscription_id: %s", subscription_id)
+                query = users_ref.where("subscription_id", "==", subscription_id).limit(1)
+                docs = query.get()
+
+                if not docs:
+                    logger.error(f"❌ No user found for subscription {subscription_id} either")
+                    return
+
+            user_id = docs[0].id
+            get_stripe_index().link(user_id, customer_id=customer_id, subscription_id=subscription_id)
+
+        user_ref = get_db().collection("users").document(user_id)
+        logger.info("Found user %s for cancelled subscription", user_id)
 
         # Simple update to remove premium status
         update_data = {
@@ -317,54 +373,95 @@ def handle_subscription_cancelled(subscription):
         }
 
         # Log what we're about to update
-        logger.info(f"About to update user {user_id} with: {update_data}")
+        logger.debug("About to update user %s with: %s", user_id, update_data)
 
         # Update the user document
-        user_doc.reference.update(update_data)
-        logger.info(f"✅ Updated user {user_id} - removed premium status")
+        user_ref.update(update_data)
+        logger.info("✅ Updated user %s - removed premium status", user_id)
 
         # Verify the update was successful
         time.sleep(1)  # Wait a moment for Firestore to process
-        updated_doc = user_doc.reference.get()
+        updated_doc = user_ref.get()
         if updated_doc.exists:
             updated_data = updated_doc.to_dict()
-            logger.info(f"VERIFICATION - User data in Firestore: {updated_data}")
+            logger.debug("VERIFICATION - User data in Firestore: %s", updated_data)
 
             if updated_data.get('is_premium') == False:
-                logger.info(f"✅ SUCCESS: Premium status was removed for user {user_id}")
+                logger.info("✅ SUCCESS: Premium status was removed for user %s", user_id)
             else:
                 logger.error(f"❌ FAILURE: Premium status was NOT removed for user {user_id}")
                 # Emergency update
-                user_doc.reference.set({'is_premium': False}, merge=True)
+                user_ref.set({'is_premium': False}, merge=True)
                 logger.info("💥 Made emergency update to remove premium status")
 
         # Send cancellation notification
         try:
             message = "⚠️ Your Premium subscription has been canceled. You can re-subscribe anytime!"
             bot.send_message(chat_id=user_id, text=message)
-            logger.info(f"❌ Notification sent: User {user_id} downgraded from Premium")
+            logger.info("❌ Notification sent: User %s downgraded from Premium", user_id)
         except Exception as msg_err:
             logger.error(f"Failed to send cancellation message: {msg_err}")
 
     except Exception as e:
         logger.error(f"💥 CRITICAL ERROR handling subscription cancellation: {e}")
         logger.error(f"Stacktrace: {traceback.format_exc()}")
+        # Let the queue retry the event
+        raise
+
+# Webhook events are applied asynchronously from a durable local queue
+EVENT_HANDLERS = {
+    'checkout.session.completed': handle_successful_payment,
+    'customer.subscription.deleted': handle_subscription_cancelled
+}
+event_queue = WebhookQueue()
+event_workers = WebhookWorkerPool(
+    event_queue,
+    EVENT_HANDLERS,
+    workers=int(os.getenv('WEBHOOK_QUEUE_WORKERS', '2'))
+)
+
+# Exposed for the gunicorn hooks in gunicorn.conf.py
+app.extensions['event_workers'] = event_workers
+
+def run_production_server():
+    """Serve the app with gunicorn, configured by gunicorn.conf.py
+
+    Replaces this process with a fresh gunicorn master, so nothing this
+    process opened (SQLite queues, connections) is inherited by the workers,
+    which import webhook:app themselves after the fork.
+    """
+    # gunicorn finds webhook:app and gunicorn.conf.py in the working directory
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    os.execvp(sys.executable, [sys.executable, '-m', 'gunicorn', 'webhook:app'])
+
+def run_dev_server(port):
+    """Serve the app with Flask's single-threaded development server"""
+    # Check if port is available
+    if wait_for_port_available(port):
+        logger.info("Port %s is available, starting server", port)
+        event_workers.start()
+        metrics.start_snapshot_writer()
+        try:
+            # Disable reloader to prevent duplicate processes
+            app.run(host='0.0.0.0', port=port, debug=os.getenv('FLASK_DEBUG') == '1', use_reloader=False)
+        finally:
+            run_shutdown_hooks(30.0)
+    else:
+        error_msg = f"Could not start webhook server - port {port} is in use after multiple attempts"
+        logger.error(error_msg)
+        raise RuntimeError(error_msg)
 
 if __name__ == '__main__':
     try:
-        port = 5000  # Using port 5000 as per Replit requirements
-        logger.info(f"Attempting to start webhook server on port {port}")
+        port = int(os.getenv('PORT', '5000'))  # Using port 5000 as per Replit requirements
+        server = os.getenv('WEBHOOK_SERVER', 'gunicorn')
+        logger.info("Attempting to start webhook server (%s) on port %s", server, port)
 
-        # Check if port is available
-        if wait_for_port_available(port):
-            logger.info(f"Port {port} is available, starting server")
-            # Disable reloader to prevent duplicate processes
-            app.run(host='0.0.0.0', port=port, debug=True, use_reloader=False)
+        if server == 'dev':
+            run_dev_server(port)
         else:
-            error_msg = f"Could not start webhook server - port {port} is in use after multiple attempts"
-            logger.error(error_msg)
-            raise RuntimeError(error_msg)
+            run_production_server()
 
     except Exception as e:
         logger.error(f"Failed to start webhook server: {e}")
-        raise
\ No newline at end of file
+        raise
@@ -0,0 +1,217 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import traceback
+from typing import Callable, Dict, Optional
+from metrics import WEBHOOK_EVENTS
+from lifecycle import register_shutdown_hook
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS webhook_events (
+    event_id TEXT PRIMARY KEY,
+    event_type TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    received_at REAL NOT NULL,
+    next_attempt_at REAL NOT NULL,
+    claimed_at REAL,
+    processed_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_webhook_events_status
+    ON webhook_events (status, next_attempt_at);
+"""
+
+class WebhookQueue:
+    """Durable SQLite-backed queue of verified Stripe webhook events
+
+    The Stripe event ID is the primary key, so a retried delivery of an event
+    that was already received is ignored instead of being applied twice.
+    """
+
+    def __init__(self, path: Optional[str] = None, lease_seconds: int = 300,
+                 max_attempts: int = 8, retention_days: int = 7):
+        self.path = path or os.environ.get("WEBHOOK_QUEUE_PATH", "webhook_events.db")
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retention_seconds = retention_days * 24 * 60 * 60
+        self._local = threading.local()
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get the SQLite connection for the current thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, event_id: str, event_type: str, payload: str) -> bool:
+        """Persist an event; returns False if the event ID was already received"""
+        now = time.time()
+        cursor = self._connect().execute(
+            "INSERT OR IGNORE INTO webhook_events "
+            "(event_id, event_type, payload, received_at, next_attempt_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (event_id, event_type, payload, now, now)
+        )
+        return cursor.rowcount == 1
+
+    def claim(self) -> Optional[Dict]:
+        """Claim the oldest due event for processing
+
+        Events left in 'processing' by a crashed worker become claimable again
+        once their lease expires.
+        """
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT event_id, event_type, payload, attempts FROM webhook_events "
+                "WHERE (status = 'pending' AND next_attempt_at <= ?) "
+                "OR (status = 'processing' AND claimed_at <= ?) "
+                "ORDER BY received_at LIMIT 1",
+                (now, now - self.lease_seconds)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+
+            conn.execute(
+                "UPDATE webhook_events SET status = 'processing', claimed_at = ?, "
+                "attempts = attempts + 1 WHERE event_id = ?",
+                (now, row['event_id'])
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        return {
+            'id': row['event_id'],
+            'type': row['event_type'],
+            'payload': row['payload'],
+            'attempts': row['attempts'] + 1
+        }
+
+    def complete(self, event_id: str) -> None:
+        """Mark an event as applied"""
+        self._connect().execute(
+            "UPDATE webhook_events SET status = 'done', processed_at = ?, last_error = NULL "
+            "WHERE event_id = ?",
+            (time.time(), event_id)
+        )
+
+    def fail(self, event_id: str, attempts: int, error: str) -> None:
+        """Schedule a failed event for retry with exponential backoff"""
+        if attempts >= self.max_attempts:
+            status, next_attempt_at = 'failed', time.time()
+            logger.error(f"Webhook event {event_id} failed permanently after {attempts} attempts")
+        else:
+            status, next_attempt_at = 'pending', time.time() + min(2 ** attempts, 600)
+        self._connect().execute(
+            "UPDATE webhook_events SET status = ?, next_attempt_at = ?, last_error = ? "
+            "WHERE event_id = ?",
+            (status, next_attempt_at, error, event_id)
+        )
+
+    def purge_processed(self) -> int:
+        """Delete applied events older than the idempotency retention window"""
+        cursor = self._connect().execute(
+            "DELETE FROM webhook_events WHERE status = 'done' AND processed_at < ?",
+            (time.time() - self.retention_seconds,)
+        )
+        return cursor.rowcount
+
+    def stats(self) -> Dict[str, int]:
+        """Get the number of events per status"""
+        rows = self._connect().execute(
+            "SELECT status, COUNT(*) AS count FROM webhook_events GROUP BY status"
+        ).fetchall()
+        return {row['status']: row['count'] for row in rows}
+
+class WebhookWorkerPool:
+    """Background threads that apply queued webhook events to their handlers"""
+
+    def __init__(self, queue: WebhookQueue, handlers: Dict[str, Callable[[Dict], None]],
+                 workers: int = 2, poll_interval: float = 1.0):
+        self.queue = queue
+        self.handlers = handlers
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._threads = []
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+
+    def start(self) -> None:
+        """Start the worker threads"""
+        if self._threads:
+            return
+        self._stopping.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"webhook-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        register_shutdown_hook(self.stop, 'webhook-workers')
+        logger.info("Started %s webhook worker(s)", self.workers)
+
+    def notify(self) -> None:
+        """Wake idle workers after an event was enqueued"""
+        self._wakeup.set()
+
+    def stop(self, timeout: float = 30.0) -> None:
+        """Stop the workers, letting in-flight events finish within timeout"""
+        self._stopping.set()
+        self._wakeup.set()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self._threads = []
+        logger.info("Webhook workers stopped")
+
+    def _run(self) -> None:
+        last_purge = 0.0
+        while not self._stopping.is_set():
+            try:
+                event = self.queue.claim()
+            except Exception as e:
+                logger.error(f"Error claiming webhook event: {e}")
+                event = None
+
+            if event is None:
+                if time.monotonic() - last_purge > 3600:
+                    last_purge = time.monotonic()
+                    try:
+                        self.queue.purge_processed()
+                    except Exception as e:
+                        logger.error(f"Error purging webhook events: {e}")
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            self._process(event)
+
+    def _process(self, event: Dict) -> None:
+        handler = self.handlers.get(event['type'])
+        try:
+            if handler is not None:
+                data = json.loads(event['payload'])
+                handler(data['data']['object'])
+            self.queue.complete(event['id'])
+            WEBHOOK_EVENTS.inc(type=event['type'], result='applied')
+            logger.info("Applied webhook event %s (%s)", event['id'], event['type'])
+        except Exception as e:
+            logger.error(f"Error applying webhook event {event['id']} (attempt {event['attempts']}): {e}")
+            logger.error(f"Stacktrace: {traceback.format_exc()}")
+            self.queue.fail(event['id'], event['attempts'], str(e))
+            WEBHOOK_EVENTS.inc(type=event['type'], result='failed')